@@ -0,0 +1,133 @@
+import asyncio
+import math
+import time
+from datetime import date, datetime
+
+import discord
+
+# Low-stock alerts. A product's stock only changes through its shop's
+# StockLedger, and the ledger tells the watcher about each change, so
+# thresholds are checked for the one product that changed and never by
+# scanning the catalog.
+#
+# A product is low once its stock is at or below its `reorder_threshold`
+# (or the watcher's default when it has none). The first change that takes
+# it there schedules an alert `debounce` seconds later; further changes in
+# the meantime don't add another, and if it's restocked before then nothing
+# is sent. After an alert the product stays quiet until its stock goes back
+# above the threshold, or `cooldown` seconds pass.
+#
+# Each alert suggests how many to reorder: enough to cover the supplier's
+# lead time plus `cover_days` at the rate the product sold over the last
+# `window_days` (from the daily rollups, so cancelled orders don't count),
+# on top of the threshold itself.
+
+DEFAULT_LEAD_DAYS = 7
+
+
+class StockWatcher:
+    def __init__(self, notifier, default_threshold=None, debounce=5.0, cooldown=24 * 3600,
+                 window_days=14, cover_days=14):
+        self.notifier = notifier
+        self.default_threshold = default_threshold
+        self.debounce = debounce
+        self.cooldown = cooldown
+        self.window_days = window_days
+        self.cover_days = cover_days
+        self.alerts_sent = 0
+        self._pending = {}
+        self._alerted = {}
+
+    def watch(self, shop):
+        shop.ledger.listeners.append(
+            lambda product_id, old_stock, new_stock: self.stock_changed(shop, product_id, old_stock, new_stock)
+        )
+
+    def threshold(self, product):
+        value = product.get('reorder_threshold')
+        return self.default_threshold if value is None else value
+
+    def stock_changed(self, shop, product_id, old_stock, new_stock):
+        # Called from inside the ledger, so it only ever looks at one product.
+        # A rise can only matter to a product waiting to be re-armed.
+        if new_stock >= old_stock and (shop.guild_id, product_id) not in self._alerted:
+            return
+        self.check(shop, product_id)
+
+    def check(self, shop, product_id):
+        key = (shop.guild_id, product_id)
+        product = shop.store.get_product(product_id)
+        threshold = self.threshold(product) if product is not None else None
+        if threshold is None or product['stock'] > threshold:
+            self._alerted.pop(key, None)
+            return
+        if key in self._pending:
+            return
+        alerted = self._alerted.get(key)
+        if alerted is not None and time.monotonic() - alerted < self.cooldown:
+            return
+        self._pending[key] = asyncio.get_running_loop().create_task(self._alert_later(shop, product_id))
+
+    async def _alert_later(self, shop, product_id):
+        key = (shop.guild_id, product_id)
+        try:
+            await asyncio.sleep(self.debounce)
+            # The sales rate comes from the orders' rollups
+            await shop.store.wait_ready('orders')
+        finally:
+            del self._pending[key]
+        product = shop.store.get_product(product_id)
+        threshold = self.threshold(product) if product is not None else None
+        if threshold is None or product['stock'] > threshold:
+            return
+        embed = self.render(shop.store, product_id, product, threshold)
+        if self.notifier.post(shop.store.get_setting('notification_channel'), embed):
+            self._alerted[key] = time.monotonic()
+            self.alerts_sent += 1
+
+    def velocity(self, store, product_id):
+        # Units sold per day over the last window_days, today included
+        last = date.today().toordinal()
+        units = store.rollups.product_total(product_id, last - self.window_days + 1, last)[2]
+        return units / self.window_days
+
+    def render(self, store, product_id, product, threshold):
+        stock = product['stock']
+        velocity = self.velocity(store, product_id)
+        supplier_id = product.get('supplier_id')
+        supplier = store.get_supplier(supplier_id) if supplier_id else None
+        lead_days = (supplier or {}).get('lead_time_days') or DEFAULT_LEAD_DAYS
+        suggested = max(math.ceil(velocity * (lead_days + self.cover_days)) + threshold - stock, 1)
+
+        embed = discord.Embed(
+            title=f"⚠️ Low Stock: {product['name']}",
+            color=discord.Color.red() if stock <= 0 else discord.Color.orange(),
+            timestamp=datetime.now()
+        )
+        embed.add_field(name="Product ID", value=product_id, inline=True)
+        embed.add_field(name="Stock", value=str(stock), inline=True)
+        embed.add_field(name="Reorder At", value=str(threshold), inline=True)
+        embed.add_field(name=f"Sold / Day ({self.window_days}d)", value=f"{velocity:.1f}", inline=True)
+        if velocity > 0:
+            embed.add_field(name="Runs Out In", value=f"~{max(stock, 0) / velocity:.0f} days", inline=True)
+        embed.add_field(name="Suggested Reorder", value=f"{suggested} units", inline=True)
+        if supplier is not None:
+            contact = supplier.get('contact')
+            value = supplier.get('name', supplier_id) + (f" ({contact})" if contact else "")
+            embed.add_field(name="Supplier", value=f"{value}\nLead time: {lead_days} days"[:1024], inline=False)
+        elif supplier_id:
+            embed.add_field(name="Supplier", value=f"{supplier_id} (not on file)", inline=False)
+        return embed
+
+    def forget(self, guild_id, product_id):
+        self._alerted.pop((guild_id, product_id), None)
+
+    def close(self):
+        for task in self._pending.values():
+            task.cancel()
+
+    def metrics(self):
+        return [
+            ('stock_alerts_sent_total', 'counter', 'Low-stock alerts posted.', [({}, self.alerts_sent)]),
+            ('stock_alerts_pending', 'gauge', 'Low-stock alerts waiting out their debounce.', [({}, len(self._pending))])
+        ]
@@ -0,0 +1,276 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from records import created_day, order_figures
+
+# Derived sales figures that are kept up to date as orders are written, so
+# read commands never have to walk the whole order history.
+
+
+def _product_totals():
+    return {'orders': 0, 'quantity': 0, 'revenue': 0.0, 'profit': 0.0}
+
+
+class OrderAggregates:
+    def __init__(self):
+        self.orders = 0
+        self.revenue = 0.0
+        self.profit = 0.0
+        self.by_status = {}
+        self.by_product = {}
+
+    @classmethod
+    def from_orders(cls, orders):
+        aggregates = cls()
+        for order in orders:
+            aggregates.add(order)
+        return aggregates
+
+    @classmethod
+    def from_dict(cls, saved):
+        aggregates = cls()
+        aggregates.orders = saved['orders']
+        aggregates.revenue = saved['revenue']
+        aggregates.profit = saved['profit']
+        aggregates.by_status = dict(saved['by_status'])
+        aggregates.by_product = {pid: dict(totals) for pid, totals in saved['by_product'].items()}
+        return aggregates
+
+    def to_dict(self):
+        return {
+            'orders': self.orders,
+            'revenue': self.revenue,
+            'profit': self.profit,
+            'by_status': dict(self.by_status),
+            'by_product': {pid: dict(totals) for pid, totals in self.by_product.items()}
+        }
+
+    def add(self, order, sign=1):
+        product_id, status, quantity, total, profit = order_figures(order)
+        self.orders += sign
+        self.revenue += sign * total
+        self.profit += sign * profit
+
+        self.by_status[status] = self.by_status.get(status, 0) + sign
+
+        totals = self.by_product.get(product_id)
+        if totals is None:
+            totals = self.by_product[product_id] = _product_totals()
+        totals['orders'] += sign
+        totals['quantity'] += sign * quantity
+        totals['revenue'] += sign * total
+        totals['profit'] += sign * profit
+
+    def remove(self, order):
+        self.add(order, -1)
+
+    def order_changed(self, order_id, old, new):
+        # Any write to an order, including a bare status change, is applied
+        # as "take the old version out, put the new one in"
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            self.add(new)
+
+    def count(self, status=None):
+        if status is None:
+            return self.orders
+        return self.by_status.get(status, 0)
+
+
+# Daily sales, for /report. The shop-wide totals get one array per metric,
+# indexed by day, so any window is answered by summing a slice no matter how
+# many orders fall inside it. Most products only sell on a few of those
+# days, so each one keeps just the days it sold on (see SparseSeries).
+# Cancelled orders don't count.
+METRICS = ('revenue', 'profit', 'units', 'orders')
+
+
+def day_of(timestamp):
+    return date.fromisoformat(timestamp[:10]).toordinal()
+
+
+class DailySeries:
+    __slots__ = ('start', 'columns')
+
+    def __init__(self, start):
+        self.start = start
+        self.columns = [array('d') for _ in METRICS]
+
+    def add(self, day, values, sign=1):
+        if day < self.start:
+            padding = [0.0] * (self.start - day)
+            self.columns = [array('d', padding) + column for column in self.columns]
+            self.start = day
+        index = day - self.start
+        for column, value in zip(self.columns, values):
+            if index >= len(column):
+                column.extend([0.0] * (index + 1 - len(column)))
+            column[index] += sign * value
+
+    def _bounds(self, first, last):
+        length = len(self.columns[0])
+        return max(first - self.start, 0), min(last - self.start + 1, length)
+
+    def total(self, first, last):
+        low, high = self._bounds(first, last)
+        if low >= high:
+            return [0.0] * len(METRICS)
+        return [sum(column[low:high]) for column in self.columns]
+
+    def rollup(self, first, last, period='day'):
+        # Rolls the daily buckets in [first, last] up into days, weeks
+        # (Monday-based) or calendar months, oldest first.
+        buckets = {}
+        low, high = self._bounds(first, last)
+        for index in range(low, high):
+            day = self.start + index
+            if period == 'week':
+                key = day - date.fromordinal(day).weekday()
+            elif period == 'month':
+                key = date.fromordinal(day).replace(day=1).toordinal()
+            else:
+                key = day
+            bucket = buckets.setdefault(key, [0.0] * len(METRICS))
+            for i, column in enumerate(self.columns):
+                bucket[i] += column[index]
+        return sorted(buckets.items())
+
+    def to_dict(self):
+        return {'start': self.start, 'columns': [column.tolist() for column in self.columns]}
+
+    @classmethod
+    def from_dict(cls, saved):
+        series = cls(saved['start'])
+        series.columns = [array('d', column) for column in saved['columns']]
+        return series
+
+
+class SparseSeries:
+    # The days a product sold on, sorted, with one array per metric holding
+    # that day's figures at the same position. A day is dropped again once
+    # its last order is taken out.
+    __slots__ = ('days', 'columns')
+
+    def __init__(self):
+        self.days = array('l')
+        self.columns = [array('d') for _ in METRICS]
+
+    def add(self, day, values, sign=1):
+        days = self.days
+        index = len(days)
+        if not days or days[-1] < day:
+            days.append(day)
+            for column in self.columns:
+                column.append(0.0)
+        else:
+            index = bisect_left(days, day)
+            if index == len(days) or days[index] != day:
+                days.insert(index, day)
+                for column in self.columns:
+                    column.insert(index, 0.0)
+        for column, value in zip(self.columns, values):
+            column[index] += sign * value
+        # The order count is a whole number, so it comes back to exactly 0
+        if self.columns[-1][index] == 0:
+            del days[index]
+            for column in self.columns:
+                del column[index]
+
+    def total(self, first, last):
+        low, high = bisect_left(self.days, first), bisect_right(self.days, last)
+        return [sum(column[low:high]) for column in self.columns]
+
+    def to_dict(self):
+        return {'days': self.days.tolist(), 'columns': [column.tolist() for column in self.columns]}
+
+    @classmethod
+    def from_dict(cls, saved):
+        series = cls()
+        if 'days' in saved:
+            series.days = array('l', saved['days'])
+            series.columns = [array('d', column) for column in saved['columns']]
+            return series
+        # Saved as a DailySeries before products were kept sparse
+        for index, values in enumerate(zip(*saved['columns'])):
+            if values[-1]:
+                series.days.append(saved['start'] + index)
+                for column, value in zip(series.columns, values):
+                    column.append(value)
+        return series
+
+
+class SalesRollups:
+    def __init__(self):
+        self.totals = None
+        self.by_product = {}
+
+    @classmethod
+    def from_orders(cls, orders):
+        rollups = cls()
+        for order in orders:
+            rollups.add(order)
+        return rollups
+
+    @classmethod
+    def from_dict(cls, saved):
+        rollups = cls()
+        if saved['totals'] is not None:
+            rollups.totals = DailySeries.from_dict(saved['totals'])
+        rollups.by_product = {pid: SparseSeries.from_dict(series) for pid, series in saved['by_product'].items()}
+        return rollups
+
+    def to_dict(self):
+        return {
+            'totals': self.totals.to_dict() if self.totals else None,
+            'by_product': {pid: series.to_dict() for pid, series in self.by_product.items()}
+        }
+
+    def add_bucket(self, product_id, day, values, sign=1):
+        if self.totals is None:
+            self.totals = DailySeries(day)
+        self.totals.add(day, values, sign)
+        series = self.by_product.get(product_id)
+        if series is None:
+            series = self.by_product[product_id] = SparseSeries()
+        series.add(day, values, sign)
+
+    def add(self, order, sign=1):
+        product_id, status, quantity, total, profit = order_figures(order)
+        if status == 'cancelled':
+            return
+        self.add_bucket(product_id, created_day(order), (total, profit, quantity, 1), sign)
+
+    def remove(self, order):
+        self.add(order, -1)
+
+    def order_changed(self, order_id, old, new):
+        if old is not None:
+            self.remove(old)
+        if new is not None:
+            self.add(new)
+
+    def total(self, first, last):
+        if self.totals is None:
+            return [0.0] * len(METRICS)
+        return self.totals.total(first, last)
+
+    def product_total(self, product_id, first, last):
+        series = self.by_product.get(product_id)
+        if series is None:
+            return [0.0] * len(METRICS)
+        return series.total(first, last)
+
+    def rollup(self, first, last, period='day'):
+        if self.totals is None:
+            return []
+        return self.totals.rollup(first, last, period)
+
+    def top_products(self, first, last, limit=5):
+        ranked = []
+        for product_id, series in self.by_product.items():
+            totals = series.total(first, last)
+            if totals[3] > 0:
+                ranked.append((product_id, totals))
+        ranked.sort(key=lambda item: item[1][0], reverse=True)
+        return ranked[:limit]
@@ -0,0 +1,162 @@
+import gzip
+import itertools
+import json
+import os
+import re
+from threading import Lock
+
+# Cold storage for old delivered/cancelled orders.
+#
+# Archived orders are appended to one gzip file per month of creation,
+# archive/orders-YYYY-MM.jsonl.gz, one {"id": ..., "order": {...}} line
+# each. Every archiving run adds a new gzip member to the end of a file,
+# which gzip readers treat as one continuous stream.
+#
+# The only thing held in memory is archive/index.json: per segment, the
+# number of orders and the lowest and highest trailing number in their IDs.
+# Looking an order up only decompresses the segments whose range covers its
+# ID, newest first.
+
+TRAILING_DIGITS = re.compile(r'(\d+)$')
+_DECODER = json.JSONDecoder()
+
+
+def _line_id(line):
+    # Lines start with {"id":, so the ID is read without parsing the order
+    return _DECODER.raw_decode(line.decode('utf-8'), 6)[0]
+
+
+def _id_number(order_id):
+    match = TRAILING_DIGITS.search(order_id)
+    return int(match.group(1)) if match else None
+
+
+class OrderArchive:
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.segments = {}
+        self._lock = Lock()  # appends and reads never overlap on a file
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self.segments = json.load(f)
+        return self
+
+    def count(self):
+        return sum(segment['count'] for segment in list(self.segments.values()))
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def write(self, orders):
+        # Appends [(order_id, order dict)] to their month's segment and
+        # returns once everything is on disk. Blocking; run it in a thread.
+        by_segment = {}
+        for order_id, order in orders:
+            name = f"orders-{order['created_at'][:7]}.jsonl.gz"
+            by_segment.setdefault(name, []).append((order_id, order))
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            for name, entries in by_segment.items():
+                lines = ''.join(
+                    json.dumps({'id': order_id, 'order': order}, separators=(',', ':')) + '\n'
+                    for order_id, order in entries
+                )
+                with open(self._path(name), 'ab') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb') as segment:
+                        segment.write(lines.encode('utf-8'))
+                    raw.flush()
+                    os.fsync(raw.fileno())
+
+                meta = self.segments.setdefault(name, {'count': 0, 'low': None, 'high': None, 'unnumbered': False})
+                meta['count'] += len(entries)
+                for order_id, _ in entries:
+                    number = _id_number(order_id)
+                    if number is None:
+                        meta['unnumbered'] = True
+                        continue
+                    meta['low'] = number if meta['low'] is None else min(meta['low'], number)
+                    meta['high'] = number if meta['high'] is None else max(meta['high'], number)
+            self._write_index()
+
+    def _write_index(self):
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.segments, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.index_path)
+
+    def _candidates(self, order_id):
+        # Called from the event loop while write() may be adding a segment
+        # in a thread, so it walks a copy
+        number = _id_number(order_id)
+        names = []
+        for name, meta in list(self.segments.items()):
+            if meta['unnumbered'] or (number is not None and meta['low'] is not None
+                                      and meta['low'] <= number <= meta['high']):
+                names.append(name)
+        return sorted(names, reverse=True)
+
+    def may_contain(self, order_id):
+        # Cheap in-memory check, so lookups for unknown IDs never touch disk
+        return bool(self._candidates(order_id))
+
+    def get(self, order_id):
+        # Blocking; run it in a thread. If an order was archived twice (it
+        # changed mid-run and went again), the later copy wins.
+        prefix = ('{"id":' + json.dumps(order_id) + ',').encode('utf-8')
+        with self._lock:
+            for name in self._candidates(order_id):
+                found = None
+                with gzip.open(self._path(name), 'rb') as segment:
+                    for line in segment:
+                        if line.startswith(prefix):
+                            found = line
+                if found is not None:
+                    return json.loads(found)['order']
+        return None
+
+    def _read_lines(self, name, size, limit=None):
+        # A segment's lines, `size` at a time, decompressed as they're read.
+        # The lock is only held while a chunk is read, so archiving carries
+        # on in between.
+        with gzip.open(self._path(name), 'rb') as segment:
+            lines = itertools.islice(segment, limit)
+            while True:
+                with self._lock:
+                    chunk = list(itertools.islice(lines, size))
+                if not chunk:
+                    return
+                yield chunk
+
+    def iter_chunks(self, size):
+        # Every archived order as lists of (order_id, order), oldest month
+        # first. An order archived more than once only comes out in its last
+        # copy, as in get(); all copies share the month they were created
+        # in, so the IDs are read one segment ahead of its orders. Blocking;
+        # run each step in a thread.
+        with self._lock:
+            names = sorted(self.segments)
+        for name in names:
+            # The line number of each order's last copy. Lines appended after
+            # this pass are left out, so no order comes out twice.
+            last = {}
+            total = 0
+            for chunk in self._read_lines(name, size):
+                for line in chunk:
+                    last[_line_id(line)] = total
+                    total += 1
+            number = 0
+            for chunk in self._read_lines(name, size, total):
+                entries = []
+                for line in chunk:
+                    entry = json.loads(line)
+                    if last[entry['id']] == number:
+                        entries.append((entry['id'], entry['order']))
+                    number += 1
+                if entries:
+                    yield entries
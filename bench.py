@@ -0,0 +1,375 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from storage import SNAPSHOT_LAYOUT
+
+# Benchmarks for the storage layer and the real command handlers.
+#
+# Each scenario (backend x dataset size) runs in its own worker process, so
+# the module-level store in main.py starts fresh and peak RSS belongs to that
+# scenario alone. The worker generates a seeded synthetic dataset in a temp
+# directory, imports main, and calls the handlers with FakeInteraction, a
+# stand-in that records responses and never touches the network.
+#
+#   python bench.py                                # default sizes, both backends
+#   python bench.py --sizes 1000000:100000 --backends sqlite
+#   python bench.py --out new.json --baseline old.json   # exit 1 on regression
+#   python bench.py --keep                         # leave each scenario's data behind
+#
+# Sizes are ORDERS:PRODUCTS. Results hold ops/sec and p50/p99 latency for
+# every operation, plus peak RSS per scenario.
+
+DEFAULT_SIZES = '1000:10,10000:1000,100000:10000'
+DEFAULT_BACKENDS = 'json,sqlite'
+# The generated dataset is written where main.py keeps this guild's data
+GUILD_ID = 1
+STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+
+
+class FakeUser:
+    def __init__(self, user_id=1000, name='bench'):
+        self.id = user_id
+        self.name = name
+        self.mention = f'<@{user_id}>'
+
+
+class FakeResponse:
+    def __init__(self, interaction):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def _respond(self, kind, args, kwargs):
+        if self._done:
+            raise RuntimeError('interaction already responded to')
+        self._done = True
+        self._interaction.sent.append((kind, args, kwargs))
+
+    async def send_message(self, *args, **kwargs):
+        await self._respond('send_message', args, kwargs)
+
+    async def edit_message(self, *args, **kwargs):
+        await self._respond('edit_message', args, kwargs)
+
+    async def send_modal(self, *args, **kwargs):
+        await self._respond('send_modal', args, kwargs)
+
+    async def defer(self, *args, **kwargs):
+        await self._respond('defer', args, kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction):
+        self._interaction = interaction
+
+    async def send(self, *args, **kwargs):
+        self._interaction.sent.append(('followup', args, kwargs))
+
+
+class FakeInteraction:
+    # Just the parts of discord.Interaction the handlers use
+    def __init__(self, user=None):
+        self.user = user or FakeUser()
+        self.command = None
+        self.guild = None
+        self.guild_id = GUILD_ID
+        self.sent = []
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+
+def fill(modal, **values):
+    # What discord.py does when a submitted modal comes in
+    for name, value in values.items():
+        getattr(modal, name)._value = value
+    return modal
+
+
+def generate_data(orders, products, seed):
+    # In the current snapshot layout (small sections ahead of products and
+    # orders), as the bot itself would have written it
+    rng = random.Random(seed)
+    data = {
+        '_layout': SNAPSHOT_LAYOUT,
+        'suppliers': {},
+        'counters': {'products': products, 'orders': orders},
+        'settings': {'order_channel': None, 'notification_channel': None, 'currency': 'USD'},
+        'products': {},
+        'orders': {}
+    }
+    words = ['red', 'blue', 'steel', 'cotton', 'mini', 'pro', 'smart', 'eco', 'travel', 'desk',
+             'lamp', 'mug', 'cable', 'case', 'bottle', 'watch', 'bag', 'charger', 'stand', 'mat']
+    start = datetime(2025, 1, 1)
+    for pid in range(1, products + 1):
+        price = round(rng.uniform(5, 200), 2)
+        cost = round(price * rng.uniform(0.3, 0.8), 2)
+        data['products'][str(pid)] = {
+            'name': ' '.join(rng.sample(words, 3)).title(),
+            'description': ' '.join(rng.choices(words, k=8)),
+            'price': price,
+            'supplier_cost': cost,
+            'profit_margin': round((price - cost) / price * 100, 2),
+            'stock': 10 ** 9,
+            'active': True,
+            'created_at': start.isoformat()
+        }
+    for n in range(1, orders + 1):
+        pid = str(rng.randint(1, products))
+        product = data['products'][pid]
+        qty = rng.randint(1, 5)
+        created = start + timedelta(seconds=int(n * 365 * 86400 / orders))
+        data['orders'][f'ORD-{n:04d}'] = {
+            'product_id': pid,
+            'product_name': product['name'],
+            'quantity': qty,
+            'total': product['price'] * qty,
+            'profit': (product['price'] - product['supplier_cost']) * qty,
+            'customer_name': f'Customer {n % 5000}',
+            'customer_email': f'customer{n % 5000}@example.com',
+            'shipping_address': f'{n} Main St',
+            'status': rng.choice(STATUSES),
+            'created_at': created.isoformat(),
+            'created_by': '1000'
+        }
+    return data
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def measure(name, count, op):
+    # op(i) may be sync or async; each call is one timed operation
+    samples = []
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        result = op(i)
+        if asyncio.iscoroutine(result):
+            await result
+        samples.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - started
+    return name, {
+        'ops': count,
+        'ops_per_sec': count / elapsed if elapsed else None,
+        'p50_ms': percentile(samples, 0.5) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'max_ms': max(samples) * 1000
+    }
+
+
+async def run_scenario(backend, orders, products, ops, seed):
+    rng = random.Random(seed + 1)
+    data = generate_data(orders, products, seed)
+    with open('bot_data.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+    del data
+
+    os.environ['STORAGE_BACKEND'] = backend
+    os.environ['LEGACY_GUILD_ID'] = str(GUILD_ID)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    load_started = time.perf_counter()
+    import main as bot
+    shop = await bot.shops.open(GUILD_ID)  # opens (and for sqlite, migrates) the dataset
+    opened = time.perf_counter() - load_started
+    await shop.loading
+    results = {'startup': {'ops': 1, 'seconds': time.perf_counter() - load_started,
+                           'open_seconds': opened, 'rss_mb': peak_rss_mb()}}
+
+    store = shop.store
+    order_ids = [f'ORD-{n:04d}' for n in range(1, orders + 1)]
+    product_ids = [str(n) for n in range(1, products + 1)]
+    statuses = [s for s in STATUSES if s != 'cancelled']
+
+    async def create_order(i):
+        modal = fill(bot.OrderModal(), product_id=rng.choice(product_ids), quantity='2',
+                     customer_name='Bench Customer', customer_email=f'bench{i}@example.com',
+                     shipping_address='1 Bench Rd')
+        await modal.on_submit(FakeInteraction())
+
+    async def update_status(i):
+        await bot.update_status.callback(FakeInteraction(), order_id=rng.choice(order_ids),
+                                          status=rng.choice(statuses))
+
+    async def stats_cold(i):
+        bot.embed_cache.discard((GUILD_ID, 'stats'))
+        await bot.stats.callback(FakeInteraction())
+
+    async def list_orders(i):
+        status = rng.choice((None,) + STATUSES)
+        await bot.list_orders.callback(FakeInteraction(), status=status)
+
+    async def list_orders_customer(i):
+        await bot.list_orders.callback(FakeInteraction(), customer=f'customer{rng.randrange(5000)}@example.com')
+
+    def flush(i):
+        store.update_order(rng.choice(order_ids), status=rng.choice(statuses))
+        store.flush()
+
+    # The load op reads a copy, never the files the live store is writing
+    copy_store_files(backend, 'load-copy')
+
+    def load(i):
+        bot.load_store(os.path.join('load-copy', bot.DATA_FILE),
+                       os.path.join('load-copy', bot.SQLITE_FILE)).finish_loading().close()
+
+    operations = [
+        ('order_modal_submit', ops, create_order),
+        ('update_status', ops, update_status),
+        ('stats', ops, lambda i: bot.stats.callback(FakeInteraction())),
+        ('stats_uncached', ops, stats_cold),
+        ('list_orders', ops, list_orders),
+        ('list_orders_by_customer', ops, list_orders_customer),
+        ('flush', min(ops, 100), flush),
+        ('load', 3, load)
+    ]
+    if backend == 'json':
+        operations.append(('snapshot', 3, lambda i: store.save()))
+
+    for name, count, op in operations:
+        name, result = await measure(name, count, op)
+        results[name] = result
+
+    store.close()
+    return results
+
+
+def copy_store_files(backend, dest):
+    os.makedirs(dest)
+    if backend == 'sqlite':
+        # The backup API gives a consistent copy of a database in use
+        with closing(sqlite3.connect('bot_data.db')) as source, \
+                closing(sqlite3.connect(os.path.join(dest, 'bot_data.db'))) as target:
+            source.backup(target)
+        return
+    for name in ('bot_data.json', 'bot_data.json.wal', 'bot_data.json.wal.compacting'):
+        if os.path.exists(name):
+            shutil.copy2(name, os.path.join(dest, name))
+
+
+def run_worker(args):
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.chdir(workdir)
+    try:
+        results = asyncio.run(run_scenario(args.backend, args.orders, args.products, args.ops, args.seed))
+        results['peak_rss_mb'] = peak_rss_mb()
+        with open(args.result, 'w', encoding='utf-8') as f:
+            json.dump(results, f)
+    finally:
+        os.chdir(tempfile.gettempdir())
+        if args.keep:
+            print(f'   data kept in {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    # Flags operations whose p99 grew or throughput fell by more than the
+    # tolerance against a previous results file
+    regressions = []
+    for scenario, operations in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario, {})
+        for name, now in operations.items():
+            old = before.get(name)
+            if not isinstance(now, dict) or not isinstance(old, dict) or 'p99_ms' not in now:
+                continue
+            if now['p99_ms'] > old['p99_ms'] * (1 + tolerance):
+                regressions.append(f"{scenario} {name}: p99 {old['p99_ms']:.2f}ms -> {now['p99_ms']:.2f}ms")
+            if now['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+                regressions.append(f"{scenario} {name}: {old['ops_per_sec']:.0f} -> {now['ops_per_sec']:.0f} ops/sec")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark storage and command handlers')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated ORDERS:PRODUCTS')
+    parser.add_argument('--backends', default=DEFAULT_BACKENDS)
+    parser.add_argument('--ops', type=int, default=500, help='timed calls per operation')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--baseline', help='previous results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown before a change counts as a regression')
+    parser.add_argument('--keep', action='store_true',
+                        help="keep each scenario's data directory instead of deleting it")
+    # Internal: run one scenario in this process
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--orders', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--products', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    results = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'ops': args.ops,
+        'scenarios': {}
+    }
+    for backend in args.backends.split(','):
+        for size in args.sizes.split(','):
+            orders, products = (int(n) for n in size.split(':'))
+            scenario = f'{backend}/{orders}o/{products}p'
+            print(f'⏱️ {scenario}...', flush=True)
+            with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+                result_path = f.name
+            try:
+                subprocess.run([
+                    sys.executable, os.path.abspath(__file__), '--worker',
+                    '--backend', backend, '--orders', str(orders), '--products', str(products),
+                    '--ops', str(args.ops), '--seed', str(args.seed), '--result', result_path
+                ] + (['--keep'] if args.keep else []), check=True)
+                with open(result_path, encoding='utf-8') as f:
+                    results['scenarios'][scenario] = json.load(f)
+            finally:
+                os.remove(result_path)
+
+            for name, result in results['scenarios'][scenario].items():
+                if isinstance(result, dict) and 'p99_ms' in result:
+                    print(f'   {name:<24} {result["ops_per_sec"]:>10.0f} ops/s  '
+                          f'p50 {result["p50_ms"]:8.2f}ms  p99 {result["p99_ms"]:8.2f}ms')
+            print(f'   peak RSS {results["scenarios"][scenario]["peak_rss_mb"]:.0f} MB')
+
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'💾 Results saved to {args.out}')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f'❌ Regression: {line}')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
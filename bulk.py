@@ -0,0 +1,205 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+
+# Bulk product import and order export.
+#
+# Imports are parsed, validated and applied IMPORT_BATCH_SIZE rows at a time,
+# each batch as one unit (a single WAL record or SQLite transaction), with
+# the flush run in a thread and a pause between batches so the event loop
+# keeps serving other interactions.
+# Exports are written chunk by chunk into a spooled file, so memory stays
+# bounded however long the order history is. Archived orders are
+# decompressed in a thread, a chunk at a time.
+
+IMPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 1000
+
+PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'supplier_cost', 'stock', 'active',
+                  'reorder_threshold', 'supplier_id', 'supplier_sku')
+ORDER_EXPORT_FIELDS = ('order_id', 'product_id', 'product_name', 'quantity', 'total', 'profit',
+                       'customer_name', 'customer_email', 'shipping_address', 'status',
+                       'created_at', 'created_by')
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y', 'active')
+FALSE_VALUES = ('0', 'false', 'no', 'n', 'inactive')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.errors = []
+
+    def errors_csv(self):
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(('line', 'error'))
+        writer.writerows(self.errors)
+        return out.getvalue()
+
+
+def read_rows(lines, fmt):
+    # Yields (line_number, row dict or None, parse error or None)
+    if fmt == 'jsonl':
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield number, None, f"invalid JSON: {error}"
+                continue
+            if not isinstance(row, dict):
+                yield number, None, "expected a JSON object"
+                continue
+            yield number, row, None
+        return
+
+    reader = csv.DictReader(lines)
+    for row in reader:
+        yield reader.line_num, row, None
+
+
+def _text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def validate_product(row, existing):
+    # Returns the fields to write, or raises ValueError with a message for
+    # the error report. New products need every field; updates to an
+    # existing ID only need the ones being changed.
+    fields = {}
+    for field in ('name', 'description', 'supplier_id', 'supplier_sku'):
+        value = _text(row, field)
+        if value:
+            fields[field] = value
+
+    for field, convert in (('price', float), ('supplier_cost', float), ('stock', int),
+                           ('reorder_threshold', int)):
+        value = _text(row, field)
+        if not value:
+            continue
+        try:
+            fields[field] = convert(value)
+        except ValueError:
+            raise ValueError(f"{field} must be a number, got {value!r}")
+        if fields[field] < 0:
+            raise ValueError(f"{field} can't be negative")
+
+    active = _text(row, 'active').lower()
+    if active in TRUE_VALUES:
+        fields['active'] = True
+    elif active in FALSE_VALUES:
+        fields['active'] = False
+    elif active:
+        raise ValueError(f"active must be yes/no, got {active!r}")
+
+    if existing is None:
+        missing = [f for f in ('name', 'price', 'supplier_cost', 'stock') if f not in fields]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        fields.setdefault('description', '')
+        fields.setdefault('active', True)
+        fields['created_at'] = datetime.now().isoformat()
+
+    price = fields.get('price', existing['price'] if existing else 0)
+    cost = fields.get('supplier_cost', existing['supplier_cost'] if existing else 0)
+    if 'price' in fields or 'supplier_cost' in fields:
+        fields['profit_margin'] = round((price - cost) / price * 100, 2) if price > 0 else 0
+    return fields
+
+
+async def import_products(store, lines, fmt, new_id, pause):
+    result = ImportResult()
+    seen = set()
+
+    def apply_batch(batch):
+        # Validated and written without awaiting in between, so no product
+        # can change after it's been checked
+        pending = []
+        for number, row, error in batch:
+            if error:
+                result.errors.append((number, error))
+                continue
+            product_id = _text(row, 'id') or None
+            if product_id in seen:
+                result.errors.append((number, f"duplicate id {product_id}"))
+                continue
+            existing = store.get_product(product_id) if product_id else None
+            try:
+                fields = validate_product(row, existing)
+            except ValueError as error:
+                result.errors.append((number, str(error)))
+                continue
+            if product_id:
+                seen.add(product_id)
+            pending.append((product_id, existing, fields))
+
+        # Only rows that passed validation get here
+        with store.batch(flush=False):
+            for product_id, existing, fields in pending:
+                if existing is not None:
+                    store.update_product(product_id, **fields)
+                    result.updated.append(product_id)
+                    continue
+                if product_id:
+                    store.observe_id('products', product_id)
+                else:
+                    product_id = new_id()
+                store.put_product(product_id, fields)
+                result.created.append(product_id)
+
+    batch = []
+    for entry in read_rows(lines, fmt):
+        batch.append(entry)
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            apply_batch(batch)
+            batch = []
+            await asyncio.to_thread(store.flush)
+            await pause()
+    apply_batch(batch)
+    await asyncio.to_thread(store.flush)
+    return result
+
+
+async def export_orders(store, fmt, out, pause, archive=None):
+    # Writes every order, archived ones first, to the binary file `out`,
+    # calling `pause()` between chunks so the event loop keeps serving
+    # other interactions
+    text = io.TextIOWrapper(out, encoding='utf-8', newline='', write_through=True)
+    writer = csv.writer(text) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(ORDER_EXPORT_FIELDS)
+
+    def write(chunk):
+        for order_id, order in chunk:
+            if writer:
+                writer.writerow([order_id] + [order.get(field) for field in ORDER_EXPORT_FIELDS[1:]])
+            else:
+                text.write(json.dumps({'order_id': order_id, **order}) + '\n')
+        return len(chunk)
+
+    count = 0
+    if archive is not None:
+        archived = archive.iter_chunks(EXPORT_CHUNK_SIZE)
+        while True:
+            chunk = await asyncio.to_thread(next, archived, None)
+            if chunk is None:
+                break
+            # An order that changed while it was being archived stays in the
+            # store, and so does one archived just before a crash; either
+            # way the store's copy is the current one
+            count += write([(order_id, order) for order_id, order in chunk if store.get_order(order_id) is None])
+            await pause()
+    for chunk in store.iter_order_chunks(EXPORT_CHUNK_SIZE):
+        count += write(chunk)
+        await pause()
+
+    text.flush()
+    text.detach()
+    out.seek(0)
+    return count
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+# Rendered embeds for the read-heavy commands. Each entry is stored with the
+# store version it was rendered from; a lookup whose version has moved on is
+# a miss and gets re-rendered, so writes never have to find and evict the
+# entries they make stale. Least recently used entries go once full.
+
+
+class EmbedCache:
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key, version, render):
+        # Returns the value rendered for `version`, calling `render()` to
+        # build it on a miss
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = render()
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    def discard(self, key):
+        self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,255 @@
+import heapq
+import re
+from bisect import bisect_left, insort
+from records import created_key, to_micros
+
+# In-memory secondary indexes for JsonStore. (SqliteStore gets the same
+# lookups from its table indexes.)
+
+
+def customer_key(email):
+    return email.strip().lower()
+
+
+class OrderIndex:
+    # Posting lists of (creation time in microseconds, order_id), kept
+    # sorted, for every order and per status, customer email and product. A filtered listing is a
+    # bisect for the date range plus a slice from the end for newest-first.
+
+    def __init__(self):
+        self.all = []
+        self.by_status = {}
+        self.by_customer = {}
+        self.by_product = {}
+
+    @classmethod
+    def from_orders(cls, orders):
+        index = cls()
+        # Bulk build: append everything, sort each list once at the end
+        for order_id, order in orders:
+            entry = (created_key(order), order_id)
+            index.all.append(entry)
+            for postings, key in index._dimensions(order):
+                postings.setdefault(key, []).append(entry)
+        index.all.sort()
+        for postings in (index.by_status, index.by_customer, index.by_product):
+            for entries in postings.values():
+                entries.sort()
+        return index
+
+    def _dimensions(self, order):
+        return (
+            (self.by_status, order['status']),
+            (self.by_customer, customer_key(order['customer_email'])),
+            (self.by_product, order['product_id'])
+        )
+
+    def _insert(self, postings, key, entry):
+        insort(postings.setdefault(key, []), entry)
+
+    def _discard(self, postings, key, entry):
+        entries = postings.get(key)
+        if not entries:
+            return
+        i = bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+        if not entries:
+            del postings[key]
+
+    def order_changed(self, order_id, old, new):
+        old_entry = (created_key(old), order_id) if old is not None else None
+        new_entry = (created_key(new), order_id) if new is not None else None
+
+        if old_entry != new_entry:
+            if old_entry is not None:
+                i = bisect_left(self.all, old_entry)
+                if i < len(self.all) and self.all[i] == old_entry:
+                    del self.all[i]
+            if new_entry is not None:
+                insort(self.all, new_entry)
+
+        old_keys = self._dimensions(old) if old is not None else ()
+        new_keys = self._dimensions(new) if new is not None else ()
+        # Only touch the posting lists whose key actually changed, so a
+        # status update moves one entry between two status lists
+        for (postings, old_key), (_, new_key) in zip(old_keys, new_keys):
+            if old_key != new_key or old_entry != new_entry:
+                self._discard(postings, old_key, old_entry)
+                self._insert(postings, new_key, new_entry)
+        if old is None and new is not None:
+            for postings, key in new_keys:
+                self._insert(postings, key, new_entry)
+        elif new is None and old is not None:
+            for postings, key in old_keys:
+                self._discard(postings, key, old_entry)
+
+    def created_before(self, status, before, limit):
+        # Up to `limit` (created, order_id) entries with this status, oldest first
+        entries = self.by_status.get(status, [])
+        return entries[:min(bisect_left(entries, (to_micros(before),)), limit)]
+
+    def query(self, orders, status=None, customer=None, product_id=None,
+              since=None, until=None, offset=0, limit=10):
+        # `since` and `until` are ISO dates or timestamps bounding created_at
+        # as [since, until). Returns the number of matches and one page of
+        # (order_id, order), newest first.
+        filters = []
+        if status is not None:
+            filters.append(('status', status, self.by_status.get(status, [])))
+        if customer is not None:
+            key = customer_key(customer)
+            filters.append(('customer', key, self.by_customer.get(key, [])))
+        if product_id is not None:
+            filters.append(('product_id', product_id, self.by_product.get(product_id, [])))
+
+        # Walk the smallest posting list, check the rest against the records
+        if filters:
+            filters.sort(key=lambda f: len(f[2]))
+            entries = filters[0][2]
+            checks = filters[1:]
+        else:
+            entries = self.all
+            checks = []
+
+        low = bisect_left(entries, (to_micros(since),)) if since else 0
+        high = bisect_left(entries, (to_micros(until),)) if until else len(entries)
+
+        if not checks:
+            total = max(high - low, 0)
+            end = max(high - offset, low)
+            page = entries[max(end - limit, low):end]
+            return total, [(order_id, orders[order_id]) for _, order_id in reversed(page)]
+
+        total = 0
+        page = []
+        for i in range(high - 1, low - 1, -1):
+            order_id = entries[i][1]
+            order = orders[order_id]
+            if all(_matches(order, field, value) for field, value, _ in checks):
+                if offset <= total < offset + limit:
+                    page.append((order_id, order))
+                total += 1
+        return total, page
+
+
+def _matches(order, field, value):
+    if field == 'customer':
+        return customer_key(order['customer_email']) == value
+    return order[field] == value
+
+
+# Product search for /search and the product_id autocompletes. An inverted
+# index maps each word in a product's name and description to the products
+# containing it. Prefixes come from a sorted vocabulary, and typos from a
+# trigram index over that vocabulary, so a lookup never scans the catalog.
+WORD = re.compile(r'[a-z0-9]+')
+NAME_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+
+def tokenize(text):
+    return WORD.findall(text.lower())
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ProductSearch:
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []
+        self.by_trigram = {}
+        self.names = {}
+        self._documents = {}
+
+    @classmethod
+    def from_products(cls, products):
+        search = cls()
+        for product_id, product in products:
+            search.add(product_id, product)
+        return search
+
+    def add(self, product_id, product):
+        weights = {}
+        for token in tokenize(product.get('description', '')):
+            weights[token] = DESCRIPTION_WEIGHT
+        for token in tokenize(product['name']):
+            weights[token] = NAME_WEIGHT
+
+        for token, weight in weights.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                insort(self.vocabulary, token)
+                for gram in trigrams(token):
+                    self.by_trigram.setdefault(gram, set()).add(token)
+            postings[product_id] = weight
+        self._documents[product_id] = weights
+        self.names[product_id] = product['name']
+
+    def remove(self, product_id):
+        self.names.pop(product_id, None)
+        for token in self._documents.pop(product_id, {}):
+            postings = self.postings[token]
+            postings.pop(product_id, None)
+            if postings:
+                continue
+            del self.postings[token]
+            del self.vocabulary[bisect_left(self.vocabulary, token)]
+            for gram in trigrams(token):
+                tokens = self.by_trigram[gram]
+                tokens.discard(token)
+                if not tokens:
+                    del self.by_trigram[gram]
+
+    def product_changed(self, product_id, old, new):
+        if old is not None and new is not None and \
+                old['name'] == new['name'] and old.get('description') == new.get('description'):
+            return
+        if old is not None:
+            self.remove(product_id)
+        if new is not None:
+            self.add(product_id, new)
+
+    def _similar(self, term, limit=10):
+        grams = trigrams(term)
+        shared = {}
+        for gram in grams:
+            for token in self.by_trigram.get(gram, ()):
+                shared[token] = shared.get(token, 0) + 1
+        scored = []
+        for token, count in shared.items():
+            # Jaccard similarity; a padded token has len + 1 trigrams at most
+            similarity = count / (len(grams) + len(token) + 1 - count)
+            if similarity >= 0.4:
+                scored.append((similarity, token))
+        return heapq.nlargest(limit, scored)
+
+    def search(self, query, limit=25):
+        scores = {}
+        for term in tokenize(query):
+            matched = {}
+            for product_id, weight in self.postings.get(term, {}).items():
+                matched[product_id] = weight * 2.0
+
+            # Prefix matches, capped so a one-letter query stays cheap
+            i = bisect_left(self.vocabulary, term)
+            for token in self.vocabulary[i:i + 50]:
+                if not token.startswith(term):
+                    break
+                for product_id, weight in self.postings[token].items():
+                    matched[product_id] = max(matched.get(product_id, 0), weight * 1.5)
+
+            if len(matched) < limit and len(term) >= 3:
+                for similarity, token in self._similar(term):
+                    for product_id, weight in self.postings[token].items():
+                        matched[product_id] = max(matched.get(product_id, 0), weight * similarity)
+
+            for product_id, score in matched.items():
+                scores[product_id] = scores.get(product_id, 0) + score
+
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+        return [product_id for product_id, _ in best]
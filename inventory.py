@@ -0,0 +1,129 @@
+import asyncio
+
+# Stock changes go through a StockLedger so concurrent orders can't oversell.
+# Each product has its own lock, so a burst of orders for one product never
+# holds up orders for another. Stock for an order is reserved first, then
+# committed (written to the store) once the order itself has been saved, or
+# released if anything goes wrong in between.
+#
+# Every write to a product's stock ends up in _adjust or set_stock, which
+# tell the ledger's listeners (old stock, new stock) once it's stored.
+
+
+class OutOfStock(Exception):
+    def __init__(self, available):
+        super().__init__(f"only {available} available")
+        self.available = available
+
+
+class Reservation:
+    def __init__(self, ledger, product_id, quantity):
+        self.ledger = ledger
+        self.product_id = product_id
+        self.quantity = quantity
+        self.done = False
+
+    def commit(self):
+        if not self.done:
+            self.done = True
+            self.ledger._settle(self, commit=True)
+
+    def release(self):
+        if not self.done:
+            self.done = True
+            self.ledger._settle(self, commit=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class StockLedger:
+    def __init__(self, store):
+        self.store = store
+        self.reserved = {}
+        self.listeners = []
+        self._locks = {}
+
+    def lock(self, product_id):
+        lock = self._locks.get(product_id)
+        if lock is None:
+            lock = self._locks[product_id] = asyncio.Lock()
+        return lock
+
+    def available(self, product_id):
+        product = self.store.get_product(product_id)
+        if product is None:
+            return 0
+        return product['stock'] - self.reserved.get(product_id, 0)
+
+    async def reserve(self, product_id, quantity):
+        # Anything below one would add stock instead of holding it, and the
+        # reservation's release would then take it away
+        if quantity <= 0:
+            raise ValueError(f"quantity must be positive, got {quantity}")
+        async with self.lock(product_id):
+            available = self.available(product_id)
+            if quantity > available:
+                raise OutOfStock(available)
+            self.reserved[product_id] = self.reserved.get(product_id, 0) + quantity
+        return Reservation(self, product_id, quantity)
+
+    def _settle(self, reservation, commit):
+        # No await in here, so the hold and the stored stock change together
+        product_id = reservation.product_id
+        held = self.reserved.get(product_id, 0) - reservation.quantity
+        if held > 0:
+            self.reserved[product_id] = held
+        else:
+            self.reserved.pop(product_id, None)
+        if commit:
+            self._adjust(product_id, -reservation.quantity)
+
+    def _adjust(self, product_id, delta):
+        product = self.store.get_product(product_id)
+        if product is not None:
+            old_stock = product['stock']
+            self.store.update_product(product_id, stock=old_stock + delta)
+            self._stock_changed(product_id, old_stock, old_stock + delta)
+
+    def _stock_changed(self, product_id, old_stock, new_stock):
+        for listener in self.listeners:
+            listener(product_id, old_stock, new_stock)
+
+    async def set_order_status(self, order_id, status):
+        # Cancelling an order returns its stock and reopening one takes it
+        # back, so the order is re-read and updated under the product's lock.
+        # Returns the previous status, or None if the order doesn't exist.
+        order = self.store.get_order(order_id)
+        if order is None:
+            return None
+        product_id = order['product_id']
+        async with self.lock(product_id):
+            order = self.store.get_order(order_id)
+            old_status = order['status']
+            if old_status != 'cancelled' and status == 'cancelled':
+                self._adjust(product_id, order['quantity'])
+            elif old_status == 'cancelled' and status != 'cancelled':
+                available = self.available(product_id)
+                if order['quantity'] > available:
+                    raise OutOfStock(available)
+                self._adjust(product_id, -order['quantity'])
+            self.store.update_order(order_id, status=status)
+            return old_status
+
+    async def set_stock(self, product_id, quantity):
+        async with self.lock(product_id):
+            product = self.store.get_product(product_id)
+            if product is None:
+                return None
+            old_stock = product['stock']
+            self.store.update_product(product_id, stock=quantity)
+            self._stock_changed(product_id, old_stock, quantity)
+            return old_stock
+
+    def forget(self, product_id):
+        self._locks.pop(product_id, None)
+        self.reserved.pop(product_id, None)
@@ -1,45 +1,195 @@
 import discord
-from discord.ext import commands
+from discord.ext import commands, tasks
 from discord import app_commands
+import asyncio
+import hashlib
+import io
 import json
 import os
-from datetime import datetime
+import tempfile
+from datetime import date, datetime, timedelta
 from typing import Optional
-from flask import Flask
-from threading import Thread
-
-# Flask app to keep bot alive
-app = Flask('')
-
-@app.route('/')
-def home():
-    return "✅ Dropshipping Bot is running!"
-
-def run():
-    app.run(host='0.0.0.0', port=8080)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+from storage import PARTS, open_store, migrate_json_to_sqlite
+from inventory import OutOfStock
+from cache import EmbedCache
+from web import HealthServer
+from perf import PerfMonitor
+from archive import OrderArchive
+from shops import NotOurGuild, Shop, ShopRegistry
+from notify import Notifier
+from alerts import StockWatcher
+from suppliers import SupplierSync
+import bulk
 
 # Bot configuration
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
-
 # Data storage
 DATA_FILE = 'bot_data.json'
+SQLITE_FILE = 'bot_data.db'
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'json')  # 'json' or 'sqlite'
+# Each guild's data lives under GUILD_DATA_DIR/<guild id>/. The guild named
+# by LEGACY_GUILD_ID keeps the files in the working directory from before
+# guilds had their own; unset, they're moved to the one guild the bot is in
+# (see adopt_legacy_data).
+GUILD_DATA_DIR = os.getenv('GUILD_DATA_DIR', 'guilds')
+LEGACY_GUILD_ID = int(os.getenv('LEGACY_GUILD_ID', '0')) or None
+# Writes are batched on a background thread: at most every FLUSH_INTERVAL_MS,
+# or sooner once FLUSH_AFTER mutations are waiting
+FLUSH_INTERVAL_MS = int(os.getenv('FLUSH_INTERVAL_MS', '200'))
+FLUSH_AFTER = int(os.getenv('FLUSH_AFTER', '100'))
+# 'sequential' gives ORD-0001, ORD-0002, ...; 'time' gives ORD-20260101-000001
+# so that order IDs sort chronologically as plain strings
+ORDER_ID_STYLE = os.getenv('ORDER_ID_STYLE', 'sequential')
+# Rendered embeds kept for /product, /order, /products, /orders and /stats
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', '1000'))
+# Delivered and cancelled orders older than this many days move to
+# compressed files under each guild's ARCHIVE_DIR (JSON backend; 0 turns it off)
+ARCHIVE_DIR = 'archive'
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '90'))
+ARCHIVE_BATCH_SIZE = 5000
+# Health checks and Prometheus metrics
+WEB_PORT = int(os.getenv('PORT', '8080'))
+# Commands slower than this are logged with a breakdown of where time went
+PERF_SLOW_MS = int(os.getenv('PERF_SLOW_MS', '1000'))
+# Hash of the last command tree synced with Discord; the tree is only
+# synced again when the commands change
+COMMAND_HASH_FILE = 'command_tree.sha256'
+# How long a command waits for the store to finish loading before replying
+# that it's still starting up (Discord allows 3 seconds for a response)
+LOADING_WAIT_SECONDS = 2.0
+# Notifications to the order and notification channels set with /channels
+# are queued and sent in the background: a burst within NOTIFY_LINGER_MS
+# goes out as one message
+NOTIFY_LINGER_MS = int(os.getenv('NOTIFY_LINGER_MS', '500'))
+# Low-stock alerts go to notification_channel too. Products without their
+# own /reorderlevel use LOW_STOCK_THRESHOLD; unset, only those products alert.
+LOW_STOCK_THRESHOLD = int(os.environ['LOW_STOCK_THRESHOLD']) if os.getenv('LOW_STOCK_THRESHOLD') else None
+# Supplier cost/stock feeds are synced every SUPPLIER_SYNC_MINUTES (0 turns
+# it off). Feeds that aren't URLs are files in SUPPLIER_FEED_DIR.
+SUPPLIER_SYNC_MINUTES = int(os.getenv('SUPPLIER_SYNC_MINUTES', '60'))
+SUPPLIER_FEED_DIR = os.getenv('SUPPLIER_FEED_DIR', 'feeds')
+# Sharding. Unset runs a single shard. SHARD_COUNT=auto lets Discord pick
+# the count; SHARD_COUNT=N with SHARD_IDS=0,1,... runs only those shards,
+# so several processes (each with its own PORT) can split the guilds, and
+# their data, between them.
+SHARD_COUNT = os.getenv('SHARD_COUNT')
+SHARD_IDS = [int(n) for n in os.getenv('SHARD_IDS', '').split(',') if n.strip()] or None
+
+# The parts of the store each command reads; anything unlisted waits for
+# all of them. The small 'header' part is there as soon as a guild is opened.
+COMMAND_NEEDS = {
+    'help': (),
+    'perf': (),
+    'addproduct': ('header', 'products'),
+    'products': ('header', 'products'),
+    'product': ('header', 'products'),
+    'search': ('header', 'products'),
+    'updatestock': ('header', 'products'),
+    'reorderlevel': ('header', 'products'),
+    'supplier': ('header',),
+    'suppliers': ('header',),
+    'channels': ('header',),
+    'syncsuppliers': ('header', 'products'),
+    'deleteproduct': ('header', 'products'),
+    'importproducts': ('header', 'products'),
+    'orders': ('header', 'orders'),
+    'order': ('header', 'orders'),
+    'report': ('header', 'orders'),
+    'exportorders': ('header', 'orders'),
+    'createorder': PARTS,
+    'updatestatus': PARTS,
+    'stats': PARTS
+}
+
+class StillLoading(app_commands.CheckFailure):
+    pass
+
+async def send_ephemeral(interaction, message):
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+class LoadingAwareTree(app_commands.CommandTree):
+    # A guild's store finishes loading after it's opened; a command waits a
+    # moment for the parts of it that it reads, and otherwise says so
+    # rather than running against half the data
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        name = (interaction.data or {}).get('name')
+        needs = COMMAND_NEEDS.get(name, PARTS)
+        if not needs:
+            return True
+        if interaction.guild_id is None:
+            raise app_commands.NoPrivateMessage()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + LOADING_WAIT_SECONDS
+        if not shops.is_open(interaction.guild_id):
+            # Anything that goes wrong opening the guild's data is answered
+            # here; only AppCommandErrors reach on_app_command_error
+            try:
+                if not await self._open_shop(interaction, name):
+                    return False
+            except NotOurGuild as error:
+                print(f"⚠️ {error}")
+                if interaction.type is not discord.InteractionType.autocomplete:
+                    await send_ephemeral(interaction, "❌ This server is handled by another instance of the bot.")
+                return False
+            except Exception:
+                # Logged by the registry; the next command tries again
+                if interaction.type is not discord.InteractionType.autocomplete:
+                    await send_ephemeral(interaction, "❌ This server's data couldn't be opened, try again later.")
+                return False
+        store = shop_for(interaction).store
+        if store.is_ready(*needs):
+            return True
+        if interaction.type is discord.InteractionType.autocomplete:
+            return False
+        try:
+            await asyncio.wait_for(store.wait_ready(*needs), max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            raise StillLoading(f"/{name} is waiting for {', '.join(needs)} to load") from None
+        return True
+
+    async def _open_shop(self, interaction, name):
+        # True once the guild's shop is open and the command can go ahead
+        opening = shops.opening(interaction.guild_id)
+        if interaction.type is discord.InteractionType.autocomplete:
+            return False
+        try:
+            await asyncio.wait_for(asyncio.shield(opening), LOADING_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            # Only a first open that migrates a large store to SQLite takes
+            # this long. Acknowledge the command before Discord's deadline,
+            # and say when the data is there.
+            await interaction.response.defer(ephemeral=True, thinking=True)
+            await asyncio.shield(opening)
+            await interaction.followup.send(f"✅ This server's data is ready, run /{name} again.", ephemeral=True)
+            return False
+        return True
+
+def make_bot():
+    options = {'command_prefix': '!', 'intents': intents, 'tree_cls': LoadingAwareTree}
+    if not SHARD_COUNT and not SHARD_IDS:
+        return commands.Bot(**options)
+    if SHARD_COUNT and SHARD_COUNT != 'auto':
+        options['shard_count'] = int(SHARD_COUNT)
+    if SHARD_IDS:
+        if 'shard_count' not in options:
+            raise SystemExit("❌ SHARD_IDS needs SHARD_COUNT set to a number")
+        options['shard_ids'] = SHARD_IDS
+    return commands.AutoShardedBot(**options)
+
+bot = make_bot()
 
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
+def default_data():
     return {
         'products': {},
         'orders': {},
         'suppliers': {},
+        'counters': {'products': 0, 'orders': 0},
         'settings': {
             'order_channel': None,
             'notification_channel': None,
@@ -47,11 +197,91 @@ def load_data():
         }
     }
 
-def save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
+def load_store(data_file, sqlite_file):
+    options = {'flush_interval_ms': FLUSH_INTERVAL_MS, 'flush_after': FLUSH_AFTER}
+    if STORAGE_BACKEND == 'sqlite':
+        if not os.path.exists(sqlite_file) and os.path.exists(data_file):
+            print(f"📦 Migrating {data_file} to {sqlite_file}...")
+            migrate_json_to_sqlite(data_file, sqlite_file, default_data).close()
+        return open_store('sqlite', sqlite_file, default_data, **options).open()
+    # JSON mutations are appended to bot_data.json.wal and compacted in the
+    # background. Only the small sections are read here; products and orders
+    # stream in afterwards (see ShopRegistry).
+    return open_store('json', data_file, default_data, **options).open()
+
+def shop_paths(guild_id):
+    if guild_id == LEGACY_GUILD_ID:
+        return DATA_FILE, SQLITE_FILE, ARCHIVE_DIR
+    root = os.path.join(GUILD_DATA_DIR, str(guild_id))
+    return os.path.join(root, DATA_FILE), os.path.join(root, SQLITE_FILE), os.path.join(root, ARCHIVE_DIR)
+
+def open_shop(guild_id):
+    data_file, sqlite_file, archive_dir = shop_paths(guild_id)
+    os.makedirs(os.path.dirname(data_file) or '.', exist_ok=True)
+    store = load_store(data_file, sqlite_file)
+    monitor.instrument_store(store)
+    shop = Shop(guild_id, store, OrderArchive(archive_dir).load())
+    stock_watcher.watch(shop)
+    return shop
+
+# What a deployment from before per-guild data kept in the working directory
+LEGACY_FILES = (DATA_FILE, DATA_FILE + '.wal', DATA_FILE + '.wal.compacting',
+                SQLITE_FILE, SQLITE_FILE + '-wal', SQLITE_FILE + '-shm', ARCHIVE_DIR)
+
+async def adopt_legacy_data():
+    # Runs before the gateway connects, so no guild can have been opened.
+    # Rather than leave the old data unused, the bot won't start when it
+    # can't tell which guild that data belongs to.
+    if LEGACY_GUILD_ID is not None:
+        return
+    found = [path for path in LEGACY_FILES if os.path.exists(path)]
+    if DATA_FILE not in found and SQLITE_FILE not in found:
+        return
+    guilds = [guild async for guild in bot.fetch_guilds(limit=2)]
+    if len(guilds) != 1:
+        servers = "isn't in any server" if not guilds else "is in more than one server"
+        raise SystemExit(f"❌ {DATA_FILE} is from before each server had its own data and the bot {servers}; "
+                         f"set LEGACY_GUILD_ID to the server it belongs to")
+    guild_id = guilds[0].id
+    if not owns_guild(guild_id):
+        return  # The process running that guild's shard moves it
+    root = os.path.dirname(shop_paths(guild_id)[0])
+    if os.path.isdir(root) and os.listdir(root):
+        raise SystemExit(f"❌ Both {DATA_FILE} and {root} hold data for server {guild_id}; "
+                         f"set LEGACY_GUILD_ID={guild_id} to keep using {DATA_FILE}, or move one of them aside")
+    os.makedirs(root, exist_ok=True)
+    for path in found:
+        os.replace(path, os.path.join(root, path))
+    print(f"📦 Moved {DATA_FILE} to {root}, the data of the only server the bot is in")
+
+def owns_guild(guild_id):
+    # Discord sends a guild's events to shard (guild_id >> 22) % shard_count,
+    # so with fixed shard IDs each process only ever opens its own guilds
+    if not SHARD_IDS:
+        return True
+    return (guild_id >> 22) % int(SHARD_COUNT) in SHARD_IDS
+
+monitor = PerfMonitor(PERF_SLOW_MS)
+shops = ShopRegistry(open_shop, owns_guild)
+web_server = HealthServer(bot, shops, port=WEB_PORT)
+notifier = Notifier(bot, linger=NOTIFY_LINGER_MS / 1000)
+web_server.add_collector(notifier.metrics)
+stock_watcher = StockWatcher(notifier, LOW_STOCK_THRESHOLD)
+web_server.add_collector(stock_watcher.metrics)
+supplier_sync = SupplierSync(SUPPLIER_FEED_DIR)
+web_server.add_collector(supplier_sync.metrics)
+
+def shop_for(interaction):
+    return shops.get(interaction.guild_id)
+
+def new_product_id(store):
+    return str(store.next_id('products'))
 
-data = load_data()
+def new_order_id(store):
+    seq = store.next_id('orders')
+    if ORDER_ID_STYLE == 'time':
+        return f"ORD-{datetime.now():%Y%m%d}-{seq:06d}"
+    return f"ORD-{seq:04d}"
 
 # Product Management
 class ProductModal(discord.ui.Modal, title='Add Product'):
@@ -88,8 +318,6 @@ class ProductModal(discord.ui.Modal, title='Add Product'):
     )
     
     async def on_submit(self, interaction: discord.Interaction):
-        product_id = str(len(data['products']) + 1)
-        
         try:
             price_val = float(self.price.value)
             cost_val = float(self.supplier_cost.value)
@@ -97,7 +325,9 @@ class ProductModal(discord.ui.Modal, title='Add Product'):
             profit = price_val - cost_val
             margin = (profit / price_val * 100) if price_val > 0 else 0
             
-            data['products'][product_id] = {
+            store = shop_for(interaction).store
+            product_id = new_product_id(store)
+            store.put_product(product_id, {
                 'name': self.name.value,
                 'description': self.description.value,
                 'price': price_val,
@@ -106,9 +336,7 @@ class ProductModal(discord.ui.Modal, title='Add Product'):
                 'profit_margin': round(margin, 2),
                 'created_at': datetime.now().isoformat(),
                 'active': True
-            }
-            
-            save_data(data)
+            })
             
             embed = discord.Embed(
                 title="✅ Product Added Successfully",
@@ -165,31 +393,48 @@ class OrderModal(discord.ui.Modal, title='Create Order'):
     
     async def on_submit(self, interaction: discord.Interaction):
         product_id = self.product_id.value
+        shop = shop_for(interaction)
+        store = shop.store
         
-        if product_id not in data['products']:
+        product = store.get_product(product_id)
+        if product is None:
             await interaction.response.send_message(
                 f"❌ Product ID {product_id} not found!",
                 ephemeral=True
             )
             return
         
-        product = data['products'][product_id]
-        
         try:
             qty = int(self.quantity.value)
-            
-            if qty > product['stock']:
-                await interaction.response.send_message(
-                    f"❌ Insufficient stock! Available: {product['stock']}",
-                    ephemeral=True
-                )
-                return
-            
-            order_id = f"ORD-{len(data['orders']) + 1:04d}"
+        except ValueError:
+            await interaction.response.send_message(
+                "❌ Invalid quantity! Please enter a valid number.",
+                ephemeral=True
+            )
+            return
+        if qty <= 0:
+            await interaction.response.send_message(
+                "❌ Invalid quantity! Please order at least 1.",
+                ephemeral=True
+            )
+            return
+        
+        try:
+            reservation = await shop.ledger.reserve(product_id, qty)
+        except OutOfStock as error:
+            await interaction.response.send_message(
+                f"❌ Insufficient stock! Available: {error.available}",
+                ephemeral=True
+            )
+            return
+        
+        # The reservation is released if the order isn't saved
+        with reservation:
+            order_id = new_order_id(store)
             total = product['price'] * qty
             profit = (product['price'] - product['supplier_cost']) * qty
             
-            data['orders'][order_id] = {
+            store.put_order(order_id, {
                 'product_id': product_id,
                 'product_name': product['name'],
                 'quantity': qty,
@@ -201,62 +446,84 @@ class OrderModal(discord.ui.Modal, title='Create Order'):
                 'status': 'pending',
                 'created_at': datetime.now().isoformat(),
                 'created_by': str(interaction.user.id)
-            }
+            })
             
             # Update stock
-            data['products'][product_id]['stock'] -= qty
-            save_data(data)
-            
-            # Create order confirmation embed
-            embed = discord.Embed(
-                title="🛒 New Order Created",
-                color=discord.Color.blue(),
-                timestamp=datetime.now()
-            )
-            embed.add_field(name="Order ID", value=order_id, inline=True)
-            embed.add_field(name="Status", value="⏳ Pending", inline=True)
-            embed.add_field(name="Product", value=product['name'], inline=False)
-            embed.add_field(name="Quantity", value=str(qty), inline=True)
-            embed.add_field(name="Total", value=f"${total:.2f}", inline=True)
-            embed.add_field(name="Profit", value=f"${profit:.2f}", inline=True)
-            embed.add_field(name="Customer", value=self.customer_name.value, inline=True)
-            embed.add_field(name="Email", value=self.customer_email.value, inline=True)
-            embed.add_field(name="Shipping Address", value=self.shipping_address.value, inline=False)
-            embed.set_footer(text=f"Created by {interaction.user.name}")
-            
-            await interaction.response.send_message(embed=embed)
-            
-            # Send to order channel if configured
-            if data['settings']['order_channel']:
-                channel = bot.get_channel(data['settings']['order_channel'])
-                if channel:
-                    await channel.send(embed=embed)
-                    
-        except ValueError:
-            await interaction.response.send_message(
-                "❌ Invalid quantity! Please enter a valid number.",
-                ephemeral=True
-            )
+            reservation.commit()
+        
+        # Create order confirmation embed
+        embed = discord.Embed(
+            title="🛒 New Order Created",
+            color=discord.Color.blue(),
+            timestamp=datetime.now()
+        )
+        embed.add_field(name="Order ID", value=order_id, inline=True)
+        embed.add_field(name="Status", value="⏳ Pending", inline=True)
+        embed.add_field(name="Product", value=product['name'], inline=False)
+        embed.add_field(name="Quantity", value=str(qty), inline=True)
+        embed.add_field(name="Total", value=f"${total:.2f}", inline=True)
+        embed.add_field(name="Profit", value=f"${profit:.2f}", inline=True)
+        embed.add_field(name="Customer", value=self.customer_name.value, inline=True)
+        embed.add_field(name="Email", value=self.customer_email.value, inline=True)
+        embed.add_field(name="Shipping Address", value=self.shipping_address.value, inline=False)
+        embed.set_footer(text=f"Created by {interaction.user.name}")
+        
+        await interaction.response.send_message(embed=embed)
+        
+        # Copy to the order channel if configured; sent in the background
+        notifier.post(store.get_setting('order_channel'), embed)
 
-# Slash Commands
-@bot.tree.command(name="addproduct", description="Add a new product to the catalog")
-@app_commands.checks.has_permissions(manage_messages=True)
-async def add_product(interaction: discord.Interaction):
-    await interaction.response.send_modal(ProductModal())
+# Paginated listings
+PAGE_SIZE = 10
 
-@bot.tree.command(name="products", description="View all products")
-async def list_products(interaction: discord.Interaction):
-    if not data['products']:
-        await interaction.response.send_message("📦 No products available yet!", ephemeral=True)
-        return
-    
+STATUS_EMOJI = {
+    'pending': '⏳',
+    'processing': '🔄',
+    'shipped': '📦',
+    'delivered': '✅',
+    'cancelled': '❌'
+}
+
+# One cache for every guild, with the guild ID leading each key. Listing
+# pages are keyed by (kind, filters, page) and versioned by their whole
+# collection; detail views by record ID and that record's version
+embed_cache = EmbedCache(EMBED_CACHE_SIZE)
+
+def stamped(embed):
+    # Cached embeds carry no timestamp of their own, since they may be
+    # served hours after they were rendered; each send gets a copy stamped
+    # with the time it goes out
+    embed = embed.copy()
+    embed.timestamp = datetime.now()
+    return embed
+
+def embed_cache_metrics():
+    cached = embed_cache.stats()
+    return [
+        ('embed_cache_hits_total', 'counter', 'Embed cache lookups served from cache.', [({}, cached['hits'])]),
+        ('embed_cache_misses_total', 'counter', 'Embed cache lookups that rendered.', [({}, cached['misses'])]),
+        ('embed_cache_entries', 'gauge', 'Embeds currently cached.', [({}, cached['entries'])])
+    ]
+
+web_server.add_collector(embed_cache_metrics)
+
+def fetch_products(store, offset, limit):
+    return store.count_products(), store.page_products(offset, limit)
+
+def fetch_orders(store, offset, limit, **filters):
+    if 'until' in filters:
+        # Inclusive for users, but stores take an exclusive upper bound
+        until = date.fromisoformat(filters['until']).toordinal() + 1
+        filters['until'] = date.fromordinal(until).isoformat()
+    return store.query_orders(offset=offset, limit=limit, **filters)
+
+def render_products_page(rows, page, pages, total, filters):
     embed = discord.Embed(
         title="📦 Product Catalog",
-        color=discord.Color.gold(),
-        timestamp=datetime.now()
+        color=discord.Color.gold()
     )
     
-    for pid, product in data['products'].items():
+    for pid, product in rows:
         status = "✅ Active" if product.get('active', True) else "❌ Inactive"
         value = (
             f"**Price:** ${product['price']:.2f} | **Cost:** ${product['supplier_cost']:.2f}\n"
@@ -270,23 +537,166 @@ async def list_products(interaction: discord.Interaction):
             inline=False
         )
     
-    await interaction.response.send_message(embed=embed)
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {total} products")
+    return embed
+
+def render_orders_page(rows, page, pages, total, filters):
+    embed = discord.Embed(
+        title="📋 Order List",
+        color=discord.Color.purple()
+    )
+    if filters:
+        embed.description = " | ".join(f"**{name.replace('_', ' ').title()}:** {value}" for name, value in filters.items())
+    
+    if not rows:
+        embed.add_field(name="No matches", value="No orders match these filters.", inline=False)
+    
+    for oid, order in rows:
+        status = STATUS_EMOJI.get(order['status'], '❓')
+        value = (
+            f"**Product:** {order['product_name']}\n"
+            f"**Quantity:** {order['quantity']} | **Total:** ${order['total']:.2f}\n"
+            f"**Profit:** ${order['profit']:.2f} | **Status:** {status} {order['status'].title()}\n"
+            f"**Customer:** {order['customer_name']}"
+        )
+        embed.add_field(name=oid, value=value, inline=False)
+    
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {total} orders (newest first)")
+    return embed
+
+LISTINGS = {
+    'products': (fetch_products, render_products_page),
+    'orders': (fetch_orders, render_orders_page)
+}
+
+class JumpModal(discord.ui.Modal, title='Jump to Page'):
+    page = discord.ui.TextInput(
+        label='Page Number',
+        placeholder='1',
+        required=True,
+        max_length=6
+    )
+    
+    def __init__(self, listing):
+        super().__init__()
+        self.listing = listing
+    
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            page = int(self.page.value) - 1
+        except ValueError:
+            await interaction.response.send_message("❌ Invalid page number!", ephemeral=True)
+            return
+        
+        self.listing.page = page
+        await self.listing.show(interaction)
+
+class ListingView(discord.ui.View):
+    def __init__(self, shop, kind, filters=None):
+        super().__init__(timeout=300)
+        self.shop = shop
+        self.kind = kind
+        self.filters = filters or {}
+        self.page = 0
+    
+    def _render_page(self):
+        fetch, render_page = LISTINGS[self.kind]
+        total, rows = fetch(self.shop.store, self.page * PAGE_SIZE, PAGE_SIZE, **self.filters)
+        pages = max(1, -(-total // PAGE_SIZE))
+        if self.page >= pages:
+            return None, pages
+        return render_page(rows, self.page, pages, total, self.filters), pages
+    
+    def render(self):
+        self.page = max(self.page, 0)
+        key = (self.shop.guild_id, self.kind, tuple(sorted(self.filters.items())), self.page)
+        embed, pages = embed_cache.get(key, self.shop.store.version(self.kind), self._render_page)
+        if embed is None:
+            # Past the end, e.g. after deletions
+            self.page = pages - 1
+            return self.render()
+        
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == pages - 1
+        return stamped(embed)
+    
+    async def show(self, interaction: discord.Interaction):
+        await interaction.response.edit_message(embed=self.render(), view=self)
+    
+    @discord.ui.button(label='◀ Prev', style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self.show(interaction)
+    
+    @discord.ui.button(label='Next ▶', style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self.show(interaction)
+    
+    @discord.ui.button(label='Jump to…', style=discord.ButtonStyle.primary)
+    async def jump(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await interaction.response.send_modal(JumpModal(self))
+
+# Product search
+async def product_autocomplete(interaction: discord.Interaction, current: str):
+    # Served from the in-memory search index to stay inside Discord's
+    # autocomplete deadline; an exact ID always comes first
+    store = shop_for(interaction).store
+    if current.strip():
+        matches = store.search.search(current, 25)
+        if current in store.search.names:
+            matches = [current] + [pid for pid in matches if pid != current][:24]
+    else:
+        matches = [pid for pid, _ in store.page_products(0, 25)]
+    return [
+        app_commands.Choice(name=f"{store.search.names.get(pid, '?')} (ID {pid})"[:100], value=pid)
+        for pid in matches
+    ]
+
+# Slash Commands
+@bot.tree.command(name="addproduct", description="Add a new product to the catalog")
+@app_commands.checks.has_permissions(manage_messages=True)
+async def add_product(interaction: discord.Interaction):
+    await interaction.response.send_modal(ProductModal())
+
+@bot.tree.command(name="products", description="View all products")
+async def list_products(interaction: discord.Interaction):
+    shop = shop_for(interaction)
+    if not shop.store.count_products():
+        await interaction.response.send_message("📦 No products available yet!", ephemeral=True)
+        return
+    
+    view = ListingView(shop, 'products')
+    await interaction.response.send_message(embed=view.render(), view=view)
 
 @bot.tree.command(name="product", description="View detailed product information")
 @app_commands.describe(product_id="The product ID to view")
+@app_commands.autocomplete(product_id=product_autocomplete)
 async def view_product(interaction: discord.Interaction, product_id: str):
-    if product_id not in data['products']:
+    store = shop_for(interaction).store
+    # The embed names the product's supplier, so a supplier edit refreshes it too
+    embed = embed_cache.get(
+        (interaction.guild_id, 'product', product_id),
+        (store.version('products', product_id), store.version('suppliers')),
+        lambda: render_product(store, product_id)
+    )
+    if embed is None:
         await interaction.response.send_message(f"❌ Product ID {product_id} not found!", ephemeral=True)
         return
     
-    product = data['products'][product_id]
+    await interaction.response.send_message(embed=stamped(embed))
+
+def render_product(store, product_id):
+    product = store.get_product(product_id)
+    if product is None:
+        return None
+    
     profit = product['price'] - product['supplier_cost']
     
     embed = discord.Embed(
         title=f"📦 {product['name']}",
         description=product['description'],
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
+        color=discord.Color.blue()
     )
     embed.add_field(name="Product ID", value=product_id, inline=True)
     embed.add_field(name="Price", value=f"${product['price']:.2f}", inline=True)
@@ -295,6 +705,36 @@ async def view_product(interaction: discord.Interaction, product_id: str):
     embed.add_field(name="Profit Margin", value=f"{product['profit_margin']:.1f}%", inline=True)
     embed.add_field(name="Stock", value=str(product['stock']), inline=True)
     embed.add_field(name="Status", value="✅ Active" if product.get('active', True) else "❌ Inactive", inline=True)
+    if product.get('reorder_threshold') is not None:
+        embed.add_field(name="Reorder At", value=str(product['reorder_threshold']), inline=True)
+    if product.get('supplier_id'):
+        supplier = store.get_supplier(product['supplier_id'])
+        name = supplier.get('name', product['supplier_id']) if supplier else product['supplier_id']
+        embed.add_field(name="Supplier", value=name, inline=True)
+    return embed
+
+@bot.tree.command(name="search", description="Search products by name or description")
+@app_commands.describe(query="Words to search for (typos and partial words are fine)")
+async def search_products(interaction: discord.Interaction, query: str):
+    store = shop_for(interaction).store
+    matches = store.search.search(query, 10)
+    if not matches:
+        await interaction.response.send_message(f"🔍 No products match **{query}**.", ephemeral=True)
+        return
+    
+    embed = discord.Embed(
+        title=f"🔍 Search: {query}"[:256],
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    for pid in matches:
+        product = store.get_product(pid)
+        status = "✅ Active" if product.get('active', True) else "❌ Inactive"
+        embed.add_field(
+            name=f"ID: {pid} - {product['name']}",
+            value=f"**Price:** ${product['price']:.2f} | **Stock:** {product['stock']} | **Status:** {status}",
+            inline=False
+        )
     
     await interaction.response.send_message(embed=embed)
 
@@ -303,61 +743,90 @@ async def view_product(interaction: discord.Interaction, product_id: str):
 async def create_order(interaction: discord.Interaction):
     await interaction.response.send_modal(OrderModal())
 
-@bot.tree.command(name="orders", description="View all orders")
-async def list_orders(interaction: discord.Interaction):
-    if not data['orders']:
+@bot.tree.command(name="orders", description="View orders, optionally filtered")
+@app_commands.describe(
+    status="Only orders with this status",
+    customer="Only orders for this customer email",
+    product_id="Only orders for this product ID",
+    since="Only orders created on or after this date (YYYY-MM-DD)",
+    until="Only orders created on or before this date (YYYY-MM-DD)"
+)
+@app_commands.choices(status=[
+    app_commands.Choice(name="Pending", value="pending"),
+    app_commands.Choice(name="Processing", value="processing"),
+    app_commands.Choice(name="Shipped", value="shipped"),
+    app_commands.Choice(name="Delivered", value="delivered"),
+    app_commands.Choice(name="Cancelled", value="cancelled")
+])
+@app_commands.autocomplete(product_id=product_autocomplete)
+async def list_orders(
+    interaction: discord.Interaction,
+    status: Optional[str] = None,
+    customer: Optional[str] = None,
+    product_id: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None
+):
+    shop = shop_for(interaction)
+    if not shop.store.count_orders():
         await interaction.response.send_message("📋 No orders yet!", ephemeral=True)
         return
     
-    embed = discord.Embed(
-        title="📋 Order List",
-        color=discord.Color.purple(),
-        timestamp=datetime.now()
-    )
-    
-    status_emoji = {
-        'pending': '⏳',
-        'processing': '🔄',
-        'shipped': '📦',
-        'delivered': '✅',
-        'cancelled': '❌'
-    }
-    
-    for oid, order in list(data['orders'].items())[-10:]:
-        status = status_emoji.get(order['status'], '❓')
-        value = (
-            f"**Product:** {order['product_name']}\n"
-            f"**Quantity:** {order['quantity']} | **Total:** ${order['total']:.2f}\n"
-            f"**Profit:** ${order['profit']:.2f} | **Status:** {status} {order['status'].title()}\n"
-            f"**Customer:** {order['customer_name']}"
-        )
-        embed.add_field(name=oid, value=value, inline=False)
+    filters = {}
+    if status:
+        filters['status'] = status
+    if customer:
+        filters['customer'] = customer
+    if product_id:
+        filters['product_id'] = product_id
+    try:
+        # Validated here; the stores take ISO dates as bounds
+        if since:
+            filters['since'] = date.fromisoformat(since).isoformat()
+        if until:
+            filters['until'] = date.fromisoformat(until).isoformat()
+    except ValueError:
+        await interaction.response.send_message("❌ Invalid date! Please use YYYY-MM-DD.", ephemeral=True)
+        return
     
-    await interaction.response.send_message(embed=embed)
+    view = ListingView(shop, 'orders', filters)
+    await interaction.response.send_message(embed=view.render(), view=view)
 
 @bot.tree.command(name="order", description="View detailed order information")
 @app_commands.describe(order_id="The order ID to view")
 async def view_order(interaction: discord.Interaction, order_id: str):
-    if order_id not in data['orders']:
+    shop = shop_for(interaction)
+    embed = embed_cache.get(
+        (interaction.guild_id, 'order', order_id),
+        shop.store.version('orders', order_id),
+        lambda: render_order(shop.store, order_id)
+    )
+    if embed is None and shop.archive.may_contain(order_id):
+        # Archived orders never change, but reading one means decompressing
+        # a segment, so it happens off the event loop
+        await interaction.response.defer()
+        order = await asyncio.to_thread(shop.archive.get, order_id)
+        if order is not None:
+            await interaction.followup.send(embed=stamped(render_order(shop.store, order_id, order)))
+        else:
+            await interaction.followup.send(f"❌ Order {order_id} not found!", ephemeral=True)
+        return
+    if embed is None:
         await interaction.response.send_message(f"❌ Order {order_id} not found!", ephemeral=True)
         return
     
-    order = data['orders'][order_id]
-    
-    status_emoji = {
-        'pending': '⏳',
-        'processing': '🔄',
-        'shipped': '📦',
-        'delivered': '✅',
-        'cancelled': '❌'
-    }
+    await interaction.response.send_message(embed=stamped(embed))
+
+def render_order(store, order_id, archived=None):
+    order = archived or store.get_order(order_id)
+    if order is None:
+        return None
     
     embed = discord.Embed(
         title=f"📋 Order {order_id}",
-        color=discord.Color.blue(),
-        timestamp=datetime.now()
+        color=discord.Color.blue()
     )
-    embed.add_field(name="Status", value=f"{status_emoji.get(order['status'], '❓')} {order['status'].title()}", inline=True)
+    embed.add_field(name="Status", value=f"{STATUS_EMOJI.get(order['status'], '❓')} {order['status'].title()}", inline=True)
     embed.add_field(name="Product", value=order['product_name'], inline=True)
     embed.add_field(name="Quantity", value=str(order['quantity']), inline=True)
     embed.add_field(name="Total", value=f"${order['total']:.2f}", inline=True)
@@ -366,8 +835,9 @@ async def view_order(interaction: discord.Interaction, order_id: str):
     embed.add_field(name="Email", value=order['customer_email'], inline=True)
     embed.add_field(name="Shipping Address", value=order['shipping_address'], inline=False)
     embed.add_field(name="Created", value=order['created_at'][:10], inline=True)
-    
-    await interaction.response.send_message(embed=embed)
+    if archived:
+        embed.set_footer(text="📦 Archived order")
+    return embed
 
 @bot.tree.command(name="updatestatus", description="Update order status")
 @app_commands.describe(
@@ -383,13 +853,26 @@ async def view_order(interaction: discord.Interaction, order_id: str):
 ])
 @app_commands.checks.has_permissions(manage_messages=True)
 async def update_status(interaction: discord.Interaction, order_id: str, status: str):
-    if order_id not in data['orders']:
-        await interaction.response.send_message(f"❌ Order {order_id} not found!", ephemeral=True)
+    # Moving to or from 'cancelled' returns or re-takes the order's stock
+    shop = shop_for(interaction)
+    try:
+        old_status = await shop.ledger.set_order_status(order_id, status)
+    except OutOfStock as error:
+        await interaction.response.send_message(
+            f"❌ Can't reopen order {order_id}: only {error.available} in stock!",
+            ephemeral=True
+        )
         return
     
-    old_status = data['orders'][order_id]['status']
-    data['orders'][order_id]['status'] = status
-    save_data(data)
+    if old_status is None:
+        if shop.archive.may_contain(order_id) and await asyncio.to_thread(shop.archive.get, order_id):
+            await interaction.response.send_message(
+                f"❌ Order {order_id} is archived and can't be changed.",
+                ephemeral=True
+            )
+            return
+        await interaction.response.send_message(f"❌ Order {order_id} not found!", ephemeral=True)
+        return
     
     embed = discord.Embed(
         title="✅ Order Status Updated",
@@ -401,52 +884,221 @@ async def update_status(interaction: discord.Interaction, order_id: str, status:
     embed.add_field(name="New Status", value=status.title(), inline=True)
     
     await interaction.response.send_message(embed=embed)
+    
+    if old_status != status:
+        notifier.post(
+            shop.store.get_setting('notification_channel'),
+            render_status_change(order_id, shop.store.get_order(order_id), old_status, interaction.user)
+        )
+
+def render_status_change(order_id, order, old_status, user):
+    status = order['status']
+    embed = discord.Embed(
+        title=f"{STATUS_EMOJI.get(status, '❓')} Order {order_id} is now {status.title()}",
+        color=discord.Color.red() if status == 'cancelled' else discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Was", value=old_status.title(), inline=True)
+    embed.add_field(name="Product", value=order['product_name'], inline=True)
+    embed.add_field(name="Quantity", value=str(order['quantity']), inline=True)
+    embed.add_field(name="Customer", value=order['customer_name'], inline=True)
+    embed.add_field(name="Total", value=f"${order['total']:.2f}", inline=True)
+    embed.set_footer(text=f"Updated by {user.name}")
+    return embed
 
 @bot.tree.command(name="updatestock", description="Update product stock")
 @app_commands.describe(
     product_id="Product ID",
     quantity="New stock quantity"
 )
+@app_commands.autocomplete(product_id=product_autocomplete)
 @app_commands.checks.has_permissions(manage_messages=True)
 async def update_stock(interaction: discord.Interaction, product_id: str, quantity: int):
-    if product_id not in data['products']:
+    shop = shop_for(interaction)
+    product = shop.store.get_product(product_id)
+    if product is None:
         await interaction.response.send_message(f"❌ Product ID {product_id} not found!", ephemeral=True)
         return
     
-    old_stock = data['products'][product_id]['stock']
-    data['products'][product_id]['stock'] = quantity
-    save_data(data)
+    old_stock = await shop.ledger.set_stock(product_id, quantity)
+    if old_stock is None:
+        await interaction.response.send_message(f"❌ Product ID {product_id} not found!", ephemeral=True)
+        return
     
     embed = discord.Embed(
         title="✅ Stock Updated",
         color=discord.Color.green(),
         timestamp=datetime.now()
     )
-    embed.add_field(name="Product", value=data['products'][product_id]['name'], inline=False)
+    embed.add_field(name="Product", value=product['name'], inline=False)
     embed.add_field(name="Old Stock", value=str(old_stock), inline=True)
     embed.add_field(name="New Stock", value=str(quantity), inline=True)
     embed.add_field(name="Change", value=f"{quantity - old_stock:+d}", inline=True)
     
     await interaction.response.send_message(embed=embed)
 
+@bot.tree.command(name="reorderlevel", description="Set when a product counts as low on stock")
+@app_commands.describe(
+    product_id="Product ID",
+    threshold="Alert once stock is at or below this; -1 goes back to the default",
+    supplier_id="Supplier to suggest reordering from"
+)
+@app_commands.autocomplete(product_id=product_autocomplete)
+@app_commands.checks.has_permissions(manage_messages=True)
+async def reorder_level(interaction: discord.Interaction, product_id: str,
+                        threshold: Optional[app_commands.Range[int, -1]] = None,
+                        supplier_id: Optional[str] = None):
+    shop = shop_for(interaction)
+    product = shop.store.get_product(product_id)
+    if product is None:
+        await interaction.response.send_message(f"❌ Product ID {product_id} not found!", ephemeral=True)
+        return
+    
+    fields = {}
+    if threshold is not None:
+        fields['reorder_threshold'] = threshold if threshold >= 0 else None
+    if supplier_id is not None:
+        fields['supplier_id'] = supplier_id
+    if fields:
+        shop.store.update_product(product_id, **fields)
+        product = shop.store.get_product(product_id)
+        # The new level applies to the stock there is now
+        stock_watcher.check(shop, product_id)
+    
+    level = stock_watcher.threshold(product)
+    if level is None:
+        level_text = "Off"
+    elif product.get('reorder_threshold') is None:
+        level_text = f"{level} (default)"
+    else:
+        level_text = str(level)
+    
+    embed = discord.Embed(
+        title="✅ Reorder Level Updated" if fields else f"📦 Reorder Level: {product['name']}",
+        color=discord.Color.green() if fields else discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Product", value=product['name'], inline=False)
+    embed.add_field(name="Stock", value=str(product['stock']), inline=True)
+    embed.add_field(name="Reorder At", value=level_text, inline=True)
+    if product.get('supplier_id'):
+        supplier = shop.store.get_supplier(product['supplier_id'])
+        name = supplier.get('name', product['supplier_id']) if supplier else f"{product['supplier_id']} (not on file)"
+        embed.add_field(name="Supplier", value=name, inline=True)
+    
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="supplier", description="Add or update a supplier")
+@app_commands.describe(
+    supplier_id="Short ID for the supplier, used by /reorderlevel and imports",
+    name="Supplier name",
+    contact="Email, phone or website",
+    lead_time_days="Days from ordering to stock arriving",
+    feed_url="Cost/stock feed: an http(s) URL or a file in the feed directory; 'none' removes it"
+)
+@app_commands.checks.has_permissions(administrator=True)
+async def set_supplier(interaction: discord.Interaction, supplier_id: str, name: Optional[str] = None,
+                       contact: Optional[str] = None,
+                       lead_time_days: Optional[app_commands.Range[int, 0]] = None,
+                       feed_url: Optional[str] = None):
+    store = shop_for(interaction).store
+    existing = store.get_supplier(supplier_id)
+    if existing is None and name is None:
+        await interaction.response.send_message("❌ New suppliers need a name.", ephemeral=True)
+        return
+    
+    supplier = dict(existing or {'created_at': datetime.now().isoformat()})
+    for field, value in (('name', name), ('contact', contact), ('lead_time_days', lead_time_days)):
+        if value is not None:
+            supplier[field] = value
+    if feed_url is not None:
+        if feed_url.lower() == 'none':
+            supplier.pop('feed_url', None)
+        else:
+            supplier['feed_url'] = feed_url
+    store.put_supplier(supplier_id, supplier)
+    
+    embed = discord.Embed(
+        title="✅ Supplier Added" if existing is None else "✅ Supplier Updated",
+        color=discord.Color.green(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Supplier ID", value=supplier_id, inline=True)
+    embed.add_field(name="Name", value=supplier['name'], inline=True)
+    if supplier.get('contact'):
+        embed.add_field(name="Contact", value=supplier['contact'], inline=True)
+    if supplier.get('lead_time_days') is not None:
+        embed.add_field(name="Lead Time", value=f"{supplier['lead_time_days']} days", inline=True)
+    embed.add_field(name="Feed", value=supplier.get('feed_url', 'None'), inline=False)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="suppliers", description="View suppliers and their feed status")
+async def list_suppliers(interaction: discord.Interaction):
+    store = shop_for(interaction).store
+    embed = discord.Embed(
+        title="🚚 Suppliers",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    for supplier_id, supplier in list(store.iter_suppliers())[:25]:
+        lines = []
+        if supplier.get('contact'):
+            lines.append(f"**Contact:** {supplier['contact']}")
+        if supplier.get('lead_time_days') is not None:
+            lines.append(f"**Lead time:** {supplier['lead_time_days']} days")
+        state = supplier_sync.state(interaction.guild_id, supplier_id)
+        if not supplier.get('feed_url'):
+            lines.append("**Feed:** none")
+        elif state is None or (state.last_synced is None and state.last_error is None):
+            lines.append("**Feed:** not synced yet")
+        elif state.last_error:
+            lines.append(f"**Feed:** ❌ {state.last_error}")
+        else:
+            skipped = f", {state.skipped_rows} rows skipped" if state.skipped_rows else ""
+            lines.append(f"**Feed:** ✅ synced <t:{int(state.last_synced)}:R>{skipped}")
+        embed.add_field(name=f"{supplier_id} - {supplier.get('name', supplier_id)}", value="\n".join(lines)[:1024], inline=False)
+    if not embed.fields:
+        embed.description = "No suppliers yet. Add one with `/supplier`."
+    
+    await interaction.response.send_message(embed=embed)
+
+@bot.tree.command(name="syncsuppliers", description="Sync supplier feeds now")
+@app_commands.checks.has_permissions(administrator=True)
+async def sync_suppliers(interaction: discord.Interaction):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    updated = await sync_shop_suppliers(shop_for(interaction))
+    await interaction.followup.send(f"🔄 Supplier feeds synced, {updated} products updated.", ephemeral=True)
+
+async def sync_shop_suppliers(shop):
+    updated = await supplier_sync.sync(shop.store, shop.guild_id)
+    # Feed updates write stock directly rather than through the ledger
+    for product_id in updated:
+        stock_watcher.check(shop, product_id)
+    return len(updated)
+
 @bot.tree.command(name="stats", description="View business statistics")
 async def stats(interaction: discord.Interaction):
-    total_products = len(data['products'])
-    total_orders = len(data['orders'])
+    store = shop_for(interaction).store
+    version = (store.version('products'), store.version('orders'))
+    embed = embed_cache.get((interaction.guild_id, 'stats'), version, lambda: render_stats(store))
+    await interaction.response.send_message(embed=stamped(embed))
+
+def render_stats(store):
+    total_products = store.count_products()
+    total_orders = store.count_orders()
     
-    total_revenue = sum(order['total'] for order in data['orders'].values())
-    total_profit = sum(order['profit'] for order in data['orders'].values())
+    total_revenue, total_profit = store.order_totals()
     
-    pending_orders = sum(1 for order in data['orders'].values() if order['status'] == 'pending')
-    completed_orders = sum(1 for order in data['orders'].values() if order['status'] == 'delivered')
+    pending_orders = store.count_orders('pending')
+    completed_orders = store.count_orders('delivered')
     
     avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
     avg_profit_per_order = total_profit / total_orders if total_orders > 0 else 0
     
     embed = discord.Embed(
         title="📊 Business Statistics",
-        color=discord.Color.gold(),
-        timestamp=datetime.now()
+        color=discord.Color.gold()
     )
     embed.add_field(name="Total Products", value=str(total_products), inline=True)
     embed.add_field(name="Total Orders", value=str(total_orders), inline=True)
@@ -460,26 +1112,206 @@ async def stats(interaction: discord.Interaction):
     if total_revenue > 0:
         profit_margin = (total_profit / total_revenue) * 100
         embed.add_field(name="Overall Margin", value=f"{profit_margin:.1f}%", inline=True)
+    return embed
+
+@bot.tree.command(name="report", description="View sales for a recent period")
+@app_commands.describe(days="Period to report on")
+@app_commands.choices(days=[
+    app_commands.Choice(name="Last 7 days", value=7),
+    app_commands.Choice(name="Last 30 days", value=30),
+    app_commands.Choice(name="Last 90 days", value=90)
+])
+async def report(interaction: discord.Interaction, days: int = 7):
+    # Answered entirely from the daily rollups, never from raw orders
+    store = shop_for(interaction).store
+    rollups = store.rollups
+    last = date.today().toordinal()
+    first = last - days + 1
+    revenue, profit, units, orders = rollups.total(first, last)
+    prev_revenue, prev_profit, _, _ = rollups.total(first - days, first - 1)
+    
+    embed = discord.Embed(
+        title=f"📈 Sales Report - Last {days} Days",
+        color=discord.Color.gold(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Orders", value=str(int(orders)), inline=True)
+    embed.add_field(name="Units Sold", value=str(int(units)), inline=True)
+    embed.add_field(name="Revenue", value=f"${revenue:.2f}", inline=True)
+    embed.add_field(name="Profit", value=f"${profit:.2f}", inline=True)
+    if revenue > 0:
+        embed.add_field(name="Margin", value=f"{profit / revenue * 100:.1f}%", inline=True)
+    if prev_revenue > 0:
+        change = (revenue - prev_revenue) / prev_revenue * 100
+        embed.add_field(name="vs Previous Period", value=f"{change:+.1f}%", inline=True)
+    
+    top = rollups.top_products(first, last, 5)
+    if top:
+        lines = []
+        for rank, (pid, (p_revenue, p_profit, p_units, _)) in enumerate(top, 1):
+            product = store.get_product(pid)
+            name = product['name'] if product else f"ID {pid}"
+            lines.append(f"**{rank}.** {name} - ${p_revenue:.2f} ({int(p_units)} units)")
+        embed.add_field(name="🏆 Top Products", value="\n".join(lines), inline=False)
+    
+    period = 'day' if days <= 7 else 'week'
+    trend = []
+    for start, (p_revenue, p_profit, _, _) in rollups.rollup(first, last, period):
+        label = date.fromordinal(max(start, first)).strftime('%b %d')
+        margin = f"{p_profit / p_revenue * 100:.1f}%" if p_revenue > 0 else "-"
+        trend.append(f"`{label}` ${p_revenue:.2f} | {margin}")
+    if trend:
+        embed.add_field(name=f"📉 Margin Trend (by {period})", value="\n".join(trend[-15:]), inline=False)
     
     await interaction.response.send_message(embed=embed)
 
 @bot.tree.command(name="deleteproduct", description="Delete a product")
 @app_commands.describe(product_id="Product ID to delete")
+@app_commands.autocomplete(product_id=product_autocomplete)
 @app_commands.checks.has_permissions(administrator=True)
 async def delete_product(interaction: discord.Interaction, product_id: str):
-    if product_id not in data['products']:
+    shop = shop_for(interaction)
+    product = shop.store.get_product(product_id)
+    if product is None:
         await interaction.response.send_message(f"❌ Product ID {product_id} not found!", ephemeral=True)
         return
     
-    product_name = data['products'][product_id]['name']
-    del data['products'][product_id]
-    save_data(data)
+    product_name = product['name']
+    shop.store.delete_product(product_id)
+    shop.ledger.forget(product_id)
+    stock_watcher.forget(interaction.guild_id, product_id)
     
     await interaction.response.send_message(
         f"✅ Product **{product_name}** (ID: {product_id}) has been deleted.",
         ephemeral=True
     )
 
+@bot.tree.command(name="importproducts", description="Bulk add or update products from a CSV or JSONL file")
+@app_commands.describe(file="CSV with a header row, or JSON Lines. Fields: id (optional), name, description, price, supplier_cost, stock, active")
+@app_commands.checks.has_permissions(manage_messages=True)
+async def import_products(interaction: discord.Interaction, file: discord.Attachment):
+    await interaction.response.defer(thinking=True)
+    
+    fmt = 'jsonl' if file.filename.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+    try:
+        lines = (await file.read()).decode('utf-8-sig').splitlines()
+    except UnicodeDecodeError:
+        await interaction.followup.send("❌ The file must be UTF-8 text.", ephemeral=True)
+        return
+    
+    shop = shop_for(interaction)
+    store = shop.store
+    result = await bulk.import_products(store, lines, fmt, lambda: new_product_id(store), lambda: asyncio.sleep(0))
+    # Imports write stock directly rather than through the ledger
+    for product_id in result.created + result.updated:
+        stock_watcher.check(shop, product_id)
+    
+    embed = discord.Embed(
+        title="📥 Product Import Finished",
+        color=discord.Color.green() if not result.errors else discord.Color.orange(),
+        timestamp=datetime.now()
+    )
+    embed.add_field(name="Created", value=str(len(result.created)), inline=True)
+    embed.add_field(name="Updated", value=str(len(result.updated)), inline=True)
+    embed.add_field(name="Rejected", value=str(len(result.errors)), inline=True)
+    if result.errors:
+        preview = "\n".join(f"Line {line}: {error}" for line, error in result.errors[:10])
+        embed.add_field(name="Errors", value=preview[:1024], inline=False)
+        report = discord.File(io.BytesIO(result.errors_csv().encode('utf-8')), filename="import_errors.csv")
+        await interaction.followup.send(embed=embed, file=report)
+        return
+    
+    await interaction.followup.send(embed=embed)
+
+@bot.tree.command(name="exportorders", description="Download all orders as a file")
+@app_commands.describe(format="File format")
+@app_commands.choices(format=[
+    app_commands.Choice(name="CSV", value="csv"),
+    app_commands.Choice(name="JSON Lines", value="jsonl")
+])
+@app_commands.checks.has_permissions(manage_messages=True)
+async def export_orders(interaction: discord.Interaction, format: str = 'csv'):
+    await interaction.response.defer(thinking=True, ephemeral=True)
+    
+    # Spills to disk past 8 MB instead of building the export in memory
+    with tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024) as out:
+        shop = shop_for(interaction)
+        count = await bulk.export_orders(shop.store, format, out, lambda: asyncio.sleep(0), shop.archive)
+        filename = f"orders_{datetime.now():%Y%m%d_%H%M%S}.{format}"
+        await interaction.followup.send(
+            f"📤 Exported {count} orders.",
+            file=discord.File(out, filename=filename),
+            ephemeral=True
+        )
+
+@bot.tree.command(name="perf", description="View command latency statistics")
+@app_commands.describe(sort="Which timing to rank commands by")
+@app_commands.choices(sort=[
+    app_commands.Choice(name="Total time", value="total"),
+    app_commands.Choice(name="Time to first response", value="first_response"),
+    app_commands.Choice(name="Time in storage", value="store")
+])
+@app_commands.checks.has_permissions(administrator=True)
+async def perf(interaction: discord.Interaction, sort: str = 'total'):
+    embed = discord.Embed(
+        title="⏱️ Command Performance",
+        description=f"Slowest first by p95 {sort.replace('_', ' ')} • slow log above {PERF_SLOW_MS}ms",
+        color=discord.Color.purple(),
+        timestamp=datetime.now()
+    )
+    
+    def ms(seconds):
+        return f"{seconds * 1000:.0f}ms" if seconds is not None else "-"
+    
+    rows = monitor.summary(sort, limit=15)
+    if not rows:
+        embed.add_field(name="No data", value="No commands have run yet.", inline=False)
+    for name, command_stats in rows:
+        total = command_stats.histograms['total']
+        first = command_stats.histograms['first_response']
+        store_time = command_stats.histograms['store']
+        error_count = sum(command_stats.errors.values())
+        value = (
+            f"{command_stats.calls} calls • {error_count} errors\n"
+            f"Total p50 {ms(total.percentile(0.5))} / p95 {ms(total.percentile(0.95))}\n"
+            f"First response p95 {ms(first.percentile(0.95))} • Storage p95 {ms(store_time.percentile(0.95))}"
+        )
+        if command_stats.errors:
+            value += "\n" + ", ".join(f"{kind} ×{count}" for kind, count in command_stats.errors.items())
+        embed.add_field(name=name, value=value[:1024], inline=False)
+    
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="channels", description="Set where order and status notifications are posted")
+@app_commands.describe(
+    order_channel="New orders are posted here",
+    notification_channel="Status changes and low-stock alerts are posted here",
+    off="Stop posting to one or both channels"
+)
+@app_commands.choices(off=[
+    app_commands.Choice(name="Orders", value="order_channel"),
+    app_commands.Choice(name="Notifications", value="notification_channel"),
+    app_commands.Choice(name="Both", value="both")
+])
+@app_commands.checks.has_permissions(administrator=True)
+async def set_channels(interaction: discord.Interaction, order_channel: Optional[discord.TextChannel] = None,
+                       notification_channel: Optional[discord.TextChannel] = None, off: Optional[str] = None):
+    store = shop_for(interaction).store
+    if off is not None:
+        for key in ('order_channel', 'notification_channel'):
+            if off in (key, 'both'):
+                store.set_setting(key, None)
+    for key, channel in (('order_channel', order_channel), ('notification_channel', notification_channel)):
+        if channel is not None:
+            store.set_setting(key, channel.id)
+
+    embed = discord.Embed(title="📣 Notification Channels", color=discord.Color.blue())
+    for name, key in (("Orders", 'order_channel'), ("Notifications", 'notification_channel')):
+        channel_id = store.get_setting(key)
+        embed.add_field(name=name, value=f"<#{channel_id}>" if channel_id else "Off", inline=True)
+
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="help", description="View all available commands")
 async def help_command(interaction: discord.Interaction):
     embed = discord.Embed(
@@ -492,10 +1324,13 @@ async def help_command(interaction: discord.Interaction):
         name="📦 Product Management",
         value=(
             "`/addproduct` - Add a new product\n"
-            "`/products` - View all products\n"
+            "`/products` - Browse the catalog page by page\n"
             "`/product <id>` - View product details\n"
+            "`/search <query>` - Search products by name or description\n"
             "`/updatestock <id> <qty>` - Update stock\n"
-            "`/deleteproduct <id>` - Delete a product"
+            "`/reorderlevel <id> [threshold] [supplier]` - Set the low-stock alert level\n"
+            "`/deleteproduct <id>` - Delete a product\n"
+            "`/importproducts <file>` - Bulk add/update products from CSV or JSONL"
         ),
         inline=False
     )
@@ -504,9 +1339,20 @@ async def help_command(interaction: discord.Interaction):
         name="📋 Order Management",
         value=(
             "`/createorder` - Create new order\n"
-            "`/orders` - View all orders\n"
+            "`/orders [filters]` - Browse orders, filter by status/customer/product/date\n"
             "`/order <id>` - View order details\n"
-            "`/updatestatus <id> <status>` - Update order status"
+            "`/updatestatus <id> <status>` - Update order status\n"
+            "`/exportorders [format]` - Download all orders as CSV or JSONL"
+        ),
+        inline=False
+    )
+    
+    embed.add_field(
+        name="🚚 Suppliers",
+        value=(
+            "`/suppliers` - View suppliers and their feed status\n"
+            "`/supplier <id> [details]` - Add or update a supplier (admin)\n"
+            "`/syncsuppliers` - Sync supplier cost/stock feeds now (admin)"
         ),
         inline=False
     )
@@ -514,7 +1360,8 @@ async def help_command(interaction: discord.Interaction):
     embed.add_field(
         name="📊 Analytics",
         value=(
-            "`/stats` - View business statistics"
+            "`/stats` - View business statistics\n"
+            "`/report [days]` - Sales report for the last 7/30/90 days"
         ),
         inline=False
     )
@@ -522,20 +1369,122 @@ async def help_command(interaction: discord.Interaction):
     embed.add_field(
         name="ℹ️ Other",
         value=(
-            "`/help` - Show this help message"
+            "`/help` - Show this help message\n"
+            "`/channels [order] [notification]` - Set where orders and alerts are posted (admin)\n"
+            "`/perf [sort]` - Command latency statistics (admin)"
         ),
         inline=False
     )
     
     await interaction.response.send_message(embed=embed)
 
+# Timing for every slash command, modal and store write (stores are
+# instrumented as each guild's shop opens)
+monitor.instrument_tree(bot.tree)
+monitor.instrument_modals(ProductModal, OrderModal, JumpModal)
+monitor.instrument_responses()
+web_server.add_collector(monitor.metrics)
+
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    name = f"/{interaction.command.qualified_name}" if interaction.command else "unknown"
+    # Errors raised inside a handler were already counted by its wrapper
+    if not isinstance(error, app_commands.CommandInvokeError):
+        monitor.record_error(name, error)
+    
+    if isinstance(error, (app_commands.MissingPermissions, app_commands.NoPrivateMessage, StillLoading)):
+        if isinstance(error, StillLoading):
+            message = "⏳ Still loading data, try again in a few seconds."
+        elif isinstance(error, app_commands.NoPrivateMessage):
+            message = "❌ This command only works in a server."
+        else:
+            message = "❌ You don't have permission to use this command!"
+        await send_ephemeral(interaction, message)
+    else:
+        print(f"Error in {name}: {error}")
+
+@tasks.loop(hours=6)
+async def archive_old_orders():
+    # Only guilds opened since startup; a guild nobody has used since then
+    # hasn't taken any new orders either
+    if not ARCHIVE_AFTER_DAYS:
+        return
+    cutoff = (datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+    for shop in shops.loaded():
+        archived = await archive_shop_orders(shop, cutoff)
+        if archived:
+            print(f"📦 Archived {archived} orders older than {ARCHIVE_AFTER_DAYS} days in guild {shop.guild_id}")
+
+async def archive_shop_orders(shop, cutoff):
+    store = shop.store
+    await store.wait_ready('orders')
+    archived = 0
+    while True:
+        batch = store.archivable_orders(cutoff, ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        # Written and synced before the orders leave the store, so a crash
+        # in between can only leave a duplicate, never lose one
+        await asyncio.to_thread(shop.archive.write, [(order_id, order) for order_id, _, order in batch])
+        unchanged = [order_id for order_id, version, _ in batch
+                     if store.version('orders', order_id) == version]
+        archived += store.archive_orders(unchanged)
+    return archived
+
+@tasks.loop(minutes=max(SUPPLIER_SYNC_MINUTES, 1))
+async def sync_supplier_feeds():
+    for shop in shops.loaded():
+        try:
+            updated = await sync_shop_suppliers(shop)
+        except Exception as error:
+            print(f"❌ Supplier sync failed in guild {shop.guild_id}: {error}")
+            continue
+        if updated:
+            print(f"🚚 Updated {updated} products from supplier feeds in guild {shop.guild_id}")
+
+def command_tree_hash():
+    payloads = []
+    for command in bot.tree.get_commands():
+        try:
+            payloads.append(command.to_dict(bot.tree))
+        except TypeError:  # discord.py before 2.4
+            payloads.append(command.to_dict())
+    payloads.sort(key=lambda payload: payload['name'])
+    signature = json.dumps([bot.application_id, payloads], sort_keys=True, default=str)
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+
+async def sync_command_tree():
+    # Syncing is rate limited and the commands rarely change, so skip it
+    # when Discord already has this exact tree
+    digest = command_tree_hash()
+    try:
+        with open(COMMAND_HASH_FILE, 'r', encoding='utf-8') as f:
+            if f.read().strip() == digest:
+                return
+    except FileNotFoundError:
+        pass
+    synced = await bot.tree.sync()
+    with open(COMMAND_HASH_FILE, 'w', encoding='utf-8') as f:
+        f.write(digest)
+    print(f"🔁 Synced {len(synced)} slash commands")
+
+@bot.event
+async def setup_hook():
+    # Runs once per process, after login and before the gateway connects,
+    # so reconnects don't repeat any of it
+    await adopt_legacy_data()
+    await sync_command_tree()
+    archive_old_orders.start()
+    if SUPPLIER_SYNC_MINUTES:
+        sync_supplier_feeds.start()
+
 @bot.event
 async def on_ready():
-    await bot.tree.sync()
     print(f'✅ {bot.user} is now online!')
-    print(f'📡 Connected to {len(bot.guilds)} servers')
+    shards = f" on shards {sorted(bot.shards)}" if isinstance(bot, commands.AutoShardedBot) else ""
+    print(f'📡 Connected to {len(bot.guilds)} servers{shards}')
     print('🛒 Bot is ready to manage your dropshipping business!')
-    print('🌐 Web server running on port 8080')
+    print(f'🌐 Health checks on port {WEB_PORT} (/healthz, /readyz, /metrics)')
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -549,10 +1498,6 @@ async def on_command_error(ctx, error):
 # Run the bot
 if __name__ == "__main__":
     print("🚀 Starting Dropshipping Bot...")
-    print("🔄 Starting keep-alive web server...")
-    
-    keep_alive()
-    
     token = os.getenv('DISCORD_BOT_TOKEN')
     if not token:
         print("\n❌ ERROR: DISCORD_BOT_TOKEN not found!")
@@ -560,4 +1505,28 @@ if __name__ == "__main__":
         exit(1)
     
     print("✅ Token found! Starting bot...")
-    bot.run(token)
+    
+    async def main():
+        async with bot:
+            print("🔄 Starting web server...")
+            await web_server.start()
+            try:
+                await bot.start(token)
+            finally:
+                # Before the bot's HTTP session closes, so queued
+                # notifications can still go out
+                stock_watcher.close()
+                await supplier_sync.close()
+                await notifier.close()
+                await web_server.stop()
+    
+    discord.utils.setup_logging()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print("💾 Flushing pending writes...")
+        shops.close()
+        cached = embed_cache.stats()
+        print(f"🗂️ Embed cache: {cached['hits']} hits, {cached['misses']} misses ({cached['hit_rate']:.0%})")
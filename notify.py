@@ -0,0 +1,131 @@
+import asyncio
+import time
+from collections import deque
+
+import aiohttp
+import discord
+
+# Outbound notifications (new orders, status changes) to the channels set
+# in each guild's settings. Handlers call post() and move on; the message
+# goes out from a background task, so a slow or rate limited channel never
+# adds to a command's latency.
+#
+# Each channel has its own queue and its own worker, which sends one
+# message at a time and waits at least `min_interval` between them (Discord
+# allows about 5 messages per 5 seconds in a channel). Embeds that pile up
+# in the meantime go out together, up to Discord's 10 embeds and 6000
+# characters per message. A failed send is retried with exponential
+# backoff, or after the retry_after Discord asks for.
+
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+
+
+class Notifier:
+    def __init__(self, bot, linger=0.5, min_interval=1.0, max_attempts=5, base_delay=1.0, max_queue=1000):
+        self.bot = bot
+        self.linger = linger
+        self.min_interval = min_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_queue = max_queue
+        self.sent_messages = 0
+        self.sent_embeds = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self._queues = {}
+        self._workers = {}
+        self._next_send = {}
+        self._closing = False
+
+    def post(self, channel_id, embed):
+        # Queues an embed for a channel; returns False if there's nowhere to send it
+        if not channel_id or self._closing:
+            return False
+        queue = self._queues.setdefault(channel_id, deque())
+        if len(queue) >= self.max_queue:
+            queue.popleft()
+            self.dropped += 1
+        queue.append(embed)
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(self._run(channel_id))
+        return True
+
+    def pending(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _run(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                # Give a burst a moment to gather, and keep to the channel's pace
+                wait = self._next_send.get(channel_id, 0) - time.monotonic()
+                if not self._closing:
+                    wait = max(wait, self.linger)
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._send(channel_id, _take_batch(queue))
+                self._next_send[channel_id] = time.monotonic() + self.min_interval
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                self._queues.pop(channel_id, None)
+
+    async def _send(self, channel_id, embeds):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+                await channel.send(embeds=embeds)
+                self.sent_messages += 1
+                self.sent_embeds += len(embeds)
+                return
+            except (discord.Forbidden, discord.NotFound) as error:
+                # A missing permission or a deleted channel won't fix itself
+                print(f"⚠️ Can't post to channel {channel_id}: {error}")
+                break
+            except discord.RateLimited as error:
+                delay = error.retry_after
+            except discord.HTTPException as error:
+                if error.status < 500:
+                    print(f"⚠️ Discord rejected a notification for channel {channel_id}: {error}")
+                    break
+                delay = self.base_delay * 2 ** (attempt - 1)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                delay = self.base_delay * 2 ** (attempt - 1)
+            if attempt < self.max_attempts:
+                self.retries += 1
+                await asyncio.sleep(delay)
+        self.failed += len(embeds)
+
+    async def close(self, timeout=5.0):
+        # Sends what's queued without lingering, giving up after `timeout`
+        self._closing = True
+        workers = list(self._workers.values())
+        if workers:
+            _, unfinished = await asyncio.wait(workers, timeout=timeout)
+            for worker in unfinished:
+                worker.cancel()
+        self.dropped += self.pending()
+        self._queues.clear()
+
+    def metrics(self):
+        return [
+            ('notify_pending_embeds', 'gauge', 'Notification embeds waiting to be sent.', [({}, self.pending())]),
+            ('notify_messages_sent_total', 'counter', 'Notification messages sent.', [({}, self.sent_messages)]),
+            ('notify_embeds_sent_total', 'counter', 'Notification embeds sent.', [({}, self.sent_embeds)]),
+            ('notify_retries_total', 'counter', 'Notification sends retried.', [({}, self.retries)]),
+            ('notify_embeds_failed_total', 'counter', 'Notification embeds given up on.', [({}, self.failed)]),
+            ('notify_embeds_dropped_total', 'counter', 'Notification embeds dropped from a full queue or at shutdown.',
+             [({}, self.dropped)])
+        ]
+
+
+def _take_batch(queue):
+    # As many queued embeds as fit in one message, oldest first
+    batch = [queue.popleft()]
+    size = len(batch[0])
+    while queue and len(batch) < MAX_EMBEDS and size + len(queue[0]) <= MAX_EMBED_CHARS:
+        size += len(queue[0])
+        batch.append(queue.popleft())
+    return batch
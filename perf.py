@@ -0,0 +1,212 @@
+import functools
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+import discord
+
+# Per-command timing. Every tree command callback and modal on_submit is
+# wrapped to record, per command:
+#
+#   first_response  handler start -> first interaction response (the part
+#                   Discord's 3 second deadline cares about)
+#   total           handler start -> handler return
+#   store           time spent inside store writes on the event loop
+#
+# plus call counts and errors by exception type. The current call is kept in
+# a context variable, so response and store timings find their way to the
+# right command even with many interactions in flight.
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0)
+PHASES = ('first_response', 'total', 'store')
+
+# Store methods that write, and so may touch disk or the write queue
+STORE_WRITES = ('put_product', 'update_product', 'delete_product', 'put_order', 'update_order',
+                'set_setting', 'next_id', 'observe_id', 'flush')
+
+# InteractionResponse methods that count as answering the interaction
+RESPONSE_METHODS = ('send_message', 'defer', 'send_modal', 'edit_message')
+
+_current = ContextVar('perf_current_call', default=None)
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def percentile(self, q):
+        # Estimated by interpolating inside the bucket the rank falls in
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                if i == len(BUCKETS):
+                    return BUCKETS[-1]
+                low = BUCKETS[i - 1] if i else 0.0
+                return low + (BUCKETS[i] - low) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return BUCKETS[-1]
+
+    def cumulative(self):
+        total = 0
+        for bound, bucket_count in zip(BUCKETS + (float('inf'),), self.counts):
+            total += bucket_count
+            yield bound, total
+
+
+class CommandStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = {}
+        self.histograms = {phase: Histogram() for phase in PHASES}
+
+
+class _Call:
+    __slots__ = ('started', 'first_response', 'store', 'store_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_response = None
+        self.store = 0.0
+        self.store_depth = 0
+
+
+class PerfMonitor:
+    def __init__(self, slow_threshold_ms=1000):
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.commands = {}
+
+    def stats(self, name):
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        return stats
+
+    def wrap(self, name, callback):
+        @functools.wraps(callback)
+        async def timed(*args, **kwargs):
+            call = _Call()
+            token = _current.set(call)
+            error = None
+            try:
+                return await callback(*args, **kwargs)
+            except Exception as exc:
+                error = exc
+                raise
+            finally:
+                _current.reset(token)
+                self._record(name, call, time.perf_counter() - call.started, error)
+        return timed
+
+    def _record(self, name, call, total, error):
+        stats = self.stats(name)
+        stats.calls += 1
+        if error is not None:
+            self.record_error(name, error)
+        histograms = stats.histograms
+        histograms['total'].observe(total)
+        histograms['store'].observe(call.store)
+        if call.first_response is not None:
+            histograms['first_response'].observe(call.first_response)
+
+        if total >= self.slow_threshold:
+            first = f"{call.first_response * 1000:.0f}ms" if call.first_response is not None else "none"
+            print(f"🐢 Slow command {name}: {total * 1000:.0f}ms total, "
+                  f"first response {first}, store {call.store * 1000:.0f}ms")
+
+    def record_error(self, name, error):
+        errors = self.stats(name).errors
+        kind = type(error).__name__
+        errors[kind] = errors.get(kind, 0) + 1
+
+    def instrument_tree(self, tree):
+        # Commands keep their callback in _callback and call it from there,
+        # so swapping it leaves parameter parsing and checks untouched
+        for command in tree.walk_commands():
+            if isinstance(command, discord.app_commands.Command):
+                command._callback = self.wrap(f"/{command.qualified_name}", command._callback)
+
+    def instrument_modals(self, *modal_classes):
+        for cls in modal_classes:
+            cls.on_submit = self.wrap(f"modal:{cls.__name__}", cls.on_submit)
+
+    def instrument_store(self, store):
+        for method_name in STORE_WRITES:
+            method = getattr(store, method_name, None)
+            if method is not None:
+                setattr(store, method_name, _timed_store_call(method))
+
+    def instrument_responses(self):
+        for method_name in RESPONSE_METHODS:
+            method = getattr(discord.InteractionResponse, method_name, None)
+            if method is not None and not hasattr(method, '__perf_wrapped__'):
+                setattr(discord.InteractionResponse, method_name, _timed_response(method))
+
+    def summary(self, sort_by='total', limit=None):
+        # [(name, stats)] slowest first by p95 of the given phase
+        rows = [(name, stats) for name, stats in self.commands.items() if stats.calls]
+        rows.sort(key=lambda row: row[1].histograms[sort_by].percentile(0.95) or 0, reverse=True)
+        return rows[:limit] if limit else rows
+
+    def metrics(self):
+        histogram_samples = []
+        calls = []
+        errors = []
+        for name, stats in sorted(self.commands.items()):
+            calls.append(({'command': name}, stats.calls))
+            for kind, count in sorted(stats.errors.items()):
+                errors.append(({'command': name, 'type': kind}, count))
+            for phase, histogram in stats.histograms.items():
+                labels = {'command': name, 'phase': phase}
+                for bound, total in histogram.cumulative():
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    histogram_samples.append(('_bucket', {**labels, 'le': le}, total))
+                histogram_samples.append(('_sum', labels, histogram.sum))
+                histogram_samples.append(('_count', labels, histogram.count))
+        return [
+            ('bot_command_duration_seconds', 'histogram',
+             'Command latency by phase: first_response, total, store.', histogram_samples),
+            ('bot_command_calls_total', 'counter', 'Command invocations.', calls),
+            ('bot_command_errors_total', 'counter', 'Command errors by exception type.', errors)
+        ]
+
+
+def _timed_store_call(method):
+    @functools.wraps(method)
+    def timed(*args, **kwargs):
+        call = _current.get()
+        if call is None:
+            return method(*args, **kwargs)
+        # Only the outermost write counts, so nested writes aren't doubled
+        call.store_depth += 1
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            call.store_depth -= 1
+            if call.store_depth == 0:
+                call.store += time.perf_counter() - started
+    return timed
+
+
+def _timed_response(method):
+    @functools.wraps(method)
+    async def timed(*args, **kwargs):
+        result = await method(*args, **kwargs)
+        call = _current.get()
+        if call is not None and call.first_response is None:
+            call.first_response = time.perf_counter() - call.started
+        return result
+    timed.__perf_wrapped__ = True
+    return timed
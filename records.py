@@ -0,0 +1,293 @@
+import sys
+from datetime import date, datetime, timedelta
+
+# Compact in-memory records for JsonStore, which holds every product and
+# order. A dict per order costs several hundred bytes before its values;
+# these use __slots__, keep money as integer cents and timestamps as integer
+# microseconds, and intern the strings that repeat across orders (status,
+# product, customer), so each record is a fraction of that.
+#
+# Records still behave like the dicts they replace: order['total'] and
+# order.get('status') work, so does dict(order), and to_dict() gives back
+# the bot_data.json layout. Fields the class doesn't know about are kept in
+# a small `extra` dict, so nothing is lost in a round trip.
+
+EPOCH = datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+DAY_US = 86400 * 1000000
+
+
+def to_micros(text):
+    # Naive ISO timestamp -> microseconds since 1970-01-01, same clock
+    moment = datetime.fromisoformat(text).replace(tzinfo=None)
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def from_micros(value):
+    return (EPOCH + timedelta(microseconds=value)).isoformat()
+
+
+def _round_trips(text):
+    # Whether from_micros(to_micros(text)) == text, without formatting it:
+    # true for everything datetime.isoformat() writes for a naive time
+    return len(text) == 19 or (len(text) == 26 and text[19] == '.' and not text.endswith('000000'))
+
+
+def _cents(value):
+    return round(value * 100)
+
+
+class _Cents:
+    # Exposes an integer-cents slot as the float the rest of the code uses
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        return getattr(record, self.slot) / 100
+
+    def __set__(self, record, value):
+        setattr(record, self.slot, _cents(value))
+
+
+class _Timestamp:
+    # Exposes a microseconds slot as an ISO string. A string that wouldn't
+    # come back out unchanged (a UTC offset, say) is kept as it was.
+    def __init__(self, slot):
+        self.slot = slot
+
+    def __get__(self, record, owner=None):
+        if record is None:
+            return self
+        value = getattr(record, self.slot)
+        return from_micros(value) if type(value) is int else value
+
+    def __set__(self, record, value):
+        setattr(record, self.slot, _timestamp_value(value))
+
+
+def _timestamp_value(text):
+    micros = to_micros(text)
+    return micros if _round_trips(text) else text
+
+
+# How each known field is stored
+PLAIN, INTERNED_TEXT, CENTS, TIMESTAMP = range(4)
+
+
+class Record:
+    __slots__ = ('extra',)
+    # Known fields in the order they're written out
+    FIELDS = ()
+    INTERNED = frozenset()
+
+    def __init_subclass__(cls):
+        super().__init_subclass__()
+        cls._field_set = frozenset(cls.FIELDS)
+        cls._slots = {key: getattr(cls.__dict__.get(key), 'slot', key) for key in cls.FIELDS}
+        # (slot, kind) per field, so loading a large file converts values
+        # inline instead of going through __setitem__ and the descriptors
+        cls._plan = {key: (cls._slots[key], cls._kind(key)) for key in cls.FIELDS}
+
+    @classmethod
+    def _kind(cls, key):
+        descriptor = cls.__dict__[key]
+        if isinstance(descriptor, _Cents):
+            return CENTS
+        if isinstance(descriptor, _Timestamp):
+            return TIMESTAMP
+        return INTERNED_TEXT if key in cls.INTERNED else PLAIN
+
+    def __init__(self, fields=()):
+        self.extra = None
+        for key, value in (fields.items() if hasattr(fields, 'items') else fields):
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, fields):
+        if isinstance(fields, cls):
+            return fields
+        record = cls.__new__(cls)
+        record.extra = None
+        plan = cls._plan
+        intern = sys.intern
+        for key, value in fields.items():
+            entry = plan.get(key)
+            if entry is None:
+                record[key] = value
+                continue
+            slot, kind = entry
+            if kind == INTERNED_TEXT:
+                if type(value) is str:
+                    value = intern(value)
+            elif kind == CENTS:
+                value = round(value * 100)
+            elif kind == TIMESTAMP:
+                value = _timestamp_value(value)
+            setattr(record, slot, value)
+        return record
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            if key in self.INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, self._slots[key])
+            except AttributeError:
+                raise KeyError(key) from None
+        elif self.extra is not None and key in self.extra:
+            del self.extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        keys = [key for key, slot in self._slots.items() if hasattr(self, slot)]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+
+    def values(self):
+        return [self[key] for key in self.keys()]
+
+    def pop(self, key, *default):
+        try:
+            value = self[key]
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        del self[key]
+        return value
+
+    def update(self, fields=(), **more):
+        for key, value in (fields.items() if hasattr(fields, 'items') else fields):
+            self[key] = value
+        for key, value in more.items():
+            self[key] = value
+
+    def copy(self):
+        record = type(self).__new__(type(self))
+        for slot in self.__slots__ + Record.__slots__:
+            try:
+                setattr(record, slot, getattr(self, slot))
+            except AttributeError:
+                pass
+        if self.extra is not None:
+            record.extra = dict(self.extra)
+        return record
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.to_dict()!r})'
+
+
+class Product(Record):
+    __slots__ = ('name', 'description', 'price_cents', 'supplier_cost_cents', 'profit_margin',
+                 'stock', 'active', 'created_us')
+    FIELDS = ('name', 'description', 'price', 'supplier_cost', 'profit_margin',
+              'stock', 'active', 'created_at')
+
+    price = _Cents('price_cents')
+    supplier_cost = _Cents('supplier_cost_cents')
+    created_at = _Timestamp('created_us')
+
+
+class Order(Record):
+    __slots__ = ('product_id', 'product_name', 'quantity', 'total_cents', 'profit_cents',
+                 'customer_name', 'customer_email', 'shipping_address', 'status',
+                 'created_us', 'created_by')
+    FIELDS = ('product_id', 'product_name', 'quantity', 'total', 'profit',
+              'customer_name', 'customer_email', 'shipping_address', 'status',
+              'created_at', 'created_by')
+    # Every order of a product shares one copy of its ID and name, and every
+    # order of a customer one copy of their details
+    INTERNED = frozenset(('product_id', 'product_name', 'status', 'customer_name',
+                          'customer_email', 'created_by'))
+
+    total = _Cents('total_cents')
+    profit = _Cents('profit_cents')
+    created_at = _Timestamp('created_us')
+
+
+RECORD_TYPES = {'products': Product, 'orders': Order}
+
+
+def order_figures(order):
+    # (product_id, status, quantity, total, profit) straight from the slots,
+    # for the aggregation loops
+    if type(order) is Order:
+        return (order.product_id, order.status, order.quantity,
+                order.total_cents / 100, order.profit_cents / 100)
+    return order['product_id'], order['status'], order['quantity'], order['total'], order['profit']
+
+
+def created_key(order):
+    # Sortable creation time: microseconds, for records and plain dicts alike
+    value = order.created_us if isinstance(order, Order) else order['created_at']
+    return value if type(value) is int else to_micros(value)
+
+
+def created_day(order):
+    # Date ordinal of an order's creation, without formatting a string
+    value = order.created_us if isinstance(order, Order) else order['created_at']
+    if type(value) is int:
+        return EPOCH_ORDINAL + value // DAY_US
+    return date.fromisoformat(value[:10]).toordinal()
+
+
+def encode(value):
+    # json.dump(default=encode) for data holding records
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
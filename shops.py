@@ -0,0 +1,116 @@
+import asyncio
+import time
+
+from inventory import StockLedger
+
+# Every guild is its own storefront: its own catalog, orders, settings and
+# order archive, kept in its own files (see shop_paths in main.py) so one
+# guild's data never has to be loaded to serve another.
+#
+# A guild's shop is opened the first time one of its members runs a
+# command. Opening only reads the store's small header (or, the first time
+# a guild moves to SQLite, migrates its JSON data), and runs in a thread so
+# the event loop carries on meanwhile; commands that come in while it's
+# opening wait on the same task. Products and orders then load in the
+# background, and commands wait for the parts they need just as they do at
+# startup (see storage.py).
+
+
+class NotOurGuild(Exception):
+    # The guild belongs to a shard run by another process, which owns its files
+    def __init__(self, guild_id):
+        super().__init__(f"guild {guild_id} is served by another process")
+        self.guild_id = guild_id
+
+
+class Shop:
+    def __init__(self, guild_id, store, archive):
+        self.guild_id = guild_id
+        self.store = store
+        # All stock changes go through the ledger's per-product locks
+        self.ledger = StockLedger(store)
+        self.archive = archive
+        self.loading = None
+
+
+class ShopRegistry:
+    def __init__(self, open_shop, owns=None):
+        self._open_shop = open_shop
+        self._owns = owns
+        self._shops = {}
+        self._opening = {}
+
+    def _check_owned(self, guild_id):
+        if self._owns is not None and not self._owns(guild_id):
+            raise NotOurGuild(guild_id)
+
+    def get(self, guild_id):
+        # Callers on the event loop should await open() first; an unopened
+        # shop is opened here without leaving the calling thread
+        shop = self._shops.get(guild_id)
+        if shop is None:
+            self._check_owned(guild_id)
+            shop = self._shops[guild_id] = self._open_shop(guild_id)
+            self._start_loading(shop)
+        return shop
+
+    def is_open(self, guild_id):
+        return guild_id in self._shops
+
+    def opening(self, guild_id):
+        # The task opening a guild's shop, started if there isn't one yet
+        task = self._opening.get(guild_id)
+        if task is None:
+            self._check_owned(guild_id)
+            task = self._opening[guild_id] = asyncio.get_running_loop().create_task(self._open(guild_id))
+            # A failure is logged by _open; whoever was waiting sees it too,
+            # but there may be nobody (an autocomplete started the open)
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return task
+
+    async def open(self, guild_id):
+        shop = self._shops.get(guild_id)
+        if shop is not None:
+            return shop
+        # Shielded, so a command that stops waiting doesn't cancel the open
+        # for everyone else
+        return await asyncio.shield(self.opening(guild_id))
+
+    async def _open(self, guild_id):
+        try:
+            shop = await asyncio.to_thread(self._open_shop, guild_id)
+        except Exception as error:
+            print(f"❌ Opening data for guild {guild_id} failed: {error!r}")
+            raise
+        finally:
+            del self._opening[guild_id]
+        self._shops[guild_id] = shop
+        self._start_loading(shop)
+        return shop
+
+    def _start_loading(self, shop):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            shop.store.finish_loading()
+            return
+        shop.loading = loop.create_task(self._load(shop))
+
+    async def _load(self, shop):
+        started = time.perf_counter()
+        try:
+            await shop.store.load_in_background()
+        except Exception as error:
+            print(f"❌ Loading data for guild {shop.guild_id} failed: {error}")
+            raise
+        print(f"📂 Guild {shop.guild_id} loaded in {time.perf_counter() - started:.1f}s")
+
+    def loaded(self):
+        return list(self._shops.values())
+
+    def __len__(self):
+        return len(self._shops)
+
+    def close(self):
+        for shop in self._shops.values():
+            shop.store.close()
@@ -0,0 +1,1416 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from itertools import count
+from threading import Condition, RLock, Thread
+from analytics import OrderAggregates, SalesRollups, day_of
+from indexes import OrderIndex, ProductSearch, customer_key
+from records import RECORD_TYPES, encode
+
+# Storage engine for bot_data.json.
+#
+# Every mutation is appended as one compact JSON line to <DATA_FILE>.wal
+# instead of rewriting the whole file. Once the log grows past
+# `compact_after` records it is rotated to <DATA_FILE>.wal.compacting and a
+# background thread folds it into a fresh snapshot. Compaction only reads
+# files from disk, so it never touches the live `data` dict.
+#
+# Startup replays the compacting segment (if a compaction was interrupted)
+# followed by the active log. Records are set/del operations on a key path.
+# Each log starts with a 'segment' record holding its sequence number, and
+# the snapshot stores the number of the last segment folded into it, so a
+# segment is never applied twice: a crash between writing the snapshot and
+# removing the segment would otherwise put archived orders back and count
+# their sales again. A 'batch' record wraps several of them in one line, so a bulk change is
+# either replayed completely or not at all. An 'archive' record removes an
+# order like 'del' but leaves the derived views alone, since the order has
+# only moved to the archive (see archive.py).
+#
+# Nothing is written from the event loop itself: stores hand records to a
+# WriteBehind worker thread, which batches them and writes at most every
+# `flush_interval_ms` or as soon as `flush_after` records are waiting.
+#
+# Loading happens in two steps so the bot can connect before a large store
+# is in memory. open() reads only the small sections -- settings, counters,
+# suppliers -- which the snapshot writes ahead of products, orders and the
+# saved views. The rest streams in afterwards, entry by entry,
+# through load_in_background() on the event loop (or finish_loading() when
+# there is no loop), with the scans that build indexes and views from the
+# records handed to a worker thread. Each part of the store -- 'header', 'products',
+# 'orders' -- is marked ready once its records and their share of the log
+# are applied, and callers await wait_ready() for just the parts they use.
+
+
+def _apply(data, op, path, value=None):
+    node = data
+    for key in path[:-1]:
+        node = node.setdefault(key, {})
+    if op == 'set':
+        node[path[-1]] = value
+    elif op in ('del', 'archive'):
+        node.pop(path[-1], None)
+
+
+def _replay(log_path, apply, truncate_torn=False):
+    if not os.path.exists(log_path):
+        return 0
+
+    count = 0
+    good_offset = 0
+    with open(log_path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b'\n'):
+                break
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_offset += len(line)
+            if record['op'] == 'segment':
+                continue
+            for op in record['ops'] if record['op'] == 'batch' else (record,):
+                apply(op['op'], op['path'], op.get('value'))
+            count += 1
+
+    if truncate_torn and os.path.getsize(log_path) != good_offset:
+        # A crash mid-append leaves a partial last line; drop it so new
+        # records don't get glued onto it.
+        with open(log_path, 'r+b') as f:
+            f.truncate(good_offset)
+    return count
+
+
+def _segment_seq(log_path):
+    # The sequence number from a log's first record, or None for a missing
+    # or empty log, or one written before logs were numbered
+    try:
+        with open(log_path, 'rb') as f:
+            first = f.readline()
+        record = json.loads(first)
+    except (FileNotFoundError, ValueError):
+        return None
+    return record.get('seq') if record.get('op') == 'segment' else None
+
+
+def _write_snapshot(path, data, folded=0):
+    # Small sections first so open() can stop reading at the products; the
+    # saved views, which only the orders need, come last. `folded` is the
+    # last log segment the data includes.
+    layout = {'_layout': SNAPSHOT_LAYOUT, '_folded': folded}
+    for key, value in data.items():
+        if key not in layout and key not in RECORD_TYPES and key not in DERIVED_VIEWS:
+            layout[key] = value
+    for key in RECORD_TYPES:
+        layout[key] = data.get(key, {})
+    for key in DERIVED_VIEWS:
+        if key in data:
+            layout[key] = data[key]
+
+    # A temp file of its own, so two writers (say, two processes rewriting
+    # an old snapshot at once) never write into each other's
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                                    prefix=os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with open(fd, 'w', encoding='utf-8') as f:
+            json.dump(layout, f, separators=(',', ':'), default=encode)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Bumped when _write_snapshot changes the order sections are written in;
+# older snapshots are only complete once the whole file has been read
+SNAPSHOT_LAYOUT = 2
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _SnapshotReader:
+    # Walks bot_data.json without parsing it in one go: top-level sections
+    # come out one at a time, and products and orders one entry at a time,
+    # so the caller can stop between any two of them.
+
+    CHUNK = 1 << 20
+
+    def __init__(self, path):
+        self._file = open(path, 'r', encoding='utf-8')
+        self._decoder = json.JSONDecoder()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def close(self):
+        self._file.close()
+
+    def _fill(self, size=CHUNK):
+        # size -1 reads to the end of the file
+        data = self._file.read(size)
+        if not data:
+            self._eof = True
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in ' \t\r\n':
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f'Malformed snapshot: expected {char!r} at offset {self._pos}')
+        self._pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buf, self._pos)
+                # A number cut off by the chunk boundary still parses, so
+                # only trust a value that ends before the buffer does
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Only the saved views at the end of the file outgrow a chunk;
+            # take the rest in one read rather than re-parsing them per chunk
+            self._fill(-1)
+
+    def _members(self):
+        # (key, value start) pairs of the object at the current position
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            yield key
+            if self._peek() == ',':
+                self._pos += 1
+            else:
+                self._expect('}')
+                return
+
+    def entries(self):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        scan = self._decoder.scan_once
+        skip = _WHITESPACE.match
+        while True:
+            # Fast path: the entry and the separator after it are already in
+            # the buffer. Anything cut off falls back to the reading path.
+            buf = self._buf
+            try:
+                pos = skip(buf, self._pos).end()
+                key, pos = scan(buf, pos)
+                pos = skip(buf, pos).end()
+                if buf[pos] != ':':
+                    raise ValueError
+                value, pos = scan(buf, skip(buf, pos + 1).end())
+                pos = skip(buf, pos).end()
+                separator = buf[pos]
+            except (StopIteration, ValueError, IndexError):
+                key = self._value()
+                self._expect(':')
+                value = self._value()
+                separator = self._peek()
+                pos = self._pos
+            if separator not in (',', '}'):
+                raise ValueError(f'Malformed snapshot: unexpected {separator!r} at offset {pos}')
+            self._pos = pos + 1
+            yield key, value
+            if separator == '}':
+                return
+
+    def sections(self):
+        # (name, value) per top-level key; for products and orders the
+        # value is an entries() generator, and for the saved views a
+        # fields() one, to drain before moving on
+        for key in self._members():
+            if key in RECORD_TYPES:
+                yield key, self.entries()
+            elif key in DERIVED_VIEWS:
+                yield key, self.fields()
+            else:
+                yield key, self._value()
+
+    def fields(self):
+        # (name, value) per member of a saved view, with the per-product
+        # figures as an entries() generator: with a large catalog they
+        # would take too long to decode in one piece
+        for key in self._members():
+            yield key, self.entries() if key == 'by_product' else self._value()
+
+
+class WriteBehind:
+    # Records submitted under the same key replace each other while they
+    # wait, so a burst of updates to one field costs a single write.
+
+    def __init__(self, write, flush_interval_ms=200, flush_after=100):
+        self.write = write
+        self.interval = flush_interval_ms / 1000
+        self.flush_after = flush_after
+        self.lock = RLock()  # held while a batch is being written
+        self._cond = Condition()
+        self._pending = {}
+        self._first_pending_at = None
+        self._keys = count()
+        self._closed = False
+        # For health checks: wall-clock time of the last successful write,
+        # and the error from the last attempt if it failed
+        self.batches = 0
+        self.failures = 0
+        self.last_success = None
+        self.last_error = None
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, item=None, key=None):
+        if key is None:
+            key = next(self._keys)
+        with self._cond:
+            self._pending.pop(key, None)
+            self._pending[key] = item
+            if self._first_pending_at is None:
+                self._first_pending_at = time.monotonic()
+                self._cond.notify()
+            elif len(self._pending) >= self.flush_after:
+                self._cond.notify()
+
+    def _due(self):
+        if not self._pending:
+            return None
+        if len(self._pending) >= self.flush_after:
+            return 0
+        return max(0, self._first_pending_at + self.interval - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and self._due() != 0:
+                    self._cond.wait(self._due())
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except Exception as error:
+                print(f"Error: persisting data failed: {error}")
+                time.sleep(self.interval)
+
+    def flush(self):
+        with self.lock:
+            with self._cond:
+                batch = self._pending
+                self._pending = {}
+                self._first_pending_at = None
+            if not batch:
+                return
+            try:
+                self.write(list(batch.values()))
+            except Exception as error:
+                self.failures += 1
+                self.last_error = error
+                # Put the batch back in front of anything submitted since
+                with self._cond:
+                    batch.update(self._pending)
+                    self._pending = batch
+                    self._first_pending_at = time.monotonic()
+                raise
+            self.batches += 1
+            self.last_success = time.time()
+            self.last_error = None
+
+    def pending(self):
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._thread.join()
+        self.flush()
+
+
+# Views derived from the order history, kept current by every order write.
+# JsonStore saves them alongside the snapshot under these keys.
+DERIVED_VIEWS = {
+    'aggregates': OrderAggregates,
+    'rollups': SalesRollups
+}
+
+
+ID_KINDS = ('products', 'orders')
+ARCHIVE_STATUSES = ('delivered', 'cancelled')
+TRAILING_NUMBER = re.compile(r'(\d+)$')
+
+
+def _highest_id(ids):
+    # Sequence number at the end of IDs like '12', 'ORD-0042' or
+    # 'ORD-20260101-000042'
+    highest = 0
+    for record_id in ids:
+        match = TRAILING_NUMBER.search(record_id)
+        if match:
+            highest = max(highest, int(match.group(1)))
+    return highest
+
+
+# Parts of a store that load separately; see wait_ready()
+PARTS = ('header', 'products', 'orders')
+# Records converted between pauses while loading in the background
+LOAD_STEP = 2000
+
+
+def _run_steps(steps):
+    # Drives load steps (see Store._load_steps) to the end on this thread
+    result = None
+    while True:
+        try:
+            work = steps.send(result)
+        except StopIteration:
+            return
+        result = work() if work is not None else None
+
+
+class Store:
+    views = None
+    versions = None
+    record_versions = None
+    search = None
+    _writer = None
+    _loading = None
+
+    def _start_loading(self):
+        self._ready = set()
+        self._waiters = {}
+        self._loading = self._load_steps()
+
+    def _load_steps(self):
+        # A generator that yields None to pause, or a blocking callable to
+        # run off the event loop, whose result is sent back in
+        return iter(())
+
+    def load(self):
+        return self.open().finish_loading()
+
+    def finish_loading(self):
+        # Loads whatever open() left for later, blocking until it's done
+        result = None
+        while self._loading is not None:
+            work = self._step(result)
+            result = work() if work is not None else None
+        return self
+
+    async def load_in_background(self):
+        result = None
+        while self._loading is not None:
+            work = self._step(result)
+            if work is None:
+                result = None
+                await asyncio.sleep(0)
+            else:
+                result = await asyncio.to_thread(work)
+        return self
+
+    def _step(self, result):
+        try:
+            work = self._loading.send(result)
+        except StopIteration:
+            self._loading = None
+            return None
+        return work
+
+    def is_ready(self, *parts):
+        return all(part in self._ready for part in parts or PARTS)
+
+    async def wait_ready(self, *parts):
+        for part in parts or PARTS:
+            if part not in self._ready:
+                waiter = asyncio.get_running_loop().create_future()
+                self._waiters.setdefault(part, []).append(waiter)
+                await waiter
+
+    def _mark_ready(self, part):
+        self._ready.add(part)
+        for waiter in self._waiters.pop(part, ()):
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def _touch(self, collection, record_id=None):
+        # Bumped on every write so callers can tell when cached output is
+        # stale, both for the whole collection and for the one record
+        self.versions[collection] = self.versions.get(collection, 0) + 1
+        if record_id is not None:
+            key = (collection, record_id)
+            self.record_versions[key] = self.record_versions.get(key, 0) + 1
+
+    def persist_stats(self):
+        writer = self._writer
+        if writer is None:
+            return {'batches': 0, 'failures': 0, 'pending': 0, 'last_success': None, 'last_error': None}
+        return {
+            'batches': writer.batches,
+            'failures': writer.failures,
+            'pending': writer.pending(),
+            'last_success': writer.last_success,
+            'last_error': str(writer.last_error) if writer.last_error else None
+        }
+
+    def version(self, collection, record_id=None):
+        if record_id is None:
+            return self.versions.get(collection, 0)
+        return self.record_versions.get((collection, record_id), 0)
+
+    @property
+    def aggregates(self):
+        return self.views['aggregates']
+
+    @property
+    def rollups(self):
+        return self.views['rollups']
+
+    def _order_changed(self, order_id, old, new):
+        for view in self.views.values():
+            view.order_changed(order_id, old, new)
+
+    def archivable_orders(self, before, limit):
+        # Only JsonStore archives; SqliteStore's orders already live on disk
+        return []
+
+    def archive_orders(self, order_ids):
+        # Returns how many were archived; nothing, for the same reason
+        return 0
+
+
+def _load_views(data):
+    # Views saved with the snapshot only need the log applied on top
+    views = {}
+    for name, view in DERIVED_VIEWS.items():
+        saved = data.pop(name, None)
+        if saved is not None:
+            views[name] = view.from_dict(saved)
+        else:
+            views[name] = view.from_orders(data['orders'].values())
+    return views
+
+
+def _as_records(data):
+    # Swapped one at a time, so the dicts are freed as the load goes
+    for collection, record_type in RECORD_TYPES.items():
+        records = data.setdefault(collection, {})
+        for record_id, record in records.items():
+            records[record_id] = record_type.from_dict(record)
+    return data
+
+
+class JsonStore(Store):
+    # Keeps everything in memory in the original bot_data.json layout, with
+    # products and orders held as compact records (see records.py).
+
+    def __init__(self, path, default, compact_after=5000, flush_interval_ms=200, flush_after=100):
+        self.path = path
+        self.log_path = path + '.wal'
+        self.compacting_path = path + '.wal.compacting'
+        self.default = default
+        self.compact_after = compact_after
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_after = flush_after
+        self.data = None
+        self.index = None
+        self._reader = None
+        self.versions = {}
+        self.record_versions = {}
+        self._ordered_keys = {}
+        self._log = None
+        self._log_seq = None
+        self._log_records = 0
+        self._folded = 0
+        self._compactor = None
+        self._writer = None
+        self._batch = None
+
+    def _read_snapshot(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return self.default()
+
+    def open(self):
+        self._start_loading()
+        self.data = {collection: {} for collection in RECORD_TYPES}
+        self.views = {name: view() for name, view in DERIVED_VIEWS.items()}
+        self.index = OrderIndex()
+        self.search = ProductSearch()
+
+        self._sections_read = set()
+        self._stream = None
+        self._current_layout = False
+        self._folded = 0
+        if os.path.exists(self.path):
+            self._reader = _SnapshotReader(self.path)
+            self._sections = self._reader.sections()
+            self._read_header()
+        else:
+            self._reader = self._sections = None
+            self.data = self.default()
+            self._sections_read.update(self.data)
+            self._current_layout = True
+
+        # The log is read up front, sorted by the part it belongs to, and
+        # applied as each part finishes loading. Segments the snapshot
+        # already includes are skipped.
+        self._pending_ops = {part: [] for part in PARTS}
+
+        def collect(op, path, value):
+            part = path[0] if path[0] in RECORD_TYPES else 'header'
+            self._pending_ops[part].append((op, path, value))
+
+        compacting_seq = _segment_seq(self.compacting_path)
+        if compacting_seq is not None and compacting_seq <= self._folded:
+            os.remove(self.compacting_path)
+        else:
+            _replay(self.compacting_path, collect)
+        log_seq = _segment_seq(self.log_path)
+        if log_seq is not None and log_seq <= self._folded:
+            # save() wrote the snapshot but didn't get to empty the log
+            log_seq = None
+            carried = ''
+            self._log_records = 0
+        else:
+            self._log_records = _replay(self.log_path, collect, truncate_torn=True)
+            carried = None
+        if log_seq is None:
+            # A new log, or one from before logs were numbered, which keeps
+            # its records behind a header
+            if carried is None and os.path.exists(self.log_path):
+                with open(self.log_path, 'r', encoding='utf-8') as f:
+                    carried = f.read()
+            self._log_seq = max(self._folded, compacting_seq or 0) + 1
+            self._start_log(carried or '')
+        else:
+            self._log_seq = log_seq
+            self._log = open(self.log_path, 'a', encoding='utf-8')
+        self._writer = WriteBehind(self._write_batch, self.flush_interval_ms, self.flush_after)
+
+        # Nothing to pause for yet: whatever can finish now (the header, in
+        # a current snapshot) is small
+        _run_steps(self._finish_parts())
+        return self
+
+    def _read_header(self):
+        # Reads sections until products or orders come up; in a current
+        # snapshot that's everything but those two
+        for key, value in self._sections:
+            if key in RECORD_TYPES or key in DERIVED_VIEWS:
+                self._stream = (key, value)
+                return
+            if key == '_layout':
+                self._current_layout = value >= SNAPSHOT_LAYOUT
+            elif key == '_folded':
+                self._folded = value
+            else:
+                self.data[key] = value
+                self._sections_read.add(key)
+        self._reader.close()
+        self._reader = self._sections = None
+
+    def _load_steps(self):
+        while self._stream is not None:
+            section, entries = self._stream
+            if section in DERIVED_VIEWS:
+                yield from self._read_view(section, entries)
+            else:
+                records = self.data[section]
+                record_type = RECORD_TYPES[section]
+                for n, (record_id, fields) in enumerate(entries, 1):
+                    records[record_id] = record_type.from_dict(fields)
+                    if n % LOAD_STEP == 0:
+                        yield
+            self._sections_read.add(section)
+            self._stream = None
+            yield from self._finish_parts()
+            self._read_header()
+        yield from self._finish_parts()
+        if not self._current_layout:
+            # Rewrite an older snapshot in the current layout so the next
+            # start can skip straight to the small sections
+            with self._writer.lock:
+                self.compact()
+
+    def _read_view(self, name, fields):
+        saved = self.data[name] = {}
+        for field, value in fields:
+            if field != 'by_product':
+                saved[field] = value
+                continue
+            by_product = saved[field] = {}
+            for n, (product_id, figures) in enumerate(value, 1):
+                by_product[product_id] = figures
+                if n % LOAD_STEP == 0:
+                    yield
+
+    def _finish_parts(self):
+        # Completes every part whose sections have all been read. Records
+        # depend on the header for their counters, and an older snapshot
+        # keeps its header last.
+        read_all = self._reader is None
+        header_done = read_all or self._current_layout
+        steps = []
+        if 'header' not in self._ready and header_done:
+            steps.append(self._finish_part('header'))
+        if 'products' not in self._ready and header_done and (
+                'products' in self._sections_read or read_all):
+            steps.append(self._finish_part('products'))
+        # The saved views are the last thing in the file
+        if 'orders' not in self._ready and read_all:
+            steps.append(self._finish_part('orders'))
+        for part_steps in steps:
+            yield from part_steps
+
+    def _finish_part(self, part):
+        # The views and indexes are built from full scans in a worker
+        # thread; nothing writes to a part's records before it's ready
+        data = self.data
+        if part == 'orders':
+            self.views = yield lambda: _load_views(data)
+            self.index = yield lambda: OrderIndex.from_orders(data['orders'].items())
+        elif part == 'products':
+            self.search = yield lambda: ProductSearch.from_products(data['products'].items())
+
+        for n, (op, path, value) in enumerate(self._pending_ops.pop(part), 1):
+            self._mutate(op, path, value)
+            if n % LOAD_STEP == 0:
+                yield
+
+        # A counter write can be lost to a crash after the record it
+        # numbered made it to disk, so never hand out anything at or below
+        # an ID that already exists
+        counters = data.setdefault('counters', {})
+        if part in ID_KINDS:
+            highest = yield lambda: _highest_id(data[part])
+            counters[part] = max(counters.get(part, 0), highest)
+        self._mark_ready(part)
+
+    def _append(self, record):
+        if self._batch is not None:
+            self._batch.append(record)
+            return
+        # Serialize now, while the values can't change under us; a later
+        # write to the same path supersedes this one if it hasn't hit disk.
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        key = tuple(record['path']) if record['op'] != 'batch' else None
+        self._writer.submit(line, key=key)
+
+    def _start_log(self, carried=''):
+        # Replaces the log with one that starts with its segment number,
+        # followed by any records `carried` over
+        header = json.dumps({'op': 'segment', 'seq': self._log_seq}) + '\n'
+        tmp_path = self.log_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(header + carried)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.log_path)
+        self._log = open(self.log_path, 'a', encoding='utf-8')
+
+    def _write_batch(self, lines):
+        # Runs on the writer thread
+        self._log.write(''.join(lines))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_records += len(lines)
+        if self._log_records >= self.compact_after:
+            self.compact()
+
+    def _mutate(self, op, path, value=None):
+        collection = path[0]
+        self._touch(collection, path[1] if len(path) > 1 else None)
+        if len(path) == 2:
+            keys = self._ordered_keys.get(collection)
+            if keys is not None and op == 'set' and path[1] not in self.data[collection]:
+                keys.append(path[1])
+            elif op in ('del', 'archive'):
+                self._ordered_keys.pop(collection, None)
+
+        if collection not in ('orders', 'products') or len(path) < 2:
+            _apply(self.data, op, path, value)
+            return
+
+        record_id = path[1]
+        record_type = RECORD_TYPES[collection]
+        if op == 'set' and len(path) == 2:
+            value = record_type.from_dict(value)
+        old = self.data[collection].get(record_id)
+        if old is not None:
+            old = old.copy()
+        _apply(self.data, op, path, value)
+        new = self.data[collection].get(record_id)
+        if type(new) is dict:
+            # A field written to a record that didn't exist yet
+            new = self.data[collection][record_id] = record_type.from_dict(new)
+        if op == 'archive':
+            self.index.order_changed(record_id, old, None)
+        elif collection == 'orders':
+            self._order_changed(record_id, old, new)
+        else:
+            self.search.product_changed(record_id, old, new)
+
+    def _order_changed(self, order_id, old, new):
+        super()._order_changed(order_id, old, new)
+        self.index.order_changed(order_id, old, new)
+
+    def set(self, path, value):
+        self._mutate('set', path, value)
+        self._append({'op': 'set', 'path': path, 'value': value})
+
+    def delete(self, path):
+        self._mutate('del', path)
+        self._append({'op': 'del', 'path': path})
+
+    def archive(self, path):
+        self._mutate('archive', path)
+        self._append({'op': 'archive', 'path': path})
+
+    def flush(self):
+        self._writer.flush()
+
+    @contextmanager
+    def batch(self, flush=True):
+        # Everything written inside goes to the log as a single record and
+        # is flushed straight away, unless the caller will flush() itself
+        # (say, off the event loop)
+        self._batch = []
+        try:
+            yield self
+        finally:
+            records, self._batch = self._batch, None
+            if records:
+                self._append({'op': 'batch', 'ops': records})
+            if flush:
+                self.flush()
+
+    def compact(self):
+        if self._compactor and self._compactor.is_alive():
+            return
+        if os.path.exists(self.compacting_path):
+            # Left over from an interrupted compaction; its records are
+            # already in memory, fold it in before rotating again.
+            self._fold_segment()
+
+        self._log.close()
+        os.replace(self.log_path, self.compacting_path)
+        self._log_seq += 1
+        self._start_log()
+        self._log_records = 0
+
+        self._compactor = Thread(target=self._fold_segment, daemon=True)
+        self._compactor.start()
+
+    def _fold_segment(self):
+        # The views are carried forward rather than rebuilt from the orders,
+        # which no longer include archived ones
+        seq = _segment_seq(self.compacting_path)
+        data = self._read_snapshot()
+        folded = data.pop('_folded', 0)
+        if seq is not None and seq <= folded:
+            # Folded in already by a run that stopped before removing it
+            os.remove(self.compacting_path)
+            return
+        views = _load_views(data)
+
+        def apply(op, path, value):
+            if path[0] != 'orders' or len(path) < 2:
+                _apply(data, op, path, value)
+                return
+            old = data['orders'].get(path[1])
+            if old is not None:
+                old = dict(old)
+            _apply(data, op, path, value)
+            if op != 'archive':
+                new = data['orders'].get(path[1])
+                for view in views.values():
+                    view.order_changed(path[1], old, new)
+
+        _replay(self.compacting_path, apply)
+        for name, view in views.items():
+            data[name] = view.to_dict()
+        _write_snapshot(self.path, data, folded if seq is None else seq)
+        os.remove(self.compacting_path)
+
+    def save(self, data=None):
+        # Full rewrite of the snapshot from memory; only for bulk operations
+        # where logging every record would be pointless.
+        self.finish_loading()
+        if data is not None:
+            self.data = _as_records(data)
+            self.views = _load_views(data)
+            self.index = OrderIndex.from_orders(data['orders'].items())
+            self.search = ProductSearch.from_products(data['products'].items())
+        self._writer.flush()
+        with self._writer.lock:
+            if self._compactor:
+                self._compactor.join()
+            views = {name: view.to_dict() for name, view in self.views.items()}
+            # Everything in memory, so everything logged so far
+            _write_snapshot(self.path, {**self.data, **views}, self._log_seq)
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+            self._log.close()
+            self._log_seq += 1
+            self._start_log()
+            self._log_records = 0
+
+    def close(self):
+        if self._reader:
+            self._reader.close()
+            self._reader = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self._compactor:
+            self._compactor.join()
+        if self._log:
+            self._log.close()
+            self._log = None
+
+
+    # Domain API shared with SqliteStore
+
+    def observe_id(self, kind, record_id):
+        # Records created with an explicit ID (e.g. by an import) push the
+        # counter past them so next_id can't collide later
+        if _highest_id([record_id]) > self.data['counters'][kind]:
+            self.set(['counters', kind], _highest_id([record_id]))
+
+    def next_id(self, kind):
+        # Allocation is a plain increment on the event loop, so concurrent
+        # submissions can't get the same number
+        value = self.data['counters'][kind] + 1
+        self.set(['counters', kind], value)
+        return value
+
+    def get_product(self, product_id):
+        return self.data['products'].get(product_id)
+
+    def put_product(self, product_id, product):
+        self.set(['products', product_id], product)
+
+    def update_product(self, product_id, **fields):
+        for key, value in fields.items():
+            self.set(['products', product_id, key], value)
+
+    def delete_product(self, product_id):
+        self.delete(['products', product_id])
+
+    def iter_products(self):
+        return iter(self.data['products'].items())
+
+    def count_products(self):
+        return len(self.data['products'])
+
+    def get_order(self, order_id):
+        return self.data['orders'].get(order_id)
+
+    def put_order(self, order_id, order):
+        self.set(['orders', order_id], order)
+
+    def update_order(self, order_id, **fields):
+        for key, value in fields.items():
+            self.set(['orders', order_id, key], value)
+
+    def _keys(self, collection):
+        # Creation-ordered key list for positional paging. New records are
+        # appended as they arrive; a delete drops it to be rebuilt on demand.
+        keys = self._ordered_keys.get(collection)
+        if keys is None:
+            keys = self._ordered_keys[collection] = list(self.data[collection])
+        return keys
+
+    def page_products(self, offset, limit):
+        products = self.data['products']
+        return [(pid, products[pid]) for pid in self._keys('products')[offset:offset + limit]]
+
+    def iter_order_chunks(self, size):
+        # Oldest first. Only the key list is copied, so the caller may yield
+        # to the event loop between chunks while orders keep coming in.
+        orders = self.data['orders']
+        keys = list(orders)
+        for start in range(0, len(keys), size):
+            yield [(oid, orders[oid]) for oid in keys[start:start + size] if oid in orders]
+
+    def query_orders(self, status=None, customer=None, product_id=None,
+                     since=None, until=None, offset=0, limit=10):
+        return self.index.query(self.data['orders'], status, customer, product_id,
+                                since, until, offset, limit)
+
+    def count_orders(self, status=None):
+        return self.aggregates.count(status)
+
+    def order_totals(self):
+        return self.aggregates.revenue, self.aggregates.profit
+
+    def archivable_orders(self, before, limit):
+        # Oldest delivered/cancelled orders created before `before`, as
+        # (order_id, version, order dict) so the caller can tell if one
+        # changes while it's being written out
+        found = []
+        for status in ARCHIVE_STATUSES:
+            for _, order_id in self.index.created_before(status, before, limit):
+                order = self.data['orders'][order_id]
+                found.append((order_id, self.version('orders', order_id), order.to_dict()))
+        found.sort(key=lambda entry: entry[2]['created_at'])
+        return found[:limit]
+
+    def archive_orders(self, order_ids):
+        with self.batch():
+            for order_id in order_ids:
+                self.archive(['orders', order_id])
+        return len(order_ids)
+
+    def get_setting(self, key):
+        return self.data['settings'].get(key)
+
+    def get_supplier(self, supplier_id):
+        return self.data.get('suppliers', {}).get(supplier_id)
+
+    def put_supplier(self, supplier_id, supplier):
+        self.set(['suppliers', supplier_id], supplier)
+
+    def iter_suppliers(self):
+        return iter(list(self.data.get('suppliers', {}).items()))
+
+    def set_setting(self, key, value):
+        self.set(['settings', key], value)
+
+
+PRODUCT_COLUMNS = ('name', 'description', 'price', 'supplier_cost', 'stock',
+                   'profit_margin', 'created_at', 'active')
+ORDER_COLUMNS = ('product_id', 'product_name', 'quantity', 'total', 'profit',
+                 'customer_name', 'customer_email', 'shipping_address', 'status',
+                 'created_at', 'created_by')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    price REAL NOT NULL,
+    supplier_cost REAL NOT NULL,
+    stock INTEGER NOT NULL,
+    profit_margin REAL,
+    created_at TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    extra TEXT
+);
+CREATE TABLE IF NOT EXISTS orders (
+    id TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL,
+    product_name TEXT,
+    quantity INTEGER NOT NULL,
+    total REAL NOT NULL,
+    profit REAL NOT NULL,
+    customer_name TEXT,
+    customer_email TEXT,
+    shipping_address TEXT,
+    status TEXT NOT NULL,
+    created_at TEXT,
+    created_by TEXT,
+    extra TEXT
+);
+DROP INDEX IF EXISTS idx_orders_status;
+DROP INDEX IF EXISTS idx_orders_product_id;
+DROP INDEX IF EXISTS idx_orders_customer_email;
+CREATE INDEX IF NOT EXISTS idx_orders_status_created ON orders(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_product_created ON orders(product_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_customer_created ON orders(lower(trim(customer_email)), created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_created_at ON orders(created_at);
+CREATE TABLE IF NOT EXISTS suppliers (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def _row_values(record, columns):
+    # Fields without a dedicated column are kept in the `extra` JSON blob
+    extra = {k: v for k, v in record.items() if k not in columns}
+    values = [record.get(column) for column in columns]
+    return values + [json.dumps(extra, separators=(',', ':')) if extra else None]
+
+
+def _row_to_dict(row, columns):
+    record = dict(zip(columns, row[1:len(columns) + 1]))
+    if row[-1]:
+        record.update(json.loads(row[-1]))
+    return record
+
+
+def _product_from_row(row):
+    product = _row_to_dict(row, PRODUCT_COLUMNS)
+    product['active'] = bool(product['active'])
+    return product
+
+
+class SqliteStore(Store):
+    # Products and orders live in indexed tables; nothing is held in memory
+    # beyond SQLite's own page cache. Statements run immediately on the
+    # caller's thread inside an open transaction, and the WriteBehind worker
+    # commits whatever has accumulated.
+
+    def __init__(self, path, default, flush_interval_ms=200, flush_after=100):
+        self.path = path
+        self.default = default
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_after = flush_after
+        self.conn = None
+        self.counters = {}
+        self.versions = {}
+        self.record_versions = {}
+        self._lock = RLock()
+        self._writer = None
+        self._product_select = f"SELECT id, {', '.join(PRODUCT_COLUMNS)}, extra FROM products"
+        self._order_select = f"SELECT id, {', '.join(ORDER_COLUMNS)}, extra FROM orders"
+
+    def open(self):
+        self._start_loading()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        for key, value in self.default()['settings'].items():
+            self.conn.execute(
+                'INSERT OR IGNORE INTO settings (key, value) VALUES (?, ?)',
+                (key, json.dumps(value))
+            )
+        self.counters = dict(self.conn.execute('SELECT name, value FROM counters'))
+        for kind in ID_KINDS:
+            if kind not in self.counters:
+                ids = (row[0] for row in self.conn.execute(f'SELECT id FROM {kind}'))
+                self.counters[kind] = _highest_id(ids)
+        self.conn.commit()
+        self.views = {name: view() for name, view in DERIVED_VIEWS.items()}
+        self.search = ProductSearch()
+        self._writer = WriteBehind(self._commit, self.flush_interval_ms, self.flush_after)
+        self._mark_ready('header')
+        return self
+
+    def _load_steps(self):
+        # The search index and the views come from full scans, which run on
+        # their own connection in a worker thread so the loop stays free
+        self.search = yield self._read_search
+        self._mark_ready('products')
+        self.views = yield self._read_views
+        self._mark_ready('orders')
+
+    def _scan_connection(self):
+        return sqlite3.connect(self.path, cached_statements=16)
+
+    def _read_search(self):
+        conn = self._scan_connection()
+        try:
+            rows = conn.execute(self._product_select + ' ORDER BY rowid')
+            return ProductSearch.from_products((row[0], _product_from_row(row)) for row in rows)
+        finally:
+            conn.close()
+
+    def _read_views(self):
+        conn = self._scan_connection()
+        try:
+            return {'aggregates': self._build_aggregates(conn), 'rollups': self._build_rollups(conn)}
+        finally:
+            conn.close()
+
+    def _build_aggregates(self, conn):
+        # The tables are the source of truth, so rather than trusting a saved
+        # copy the totals are rebuilt with two grouped scans at startup.
+        aggregates = OrderAggregates()
+        for status, orders, revenue, profit in conn.execute(
+            'SELECT status, COUNT(*), SUM(total), SUM(profit) FROM orders GROUP BY status'
+        ):
+            aggregates.orders += orders
+            aggregates.revenue += revenue
+            aggregates.profit += profit
+            aggregates.by_status[status] = orders
+        for product_id, orders, quantity, revenue, profit in conn.execute(
+            'SELECT product_id, COUNT(*), SUM(quantity), SUM(total), SUM(profit) FROM orders GROUP BY product_id'
+        ):
+            aggregates.by_product[product_id] = {
+                'orders': orders, 'quantity': quantity, 'revenue': revenue, 'profit': profit
+            }
+        return aggregates
+
+    def _build_rollups(self, conn):
+        rollups = SalesRollups()
+        for product_id, day, revenue, profit, units, orders in conn.execute(
+            "SELECT product_id, substr(created_at, 1, 10) AS day, SUM(total), SUM(profit), "
+            "SUM(quantity), COUNT(*) FROM orders WHERE status != 'cancelled' GROUP BY product_id, day"
+        ):
+            rollups.add_bucket(product_id, day_of(day), (revenue, profit, units, orders))
+        return rollups
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self.conn.execute(sql, params)
+        self._writer.submit()
+
+    def _commit(self, batch):
+        # Runs on the writer thread
+        with self._lock:
+            self.conn.commit()
+
+    def flush(self):
+        self._writer.flush()
+
+    @contextmanager
+    def batch(self, flush=True):
+        # Holding the connection lock keeps the writer from committing
+        # half-way, so everything inside lands in one transaction. Without
+        # `flush` the commit is left to the writer, or the caller's flush().
+        with self._lock:
+            try:
+                yield self
+            finally:
+                if flush:
+                    self.conn.commit()
+
+    def close(self):
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+
+    def _upsert(self, table, columns, record_id, record):
+        # ON CONFLICT rather than OR REPLACE keeps the rowid, and with it the
+        # record's place in creation order
+        placeholders = ', '.join('?' * (len(columns) + 2))
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in columns + ('extra',))
+        self._execute(
+            f"INSERT INTO {table} (id, {', '.join(columns)}, extra) VALUES ({placeholders}) "
+            f"ON CONFLICT(id) DO UPDATE SET {assignments}",
+            [record_id] + _row_values(record, columns)
+        )
+        self._touch(table, record_id)
+
+    def _update(self, table, columns, getter, record_id, fields):
+        known = {k: v for k, v in fields.items() if k in columns}
+        if len(known) != len(fields):
+            record = getter(record_id)
+            if record is None:
+                return
+            record.update(fields)
+            self._upsert(table, columns, record_id, record)
+            return
+        assignments = ', '.join(f'{column} = ?' for column in known)
+        self._execute(
+            f"UPDATE {table} SET {assignments} WHERE id = ?",
+            list(known.values()) + [record_id]
+        )
+        self._touch(table, record_id)
+
+    def _set_counter(self, kind, value):
+        self.counters[kind] = value
+        self._execute(
+            'INSERT INTO counters (name, value) VALUES (?, ?) '
+            'ON CONFLICT(name) DO UPDATE SET value = excluded.value',
+            (kind, value)
+        )
+
+    def observe_id(self, kind, record_id):
+        if _highest_id([record_id]) > self.counters[kind]:
+            self._set_counter(kind, _highest_id([record_id]))
+
+    def next_id(self, kind):
+        # The counter row is committed in the same transaction as the record
+        # it numbers
+        self._set_counter(kind, self.counters[kind] + 1)
+        return self.counters[kind]
+
+    def get_product(self, product_id):
+        rows = self._query(self._product_select + ' WHERE id = ?', (product_id,))
+        return _product_from_row(rows[0]) if rows else None
+
+    def put_product(self, product_id, product):
+        old = self.get_product(product_id)
+        self._upsert('products', PRODUCT_COLUMNS, product_id, product)
+        self.search.product_changed(product_id, old, product)
+
+    def update_product(self, product_id, **fields):
+        reindex = 'name' in fields or 'description' in fields
+        old = self.get_product(product_id) if reindex else None
+        self._update('products', PRODUCT_COLUMNS, self.get_product, product_id, fields)
+        if reindex and old is not None:
+            self.search.product_changed(product_id, old, {**old, **fields})
+
+    def delete_product(self, product_id):
+        self._execute('DELETE FROM products WHERE id = ?', (product_id,))
+        self._touch('products', product_id)
+        self.search.remove(product_id)
+
+    def iter_products(self):
+        for row in self._query(self._product_select + ' ORDER BY rowid'):
+            yield row[0], _product_from_row(row)
+
+    def count_products(self):
+        return self._query('SELECT COUNT(*) FROM products')[0][0]
+
+    def get_order(self, order_id):
+        rows = self._query(self._order_select + ' WHERE id = ?', (order_id,))
+        return _row_to_dict(rows[0], ORDER_COLUMNS) if rows else None
+
+    def put_order(self, order_id, order):
+        old = self.get_order(order_id)
+        self._upsert('orders', ORDER_COLUMNS, order_id, order)
+        self._order_changed(order_id, old, order)
+
+    def update_order(self, order_id, **fields):
+        old = self.get_order(order_id)
+        if old is None:
+            return
+        self._update('orders', ORDER_COLUMNS, self.get_order, order_id, fields)
+        self._order_changed(order_id, old, {**old, **fields})
+
+    def page_products(self, offset, limit):
+        rows = self._query(self._product_select + ' ORDER BY rowid LIMIT ? OFFSET ?', (limit, offset))
+        return [(row[0], _product_from_row(row)) for row in rows]
+
+    def iter_order_chunks(self, size):
+        # Oldest first, paging on rowid so each chunk is an index seek
+        last = 0
+        while True:
+            rows = self._query(
+                f"SELECT rowid, id, {', '.join(ORDER_COLUMNS)}, extra FROM orders "
+                "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                (last, size)
+            )
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [(row[1], _row_to_dict(row[1:], ORDER_COLUMNS)) for row in rows]
+
+    def query_orders(self, status=None, customer=None, product_id=None,
+                     since=None, until=None, offset=0, limit=10):
+        # Same contract as OrderIndex.query; each filter column leads a
+        # composite index ending in created_at, so the ORDER BY is free
+        clauses = []
+        params = []
+        if status is not None:
+            clauses.append('status = ?')
+            params.append(status)
+        if customer is not None:
+            clauses.append('lower(trim(customer_email)) = ?')
+            params.append(customer_key(customer))
+        if product_id is not None:
+            clauses.append('product_id = ?')
+            params.append(product_id)
+        if since:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until:
+            clauses.append('created_at < ?')
+            params.append(until)
+        where = (' WHERE ' + ' AND '.join(clauses)) if clauses else ''
+
+        total = self._query('SELECT COUNT(*) FROM orders' + where, params)[0][0]
+        rows = self._query(
+            self._order_select + where + ' ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+        return total, [(row[0], _row_to_dict(row, ORDER_COLUMNS)) for row in rows]
+
+    def count_orders(self, status=None):
+        return self.aggregates.count(status)
+
+    def order_totals(self):
+        return self.aggregates.revenue, self.aggregates.profit
+
+    def get_setting(self, key):
+        rows = self._query('SELECT value FROM settings WHERE key = ?', (key,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_supplier(self, supplier_id):
+        rows = self._query('SELECT data FROM suppliers WHERE id = ?', (supplier_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def put_supplier(self, supplier_id, supplier):
+        self._execute(
+            'INSERT OR REPLACE INTO suppliers (id, data) VALUES (?, ?)',
+            (supplier_id, json.dumps(supplier))
+        )
+        self._touch('suppliers', supplier_id)
+
+    def iter_suppliers(self):
+        for supplier_id, data in self._query('SELECT id, data FROM suppliers ORDER BY id'):
+            yield supplier_id, json.loads(data)
+
+    def set_setting(self, key, value):
+        self._execute(
+            'INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+            (key, json.dumps(value))
+        )
+
+
+def migrate_json_to_sqlite(json_path, db_path, default):
+    # One-shot import of an existing bot_data.json (plus any pending WAL)
+    source = JsonStore(json_path, default).load()
+    data = source.data
+    source.close()
+
+    target = SqliteStore(db_path, default).load()
+    # Hold the connection lock so the writer can't commit a partial import
+    with target._lock:
+        for product_id, product in data['products'].items():
+            target.put_product(product_id, product)
+        for order_id, order in data['orders'].items():
+            target.put_order(order_id, order)
+        for supplier_id, supplier in data.get('suppliers', {}).items():
+            target.put_supplier(supplier_id, supplier)
+        for key, value in data.get('settings', {}).items():
+            target.set_setting(key, value)
+        for kind, value in data['counters'].items():
+            target._execute(
+                'INSERT OR REPLACE INTO counters (name, value) VALUES (?, ?)',
+                (kind, value)
+            )
+        target.conn.commit()
+    return target
+
+
+def open_store(backend, path, default, **options):
+    if backend == 'sqlite':
+        return SqliteStore(path, default, **options)
+    if backend == 'json':
+        return JsonStore(path, default, **options)
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -0,0 +1,250 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+
+import aiohttp
+
+# Supplier cost and stock feeds.
+#
+# A supplier record (data['suppliers'], or the suppliers table) may name a
+# feed_url: an http(s) URL, or the name of a file in the bot's feed
+# directory (also the easy way to try a feed out). A feed is CSV with a header row,
+# JSON Lines, or a JSON array of objects, one row per SKU with `sku` and
+# either of `cost` and `stock`. Products are linked to a supplier by their
+# supplier_id, and to a row by their supplier_sku (their own ID if unset).
+#
+# Every sync fetches the guild's feeds concurrently through one pooled HTTP
+# client. HTTP feeds are asked for with If-None-Match / If-Modified-Since
+# and local files are skipped while their mtime and size are unchanged, so
+# a feed that hasn't changed costs one request and no parsing.
+#
+# The last rows applied from each feed are cached. A product is only
+# written when its supplier changed a value since then (on the first sync,
+# when the feed disagrees with the product), so stock sold locally isn't
+# overwritten by a feed that still shows the old number. All changes from
+# one sync go to the store in a single batch, with profit_margin
+# recomputed wherever the cost moved.
+
+COST, STOCK = 0, 1
+
+
+class FeedError(Exception):
+    pass
+
+
+class FeedState:
+    def __init__(self):
+        self.validators = None
+        self.next_validators = None
+        self.rows = None
+        self.last_synced = None
+        self.last_error = None
+        self.skipped_rows = 0
+
+
+def _number(row, fields, convert):
+    for field in fields:
+        value = row.get(field)
+        if value is None or str(value).strip() == '':
+            continue
+        number = convert(value)
+        if number < 0:
+            raise ValueError(f"{field} can't be negative")
+        return number
+    return None
+
+
+def parse_feed(body):
+    # Returns ({sku: (cost or None, stock or None)}, rows skipped)
+    text = body.lstrip('\ufeff').lstrip()
+    if text.startswith('['):
+        entries = json.loads(text)
+    elif text.startswith('{'):
+        entries = []
+        for line in text.splitlines():
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    entries.append(None)
+    else:
+        entries = csv.DictReader(io.StringIO(text))
+
+    rows = {}
+    skipped = 0
+    for entry in entries:
+        if not isinstance(entry, dict):
+            skipped += 1
+            continue
+        sku = str(entry.get('sku') or '').strip()
+        try:
+            cost = _number(entry, ('cost', 'supplier_cost'), float)
+            stock = _number(entry, ('stock', 'quantity'), int)
+        except (TypeError, ValueError):
+            skipped += 1
+            continue
+        if not sku or (cost is None and stock is None):
+            skipped += 1
+            continue
+        rows[sku] = (round(cost, 2) if cost is not None else None, stock)
+    return rows, skipped
+
+
+def _read_file(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+class SupplierSync:
+    def __init__(self, feed_dir, timeout=30, max_connections=10):
+        self.feed_dir = os.path.realpath(feed_dir)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.fetched = 0
+        self.not_modified = 0
+        self.failed = 0
+        self.products_updated = 0
+        self._session = None
+        self._state = {}
+
+    def state(self, guild_id, supplier_id):
+        return self._state.get((guild_id, supplier_id))
+
+    def _client(self):
+        # One session for every feed, so connections to a supplier's host
+        # are kept alive between syncs
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _fetch(self, source, validators):
+        # Returns (body, validators), with body None if the feed hasn't
+        # changed since `validators` were taken
+        if source.startswith(('http://', 'https://')):
+            headers = {}
+            if validators:
+                etag, modified = validators
+                if etag:
+                    headers['If-None-Match'] = etag
+                if modified:
+                    headers['If-Modified-Since'] = modified
+            async with self._client().get(source, headers=headers) as response:
+                if response.status == 304:
+                    return None, validators
+                if response.status >= 400:
+                    raise FeedError(f"HTTP {response.status}")
+                body = await response.text()
+                return body, (response.headers.get('ETag'), response.headers.get('Last-Modified'))
+
+        # Anything else is a file, which has to be inside feed_dir
+        path = os.path.realpath(os.path.join(self.feed_dir, source.removeprefix('file://')))
+        if not path.startswith(self.feed_dir + os.sep):
+            raise FeedError(f"{source} isn't in the feed directory")
+        stat = await asyncio.to_thread(os.stat, path)
+        current = (stat.st_mtime_ns, stat.st_size)
+        if current == validators:
+            return None, validators
+        return await asyncio.to_thread(_read_file, path), current
+
+    async def _fetch_feed(self, guild_id, supplier_id, source):
+        # Returns the feed's rows, or None if it's unchanged or failed
+        state = self._state.setdefault((guild_id, supplier_id), FeedState())
+        try:
+            body, validators = await self._fetch(source, state.validators)
+            if body is None:
+                self.not_modified += 1
+                state.last_synced = time.time()
+                state.last_error = None
+                return None
+            rows, state.skipped_rows = await asyncio.to_thread(parse_feed, body)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError, UnicodeDecodeError,
+                ValueError, csv.Error, FeedError) as error:
+            self.failed += 1
+            state.last_error = str(error) or type(error).__name__
+            print(f"⚠️ Supplier feed {supplier_id} (guild {guild_id}) failed: {state.last_error}")
+            return None
+        self.fetched += 1
+        # Kept aside until the rows are applied, so a sync that doesn't get
+        # that far fetches the feed again next time
+        state.next_validators = validators
+        return rows
+
+    async def sync(self, store, guild_id):
+        # Fetches every supplier feed for one guild's store and applies what
+        # changed; returns the IDs of the products written
+        await store.wait_ready('products')
+        feeds = [(supplier_id, supplier['feed_url']) for supplier_id, supplier in store.iter_suppliers()
+                 if supplier.get('feed_url')]
+        if not feeds:
+            return []
+        results = await asyncio.gather(*(self._fetch_feed(guild_id, supplier_id, source)
+                                         for supplier_id, source in feeds))
+        changed = {supplier_id: rows for (supplier_id, _), rows in zip(feeds, results) if rows is not None}
+        if not changed:
+            return []
+
+        # Nothing is awaited from here on, so the products can't change
+        # between being compared and being written
+        updates = self._diff(store, guild_id, changed)
+        if updates:
+            with store.batch():
+                for product_id, fields in updates:
+                    store.update_product(product_id, **fields)
+        self.products_updated += len(updates)
+
+        now = time.time()
+        for supplier_id, rows in changed.items():
+            state = self._state[(guild_id, supplier_id)]
+            state.rows = rows
+            state.validators = state.next_validators
+            state.last_synced = now
+            state.last_error = None
+        return [product_id for product_id, _ in updates]
+
+    def _diff(self, store, guild_id, changed):
+        cached = {supplier_id: self._state[(guild_id, supplier_id)].rows or {} for supplier_id in changed}
+        updates = []
+        for product_id, product in store.iter_products():
+            supplier_id = product.get('supplier_id')
+            rows = changed.get(supplier_id)
+            if rows is None:
+                continue
+            sku = product.get('supplier_sku') or product_id
+            row = rows.get(sku)
+            if row is None:
+                continue
+            before = cached[supplier_id].get(sku)
+
+            fields = {}
+            cost, stock = row
+            if cost is not None and (before is None or before[COST] != cost) \
+                    and round(product['supplier_cost'] * 100) != round(cost * 100):
+                price = product['price']
+                fields['supplier_cost'] = cost
+                fields['profit_margin'] = round((price - cost) / price * 100, 2) if price > 0 else 0
+            if stock is not None and (before is None or before[STOCK] != stock) and product['stock'] != stock:
+                fields['stock'] = stock
+            if fields:
+                updates.append((product_id, fields))
+        return updates
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def metrics(self):
+        return [
+            ('supplier_feeds_fetched_total', 'counter', 'Supplier feeds downloaded and parsed.', [({}, self.fetched)]),
+            ('supplier_feeds_not_modified_total', 'counter', 'Supplier feed checks that found no change.',
+             [({}, self.not_modified)]),
+            ('supplier_feeds_failed_total', 'counter', 'Supplier feed syncs that failed.', [({}, self.failed)]),
+            ('supplier_products_updated_total', 'counter', 'Products updated from supplier feeds.',
+             [({}, self.products_updated)])
+        ]
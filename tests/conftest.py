@@ -0,0 +1,133 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import OrderAggregates, SalesRollups, SparseSeries  # noqa: E402
+from storage import JsonStore, SqliteStore  # noqa: E402
+
+
+def default_data():
+    # The same empty dataset main.py starts a guild with
+    return {
+        'products': {},
+        'orders': {},
+        'suppliers': {},
+        'counters': {'products': 0, 'orders': 0},
+        'settings': {
+            'order_channel': None,
+            'notification_channel': None,
+            'currency': 'USD'
+        }
+    }
+
+
+def product(n):
+    return {
+        'name': f'Product {n}',
+        'description': 'A "quoted", {braced} [bracketed] description \\ with ünïcode',
+        'price': 12.5,
+        'supplier_cost': 4.25,
+        'stock': 100,
+        'profit_margin': 66.0,
+        'created_at': '2026-01-01T00:00:00',
+        'active': True
+    }
+
+
+def order(n, status='pending', quantity=1, product_id='1'):
+    return {
+        'product_id': product_id,
+        'product_name': f'Product {product_id}',
+        'quantity': quantity,
+        'total': 12.5 * quantity,
+        'profit': 8.25 * quantity,
+        'customer_name': f'Customer {n}',
+        'customer_email': f'customer{n}@example.com',
+        'shipping_address': f'{n} Main St',
+        'status': status,
+        'created_at': f'2026-01-{n % 28 + 1:02d}T10:00:00',
+        'created_by': '1000'
+    }
+
+
+def orders_of(store):
+    return {order_id: order for chunk in store.iter_order_chunks(100) for order_id, order in chunk}
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    # Opens (and fully loads) a store in tmp_path; stores left open by a
+    # test are closed after it
+    opened = []
+
+    def make(backend='json', **options):
+        if backend == 'json':
+            store = JsonStore(str(tmp_path / 'bot_data.json'), default_data, **options)
+        else:
+            store = SqliteStore(str(tmp_path / 'bot_data.db'), default_data, **options)
+        opened.append(store)
+        return store.load()
+
+    yield make
+    for store in opened:
+        store.close()
+
+
+def _cents(value):
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def aggregate_figures(aggregates):
+    # Totals rounded to cents, without statuses and products whose count
+    # went back to zero
+    return {
+        'orders': aggregates.orders,
+        'revenue': _cents(aggregates.revenue),
+        'profit': _cents(aggregates.profit),
+        'by_status': {status: n for status, n in aggregates.by_status.items() if n},
+        'by_product': {pid: {key: _cents(value) for key, value in totals.items()}
+                       for pid, totals in aggregates.by_product.items() if totals['orders']}
+    }
+
+
+def _series_days(series):
+    days = {}
+    if series is not None:
+        if isinstance(series, SparseSeries):
+            numbers = series.days
+        else:
+            numbers = range(series.start, series.start + len(series.columns[0]))
+        for day, values in zip(numbers, zip(*series.columns)):
+            values = tuple(round(value, 2) for value in values)
+            if any(values):
+                days[day] = values
+    return days
+
+
+def rollup_figures(rollups):
+    # Non-empty days of every series, however far each one was padded
+    by_product = {pid: _series_days(series) for pid, series in rollups.by_product.items()}
+    return {
+        'totals': _series_days(rollups.totals),
+        'by_product': {pid: days for pid, days in by_product.items() if days}
+    }
+
+
+@pytest.fixture
+def assert_views_match():
+    # Checks a store's incrementally kept views against ones rebuilt from
+    # every order it has seen, archived ones included
+    def check(store, orders):
+        orders = list(orders)
+        assert aggregate_figures(store.aggregates) == aggregate_figures(OrderAggregates.from_orders(orders))
+        assert rollup_figures(store.rollups) == rollup_figures(SalesRollups.from_orders(orders))
+
+    return check
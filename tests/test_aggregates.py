@@ -0,0 +1,100 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from analytics import OrderAggregates
+from conftest import order, orders_of
+
+STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+PRICES = {'1': (12.5, 4.25), '2': (99.99, 60.0), '3': (0.5, 0.1)}
+
+
+def figures(product_id, quantity):
+    price, cost = PRICES[product_id]
+    return {
+        'quantity': quantity,
+        'total': round(price * quantity, 2),
+        'profit': round((price - cost) * quantity, 2)
+    }
+
+
+def check(store, seen, live, assert_views_match):
+    assert orders_of(store) == {order_id: seen[order_id] for order_id in live}
+    assert_views_match(store, seen.values())
+    for status in STATUSES:
+        total, page = store.query_orders(status=status, limit=len(seen))
+        expected = {order_id for order_id in live if seen[order_id]['status'] == status}
+        assert total == len(expected)
+        assert {order_id for order_id, _ in page} == expected
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_views_match_a_recompute_after_random_writes(make_store, backend, assert_views_match, seed):
+    rng = random.Random(seed)
+    # Small enough that the log is compacted several times along the way
+    options = {'compact_after': 25} if backend == 'json' else {}
+    store = make_store(backend, **options)
+    for product_id, (price, cost) in PRICES.items():
+        store.put_product(product_id, {'name': f'Product {product_id}', 'description': '', 'price': price,
+                                       'supplier_cost': cost, 'stock': 10 ** 6, 'active': True})
+
+    start = datetime(2026, 3, 1)
+    seen = {}  # every order put, in its latest state, archived ones included
+    live = set()
+    for _ in range(400):
+        action = rng.random()
+        order_id = rng.choice(sorted(live)) if live else None
+        if order_id is None or action < 0.35:
+            order_id = f"ORD-{store.next_id('orders'):04d}"
+            product_id = rng.choice(sorted(PRICES))
+            created = start + timedelta(days=rng.randint(0, 60), seconds=rng.randint(0, 86399))
+            seen[order_id] = {
+                'product_id': product_id,
+                'product_name': f'Product {product_id}',
+                **figures(product_id, rng.randint(1, 5)),
+                'customer_name': 'Customer',
+                'customer_email': f'customer{rng.randint(1, 20)}@example.com',
+                'shipping_address': '1 Main St',
+                'status': rng.choice(STATUSES),
+                'created_at': created.isoformat(),
+                'created_by': '1000'
+            }
+            store.put_order(order_id, dict(seen[order_id]))
+            live.add(order_id)
+        elif action < 0.6:
+            status = rng.choice(STATUSES)
+            store.update_order(order_id, status=status)
+            seen[order_id] = {**seen[order_id], 'status': status}
+        elif action < 0.75:
+            fields = figures(seen[order_id]['product_id'], rng.randint(1, 5))
+            store.update_order(order_id, **fields)
+            seen[order_id] = {**seen[order_id], **fields}
+        elif action < 0.85:
+            store.update_order(order_id, status='cancelled')
+            seen[order_id] = {**seen[order_id], 'status': 'cancelled'}
+        else:
+            done = sorted(order_id for order_id in live if seen[order_id]['status'] in ('delivered', 'cancelled'))
+            chosen = rng.sample(done, min(len(done), 3))
+            if chosen and store.archive_orders(chosen):
+                live.difference_update(chosen)
+
+    store.flush()
+    check(store, seen, live, assert_views_match)
+    store.close()
+
+    store = make_store(backend, **options)
+    check(store, seen, live, assert_views_match)
+
+
+def test_changes_move_an_order_between_totals():
+    first, second = order(1, quantity=2), order(2, product_id='2')
+    aggregates = OrderAggregates.from_orders([first, second])
+    aggregates.order_changed('ORD-0001', first, {**first, 'status': 'shipped'})
+    aggregates.order_changed('ORD-0002', second, None)
+    assert aggregates.count() == 1
+    assert aggregates.count('pending') == 0 and aggregates.count('shipped') == 1
+    assert aggregates.revenue == 25.0 and aggregates.profit == 16.5
+    assert aggregates.by_product['1'] == {'orders': 1, 'quantity': 2, 'revenue': 25.0, 'profit': 16.5}
+    assert aggregates.by_product['2']['orders'] == 0
+    assert OrderAggregates.from_dict(aggregates.to_dict()).to_dict() == aggregates.to_dict()
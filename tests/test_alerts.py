@@ -0,0 +1,96 @@
+import asyncio
+from datetime import datetime
+
+from alerts import StockWatcher
+from conftest import order, product
+from shops import Shop
+
+
+class FakeNotifier:
+    def __init__(self):
+        self.posted = []
+
+    def post(self, channel_id, embed):
+        self.posted.append((channel_id, {field.name: field.value for field in embed.fields}))
+        return True
+
+
+def watched_shop(make_store, stock=20, **options):
+    store = make_store('json')
+    store.set_setting('notification_channel', 555)
+    store.put_product('1', {**product(1), 'stock': stock, 'reorder_threshold': 5})
+    shop = Shop(1, store, None)
+    notifier = FakeNotifier()
+    watcher = StockWatcher(notifier, debounce=0.02, **options)
+    watcher.watch(shop)
+    return shop, watcher, notifier
+
+
+def settle(watcher):
+    return asyncio.gather(*watcher._pending.values())
+
+
+def test_a_run_of_sales_alerts_once(make_store):
+    shop, watcher, notifier = watched_shop(make_store)
+
+    async def run():
+        for stock in (6, 5, 3, 1):
+            await shop.ledger.set_stock('1', stock)
+        assert len(watcher._pending) == 1
+        await settle(watcher)
+        # Already alerted: selling more stays quiet
+        await shop.ledger.set_stock('1', 0)
+        assert not watcher._pending
+
+    asyncio.run(run())
+    assert len(notifier.posted) == 1
+    channel_id, fields = notifier.posted[0]
+    assert channel_id == 555 and fields['Stock'] == '1' and fields['Reorder At'] == '5'
+    assert watcher.alerts_sent == 1
+
+
+def test_restocking_within_the_debounce_cancels_the_alert(make_store):
+    shop, watcher, notifier = watched_shop(make_store)
+
+    async def run():
+        await shop.ledger.set_stock('1', 2)
+        await shop.ledger.set_stock('1', 50)
+        await settle(watcher)
+
+    asyncio.run(run())
+    assert notifier.posted == []
+
+
+def test_restocking_rearms_the_alert(make_store):
+    shop, watcher, notifier = watched_shop(make_store)
+
+    async def run():
+        await shop.ledger.set_stock('1', 4)
+        await settle(watcher)
+        await shop.ledger.set_stock('1', 30)
+        await shop.ledger.set_stock('1', 3)
+        await settle(watcher)
+
+    asyncio.run(run())
+    assert [fields['Stock'] for _, fields in notifier.posted] == ['4', '3']
+
+
+def test_suggested_reorder_covers_lead_time_at_the_recent_rate(make_store):
+    shop, watcher, notifier = watched_shop(make_store, window_days=14, cover_days=14)
+    shop.store.put_supplier('SUP-1', {'name': 'Acme', 'lead_time_days': 3})
+    shop.store.update_product('1', supplier_id='SUP-1')
+    today = datetime.now().replace(microsecond=0).isoformat()
+    # 28 units sold over the 14 day window: 2 a day
+    for n in range(1, 8):
+        shop.store.put_order(f'ORD-{n:04d}', {**order(n, status='delivered', quantity=4), 'created_at': today})
+
+    async def run():
+        await shop.ledger.set_stock('1', 5)
+        await settle(watcher)
+
+    asyncio.run(run())
+    fields = notifier.posted[0][1]
+    assert fields['Sold / Day (14d)'] == '2.0'
+    # 2/day over 3 days' lead time and 14 days' cover, plus the threshold, less the stock
+    assert fields['Suggested Reorder'] == f'{2 * 17 + 5 - 5} units'
+    assert fields['Supplier'].startswith('Acme')
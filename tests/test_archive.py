@@ -0,0 +1,79 @@
+import asyncio
+import io
+import json
+
+import bulk
+import main
+from archive import OrderArchive
+from conftest import order
+from shops import Shop
+
+CUTOFF = '2026-06-01'
+
+
+def make_shop(make_store, tmp_path):
+    return Shop(1, make_store('json'), OrderArchive(str(tmp_path / 'archive')).load())
+
+
+def exported(shop):
+    out = io.BytesIO()
+
+    async def pause():
+        pass
+
+    count = asyncio.run(bulk.export_orders(shop.store, 'jsonl', out, pause, shop.archive))
+    rows = [json.loads(line) for line in out.read().decode('utf-8').splitlines()]
+    assert count == len(rows)
+    return rows
+
+
+def test_archived_orders_leave_the_store_but_not_the_figures(make_store, tmp_path, assert_views_match,
+                                                              monkeypatch):
+    monkeypatch.setattr(bulk, 'EXPORT_CHUNK_SIZE', 2)
+    shop = make_shop(make_store, tmp_path)
+    orders = {f'ORD-{n:04d}': order(n, status='delivered' if n % 2 else 'pending') for n in range(1, 8)}
+    for order_id, fields in orders.items():
+        shop.store.put_order(order_id, fields)
+
+    assert asyncio.run(main.archive_shop_orders(shop, CUTOFF)) == 4
+    assert sorted(order_id for chunk in shop.store.iter_order_chunks(10) for order_id, _ in chunk) == \
+        ['ORD-0002', 'ORD-0004', 'ORD-0006']
+    assert shop.archive.count() == 4
+    assert shop.archive.get('ORD-0003') == orders['ORD-0003']
+    assert shop.archive.get('ORD-0002') is None
+    assert_views_match(shop.store, orders.values())
+
+    rows = exported(shop)
+    assert sorted(row['order_id'] for row in rows) == sorted(orders)
+    # Archived ones first
+    assert [row['order_id'] for row in rows[:4]] == ['ORD-0001', 'ORD-0003', 'ORD-0005', 'ORD-0007']
+
+
+def test_an_order_that_changes_while_archived_is_exported_once(make_store, tmp_path):
+    shop = make_shop(make_store, tmp_path)
+    shop.store.put_order('ORD-0001', order(1, status='delivered'))
+    write = shop.archive.write
+
+    def write_then_change(orders):
+        write(orders)
+        shop.store.update_order('ORD-0001', status='processing')
+
+    shop.archive.write = write_then_change
+    assert asyncio.run(main.archive_shop_orders(shop, CUTOFF)) == 0
+    assert [(row['order_id'], row['status']) for row in exported(shop)] == [('ORD-0001', 'processing')]
+
+
+def test_only_the_last_archived_copy_is_exported(make_store, tmp_path):
+    # A crash between writing the archive and removing the orders from the
+    # store leaves a copy behind, and the next run archives them again
+    shop = make_shop(make_store, tmp_path)
+    shop.store.put_order('ORD-0001', order(1, status='cancelled'))
+    shop.store.put_order('ORD-0002', order(2, status='delivered'))
+    shop.archive.write([('ORD-0001', order(1, status='delivered')), ('ORD-0002', order(2, status='delivered'))])
+    assert [(row['order_id'], row['status']) for row in exported(shop)] == \
+        [('ORD-0001', 'cancelled'), ('ORD-0002', 'delivered')]
+
+    assert asyncio.run(main.archive_shop_orders(shop, CUTOFF)) == 2
+    assert [(row['order_id'], row['status']) for row in exported(shop)] == \
+        [('ORD-0001', 'cancelled'), ('ORD-0002', 'delivered')]
+    assert shop.archive.get('ORD-0001')['status'] == 'cancelled'
@@ -0,0 +1,106 @@
+import asyncio
+import csv
+import io
+import json
+
+import bulk
+from conftest import order, orders_of
+
+
+def run_import(store, text, fmt='csv', pauses=None):
+    async def pause():
+        if pauses is not None:
+            pauses.append(store.persist_stats()['pending'])
+
+    return asyncio.run(bulk.import_products(store, text.splitlines(), fmt,
+                                            lambda: str(store.next_id('products')), pause))
+
+
+def run_export(store, fmt):
+    out = io.BytesIO()
+
+    async def pause():
+        pass
+
+    count = asyncio.run(bulk.export_orders(store, fmt, out, pause))
+    return count, out.read().decode('utf-8')
+
+
+def test_csv_import_creates_updates_and_reports(make_store, backend):
+    store = make_store(backend)
+    result = run_import(store, '\n'.join([
+        'id,name,description,price,supplier_cost,stock,active',
+        ',Desk Lamp,Warm light,20,8,5,yes',
+        'SKU-7,Mug,,10,4,100,',
+        ',No Price,,,,3,',
+        'SKU-7,Mug again,,10,4,100,',
+        ',Bad Stock,,5,1,lots,'
+    ]))
+    assert result.created == ['1', 'SKU-7']
+    assert result.errors == [(4, 'missing price, supplier_cost'), (5, 'duplicate id SKU-7'),
+                             (6, "stock must be a number, got 'lots'")]
+    lamp = store.get_product('1')
+    assert (lamp['name'], lamp['price'], lamp['stock'], lamp['profit_margin'], lamp['active']) == \
+        ('Desk Lamp', 20.0, 5, 60.0, True)
+
+    # An explicit ID moves the counter past it, and updates only touch the
+    # fields they name
+    result = run_import(store, 'id,price,stock,active\nSKU-7,12.5,90,no\n,,,\n')
+    assert result.updated == ['SKU-7'] and result.created == []
+    mug = store.get_product('SKU-7')
+    assert (mug['name'], mug['price'], mug['stock'], mug['profit_margin'], mug['active']) == \
+        ('Mug', 12.5, 90, 68.0, False)
+    assert store.next_id('products') == 8
+
+
+def test_jsonl_import(make_store):
+    store = make_store('json')
+    result = run_import(store, '\n'.join([
+        json.dumps({'name': 'Cable', 'price': 3.5, 'supplier_cost': 1, 'stock': 40, 'supplier_id': 'SUP-1'}),
+        '{not json',
+        '[1, 2]',
+        ''
+    ]), fmt='jsonl')
+    assert result.created == ['1']
+    assert [line for line, _ in result.errors] == [2, 3]
+    assert store.get_product('1')['supplier_id'] == 'SUP-1'
+
+
+def test_import_yields_between_batches_with_each_one_on_disk(make_store, backend, monkeypatch):
+    monkeypatch.setattr(bulk, 'IMPORT_BATCH_SIZE', 2)
+    store = make_store(backend, flush_interval_ms=10 ** 6)
+    rows = ['name,price,supplier_cost,stock'] + [f'Product {n},{n},1,10' for n in range(1, 6)]
+    pauses = []
+    result = run_import(store, '\n'.join(rows), pauses=pauses)
+    assert len(result.created) == 5
+    # Two full batches, each flushed before the pause that follows it
+    assert pauses == [0, 0]
+    assert store.persist_stats()['pending'] == 0
+    store.close()
+
+    reopened = make_store(backend)
+    assert sorted(product['name'] for _, product in reopened.iter_products()) == \
+        [f'Product {n}' for n in range(1, 6)]
+
+
+def test_order_export_round_trips(make_store, backend, monkeypatch):
+    monkeypatch.setattr(bulk, 'EXPORT_CHUNK_SIZE', 3)
+    store = make_store(backend)
+    for n in range(1, 8):
+        store.put_order(f'ORD-{n:04d}', order(n, quantity=n, status='shipped' if n % 2 else 'pending'))
+    orders = orders_of(store)
+
+    count, text = run_export(store, 'jsonl')
+    assert count == 7
+    assert {row.pop('order_id'): row for row in map(json.loads, text.splitlines())} == orders
+
+    count, text = run_export(store, 'csv')
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert count == len(rows) == 7
+    assert list(rows[0]) == list(bulk.ORDER_EXPORT_FIELDS)
+    for row in rows:
+        fields = orders[row['order_id']]
+        assert row['status'] == fields['status']
+        assert int(row['quantity']) == fields['quantity']
+        assert float(row['total']) == fields['total']
+        assert row['created_at'] == fields['created_at']
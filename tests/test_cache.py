@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime
+
+import main
+from cache import EmbedCache
+from conftest import default_data, product
+from shops import Shop, ShopRegistry
+from storage import JsonStore
+
+
+def test_a_new_version_renders_again():
+    cache = EmbedCache()
+    renders = []
+
+    def render(value):
+        def build():
+            renders.append(value)
+            return value
+        return build
+
+    assert cache.get('product', 1, render('first')) == 'first'
+    assert cache.get('product', 1, render('unused')) == 'first'
+    assert cache.get('product', 2, render('second')) == 'second'
+    cache.discard('product')
+    assert cache.get('product', 2, render('third')) == 'third'
+    assert renders == ['first', 'second', 'third']
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 3
+
+
+def test_least_recently_used_entry_goes_first():
+    cache = EmbedCache(max_entries=2)
+    cache.get('a', 0, lambda: 'a')
+    cache.get('b', 0, lambda: 'b')
+    cache.get('a', 0, lambda: 'unused')
+    cache.get('c', 0, lambda: 'c')
+    assert len(cache) == 2
+    assert cache.get('a', 0, lambda: 'rendered') == 'a'
+    assert cache.get('b', 0, lambda: 'rendered') == 'rendered'
+
+
+class FakeResponse:
+    def __init__(self, sent):
+        self.sent = sent
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(kwargs.get('embed'))
+
+
+class FakeInteraction:
+    guild_id = 1
+
+    def __init__(self, sent):
+        self.response = FakeResponse(sent)
+
+
+class Clock(datetime):
+    times = []
+
+    @classmethod
+    def now(cls, tz=None):
+        return cls.times.pop(0)
+
+
+def test_cached_embeds_are_stamped_when_sent(tmp_path, monkeypatch):
+    store = JsonStore(str(tmp_path / 'bot_data.json'), default_data).open()
+    shops = ShopRegistry(lambda guild_id: Shop(guild_id, store, None))
+    monkeypatch.setattr(main, 'shops', shops)
+    monkeypatch.setattr(main, 'embed_cache', EmbedCache())
+    monkeypatch.setattr(main, 'datetime', Clock)
+    Clock.times = [datetime(2026, 1, 1, 9, 0), datetime(2026, 1, 1, 17, 30)]
+    store.put_product('1', product(1))
+    sent = []
+    try:
+        for _ in range(2):
+            asyncio.run(main.view_product.callback(FakeInteraction(sent), product_id='1'))
+    finally:
+        shops.close()
+
+    assert main.embed_cache.stats()['hits'] == 1
+    assert [embed.timestamp.hour for embed in sent] == [9, 17]
+    cached = main.embed_cache.get((1, 'product', '1'), (store.version('products', '1'), store.version('suppliers')), None)
+    assert cached.timestamp is None
@@ -0,0 +1,66 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import main
+
+
+def with_guilds(monkeypatch, *guild_ids):
+    async def fetch_guilds(limit=None):
+        for guild_id in guild_ids[:limit]:
+            yield SimpleNamespace(id=guild_id)
+
+    monkeypatch.setattr(main.bot, 'fetch_guilds', fetch_guilds)
+
+
+def legacy_files(tmp_path):
+    (tmp_path / 'bot_data.json').write_text('{}')
+    (tmp_path / 'bot_data.json.wal').write_text('')
+    (tmp_path / 'archive').mkdir()
+    (tmp_path / 'archive' / 'index.json').write_text('{}')
+
+
+def test_legacy_data_moves_to_the_only_guild(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy_files(tmp_path)
+    with_guilds(monkeypatch, 42)
+    asyncio.run(main.adopt_legacy_data())
+
+    assert not (tmp_path / 'bot_data.json').exists() and not (tmp_path / 'archive').exists()
+    data_file, _, archive_dir = main.shop_paths(42)
+    assert os.path.exists(data_file) and os.path.exists(data_file + '.wal')
+    assert os.path.exists(os.path.join(archive_dir, 'index.json'))
+
+
+@pytest.mark.parametrize('guild_ids', [(), (42, 43)])
+def test_bot_wont_start_when_the_legacy_guild_is_unclear(tmp_path, monkeypatch, guild_ids):
+    monkeypatch.chdir(tmp_path)
+    legacy_files(tmp_path)
+    with_guilds(monkeypatch, *guild_ids)
+    with pytest.raises(SystemExit, match='LEGACY_GUILD_ID'):
+        asyncio.run(main.adopt_legacy_data())
+    assert (tmp_path / 'bot_data.json').exists()
+
+
+def test_legacy_data_never_replaces_a_guilds_own(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy_files(tmp_path)
+    with_guilds(monkeypatch, 42)
+    os.makedirs(os.path.dirname(main.shop_paths(42)[0]))
+    with open(main.shop_paths(42)[0], 'w') as f:
+        f.write('{}')
+    with pytest.raises(SystemExit, match='LEGACY_GUILD_ID=42'):
+        asyncio.run(main.adopt_legacy_data())
+    assert (tmp_path / 'bot_data.json').exists()
+
+
+def test_configured_legacy_guild_keeps_the_files_in_place(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    legacy_files(tmp_path)
+    monkeypatch.setattr(main, 'LEGACY_GUILD_ID', 42)
+    with_guilds(monkeypatch, 42, 43)
+    asyncio.run(main.adopt_legacy_data())
+    assert (tmp_path / 'bot_data.json').exists()
+    assert main.shop_paths(42)[0] == 'bot_data.json'
@@ -0,0 +1,125 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from indexes import OrderIndex, ProductSearch
+from records import created_key, to_micros
+
+STATUSES = ('pending', 'processing', 'shipped', 'delivered', 'cancelled')
+EMAILS = ('ann@example.com', 'Bob@Example.com', 'cy@example.com')
+
+
+def random_order(rng):
+    created = datetime(2026, 3, 1) + timedelta(days=rng.randint(0, 30), seconds=rng.randint(0, 86399))
+    return {
+        'product_id': rng.choice('123'),
+        'customer_email': rng.choice(EMAILS),
+        'status': rng.choice(STATUSES),
+        'created_at': created.isoformat()
+    }
+
+
+def brute_force(orders, status=None, customer=None, product_id=None, since=None, until=None,
+                offset=0, limit=10):
+    matches = [
+        (order_id, order) for order_id, order in orders.items()
+        if (status is None or order['status'] == status)
+        and (customer is None or order['customer_email'].lower() == customer.strip().lower())
+        and (product_id is None or order['product_id'] == product_id)
+        and (since is None or created_key(order) >= to_micros(since))
+        and (until is None or created_key(order) < to_micros(until))
+    ]
+    matches.sort(key=lambda match: (created_key(match[1]), match[0]), reverse=True)
+    return len(matches), matches[offset:offset + limit]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_queries_match_a_scan_after_random_changes(seed):
+    rng = random.Random(seed)
+    orders = {f'ORD-{n:04d}': random_order(rng) for n in range(1, 201)}
+    index = OrderIndex.from_orders(orders.items())
+    for n in range(300):
+        order_id = rng.choice(sorted(orders))
+        old = orders[order_id]
+        action = rng.random()
+        if action < 0.5:
+            new = {**old, 'status': rng.choice(STATUSES)}
+        elif action < 0.7:
+            new = {**random_order(rng), 'status': old['status']}
+        elif action < 0.85:
+            new = None
+        else:
+            order_id, old, new = f'ORD-{n + 1000:04d}', None, random_order(rng)
+        index.order_changed(order_id, old, new)
+        if new is None:
+            del orders[order_id]
+        else:
+            orders[order_id] = new
+
+    for _ in range(100):
+        filters = {
+            'status': rng.choice((None,) + STATUSES),
+            'customer': rng.choice((None, 'BOB@example.com', ' ann@example.com ', 'nobody@example.com')),
+            'product_id': rng.choice((None, '1', '2', '3')),
+            'offset': rng.choice((0, 0, 5, 40)),
+            'limit': rng.choice((1, 10))
+        }
+        if rng.random() < 0.5:
+            first = datetime(2026, 3, 1) + timedelta(days=rng.randint(0, 30))
+            filters['since'] = first.date().isoformat()
+            filters['until'] = (first + timedelta(days=rng.randint(1, 10))).date().isoformat()
+        assert index.query(orders, **filters) == brute_force(orders, **filters)
+
+
+def test_created_before_lists_the_oldest_of_a_status():
+    orders = {
+        'ORD-0001': {'product_id': '1', 'customer_email': 'a@example.com', 'status': 'delivered',
+                     'created_at': '2026-01-03T00:00:00'},
+        'ORD-0002': {'product_id': '1', 'customer_email': 'a@example.com', 'status': 'delivered',
+                     'created_at': '2026-01-01T00:00:00'},
+        'ORD-0003': {'product_id': '1', 'customer_email': 'a@example.com', 'status': 'pending',
+                     'created_at': '2026-01-02T00:00:00'},
+        'ORD-0004': {'product_id': '1', 'customer_email': 'a@example.com', 'status': 'delivered',
+                     'created_at': '2026-02-01T00:00:00'}
+    }
+    index = OrderIndex.from_orders(orders.items())
+    entries = index.created_before('delivered', '2026-01-31', limit=10)
+    assert [order_id for _, order_id in entries] == ['ORD-0002', 'ORD-0001']
+    assert [order_id for _, order_id in index.created_before('delivered', '2026-01-31', limit=1)] == ['ORD-0002']
+
+
+def catalog():
+    return {
+        '1': {'name': 'Wireless Headphones', 'description': 'Over-ear, with a charging case'},
+        '2': {'name': 'Phone Charger', 'description': 'Fast USB-C charging'},
+        '3': {'name': 'Desk Lamp', 'description': 'Warm light for headphone-free evenings'},
+        '4': {'name': 'Wireless Mouse', 'description': 'Quiet clicks'}
+    }
+
+
+def test_name_matches_rank_above_description_matches():
+    search = ProductSearch.from_products(catalog().items())
+    assert search.search('headphones') == ['1', '3']
+    assert search.search('charger') == ['2', '1']
+    assert search.search('wireless mouse')[0] == '4'
+
+
+def test_prefixes_and_typos_still_find_products():
+    search = ProductSearch.from_products(catalog().items())
+    assert search.search('head')[0] == '1'
+    assert sorted(search.search('wirless')) == ['1', '4']
+    assert search.search('lamb') == ['3']
+    assert search.search('zzz') == []
+
+
+def test_edits_and_deletes_leave_no_stale_words():
+    products = catalog()
+    search = ProductSearch.from_products(products.items())
+    search.product_changed('3', products['3'], {'name': 'Floor Lamp', 'description': 'Tall'})
+    assert search.search('desk') == []
+    assert search.search('floor') == ['3'] and search.names['3'] == 'Floor Lamp'
+    search.product_changed('4', products['4'], None)
+    assert search.search('mouse') == [] and '4' not in search.names
+    assert 'quiet' not in search.postings and 'quiet' not in search.vocabulary
+    assert all('quiet' not in tokens for tokens in search.by_trigram.values())
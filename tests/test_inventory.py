@@ -0,0 +1,90 @@
+import asyncio
+import random
+
+import pytest
+
+from conftest import order, product
+from inventory import OutOfStock, StockLedger
+
+
+def stocked(make_store, backend, stock):
+    store = make_store(backend)
+    store.put_product('1', {**product(1), 'stock': stock})
+    store.put_product('2', {**product(2), 'stock': stock})
+    return store
+
+
+def test_concurrent_orders_never_oversell(make_store, backend):
+    store = stocked(make_store, backend, 50)
+    ledger = StockLedger(store)
+    changes = []
+    ledger.listeners.append(lambda product_id, old, new: changes.append((product_id, old, new)))
+    rng = random.Random(1)
+
+    async def place_order(product_id, quantity, fails):
+        try:
+            reservation = await ledger.reserve(product_id, quantity)
+        except OutOfStock:
+            return
+        with reservation:
+            # Saving the order yields to the loop, letting other orders in
+            await asyncio.sleep(rng.random() / 1000)
+            if fails:
+                return
+            reservation.commit()
+        sold[product_id] += quantity
+
+    async def place_all():
+        await asyncio.gather(*(
+            place_order(rng.choice('12'), rng.randint(1, 4), rng.random() < 0.2) for _ in range(200)
+        ))
+
+    sold = {'1': 0, '2': 0}
+    asyncio.run(place_all())
+    # More is ordered than there is, and whatever wasn't sold is still there
+    assert 0 < sold['1'] <= 50 and 0 < sold['2'] <= 50
+    assert store.get_product('1')['stock'] == 50 - sold['1']
+    assert store.get_product('2')['stock'] == 50 - sold['2']
+    assert ledger.reserved == {}
+    assert all(new >= 0 for _, _, new in changes)
+    assert sum(old - new for _, old, new in changes) == sold['1'] + sold['2']
+
+
+def test_held_stock_is_unavailable_until_released(make_store):
+    store = stocked(make_store, 'json', 5)
+    ledger = StockLedger(store)
+
+    async def run():
+        first = await ledger.reserve('1', 3)
+        with pytest.raises(OutOfStock) as error:
+            await ledger.reserve('1', 3)
+        assert error.value.available == 2
+        first.release()
+        second = await ledger.reserve('1', 5)
+        second.commit()
+        second.release()
+        with pytest.raises(ValueError):
+            await ledger.reserve('1', 0)
+
+    asyncio.run(run())
+    assert store.get_product('1')['stock'] == 0 and ledger.reserved == {}
+
+
+def test_cancelling_returns_stock_and_reopening_takes_it_back(make_store, backend):
+    store = stocked(make_store, backend, 2)
+    store.put_order('ORD-0001', order(1, quantity=2))
+    ledger = StockLedger(store)
+
+    async def run():
+        assert await ledger.set_order_status('ORD-0001', 'cancelled') == 'pending'
+        assert store.get_product('1')['stock'] == 4
+        reservation = await ledger.reserve('1', 3)
+        with pytest.raises(OutOfStock):
+            await ledger.set_order_status('ORD-0001', 'pending')
+        reservation.release()
+        assert await ledger.set_order_status('ORD-0001', 'pending') == 'cancelled'
+        assert await ledger.set_order_status('ORD-9999', 'pending') is None
+
+    asyncio.run(run())
+    assert store.get_product('1')['stock'] == 2
+    assert store.get_order('ORD-0001')['status'] == 'pending'
@@ -0,0 +1,119 @@
+import asyncio
+import json
+import threading
+
+import storage
+from conftest import default_data, order, orders_of, product
+from storage import SNAPSHOT_LAYOUT, JsonStore
+
+
+def write_store(path, orders, products=3):
+    store = JsonStore(path, default_data).load()
+    for n in range(1, products + 1):
+        store.put_product(str(n), product(n))
+    for n in range(1, orders + 1):
+        store.put_order(f'ORD-{n:04d}', order(n, quantity=n % 4 + 1, product_id=str(n % products + 1),
+                                              status='cancelled' if n % 5 == 0 else 'delivered'))
+    store.save()
+    # A few writes on top of the snapshot, for each part
+    store.update_order('ORD-0001', status='shipped')
+    store.update_product('2', stock=5)
+    store.set_setting('currency', 'EUR')
+    store.close()
+
+
+def test_background_load_matches_a_blocking_one(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bot_data.json')
+    write_store(path, orders=40, products=12)
+    expected = JsonStore(path, default_data).load()
+    expected.close()
+
+    # Pause every few records, so every section is read across several steps
+    monkeypatch.setattr(storage, 'LOAD_STEP', 3)
+    store = JsonStore(path, default_data).open()
+    assert store.is_ready('header') and not store.is_ready('products')
+    assert store.get_setting('currency') == 'EUR'
+    asyncio.run(store.load_in_background())
+    try:
+        assert store.is_ready()
+        assert dict(store.iter_products()) == dict(expected.iter_products())
+        assert orders_of(store) == orders_of(expected)
+        assert store.aggregates.to_dict() == expected.aggregates.to_dict()
+        assert store.rollups.to_dict() == expected.rollups.to_dict()
+        assert store.query_orders(status='shipped') == (1, [('ORD-0001', expected.get_order('ORD-0001'))])
+        assert store.next_id('orders') == 41
+    finally:
+        store.close()
+
+
+def test_full_scans_run_off_the_event_loop(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bot_data.json')
+    write_store(path, orders=10)
+    threads = {}
+
+    def recording(name, build):
+        def wrapper(*args):
+            threads[name] = threading.current_thread()
+            return build(*args)
+        return wrapper
+
+    monkeypatch.setattr(storage, '_load_views', recording('views', storage._load_views))
+    monkeypatch.setattr(storage, '_highest_id', recording('ids', storage._highest_id))
+    monkeypatch.setattr(storage.OrderIndex, 'from_orders', recording('index', storage.OrderIndex.from_orders))
+    monkeypatch.setattr(storage.ProductSearch, 'from_products',
+                        recording('search', storage.ProductSearch.from_products))
+
+    store = JsonStore(path, default_data).open()
+    try:
+        asyncio.run(store.load_in_background())
+    finally:
+        store.close()
+    assert set(threads) == {'views', 'ids', 'index', 'search'}
+    assert threading.main_thread() not in threads.values()
+
+
+def test_old_layout_is_rewritten_in_the_current_one(tmp_path, assert_views_match):
+    # Records first and the header last, as snapshots were written before
+    # SNAPSHOT_LAYOUT, with a log from before segments were numbered
+    path = str(tmp_path / 'bot_data.json')
+    orders = {f'ORD-{n:04d}': order(n, status='delivered' if n % 2 else 'pending') for n in range(1, 7)}
+    old = {
+        'products': {'1': product(1)},
+        'orders': orders,
+        'suppliers': {'SUP-1': {'name': 'Acme'}},
+        'counters': {'products': 1, 'orders': 6},
+        'settings': {'order_channel': None, 'notification_channel': None, 'currency': 'GBP'}
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(old, f)
+    with open(path + '.wal', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'op': 'set', 'path': ['orders', 'ORD-0002', 'status'], 'value': 'shipped'}) + '\n')
+    orders['ORD-0002']['status'] = 'shipped'
+
+    store = JsonStore(path, default_data).open()
+    assert not store.is_ready('header')
+    store.finish_loading()
+    assert orders_of(store) == orders
+    assert_views_match(store, orders.values())
+    store.close()
+
+    with open(path, 'r', encoding='utf-8') as f:
+        sections = [key for key, _ in json.load(f, object_pairs_hook=lambda pairs: pairs)]
+    assert sections[:2] == ['_layout', '_folded']
+    assert sections.index('settings') < sections.index('products') < sections.index('orders') \
+        < sections.index('aggregates')
+    with open(path, 'r', encoding='utf-8') as f:
+        assert json.load(f)['_layout'] == SNAPSHOT_LAYOUT
+
+    store = JsonStore(path, default_data).open()
+    try:
+        # The header is now readable without the records
+        assert store.is_ready('header') and not store.is_ready('products')
+        assert store.get_setting('currency') == 'GBP'
+        store.finish_loading()
+        assert orders_of(store) == orders
+        assert store.get_supplier('SUP-1') == {'name': 'Acme'}
+        assert_views_match(store, orders.values())
+        assert store.next_id('orders') == 7
+    finally:
+        store.close()
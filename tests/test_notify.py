@@ -0,0 +1,131 @@
+import asyncio
+from types import SimpleNamespace
+
+import aiohttp
+import discord
+
+import main
+from conftest import default_data
+from notify import MAX_EMBEDS, Notifier
+from shops import Shop, ShopRegistry
+from storage import JsonStore
+
+
+class FakeChannel:
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.sent = []
+
+    async def send(self, embeds):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append([embed.title for embed in embeds])
+
+
+class FakeBot:
+    def __init__(self, channel):
+        self.channel = channel
+
+    def get_channel(self, channel_id):
+        return self.channel
+
+
+def embeds(count):
+    return [discord.Embed(title=f'order {n}') for n in range(count)]
+
+
+def run(notifier, batch):
+    async def post_all():
+        for embed in batch:
+            notifier.post(123, embed)
+        await asyncio.wait(list(notifier._workers.values()))
+
+    asyncio.run(post_all())
+
+
+def test_a_burst_goes_out_in_as_few_messages_as_fit():
+    channel = FakeChannel()
+    notifier = Notifier(FakeBot(channel), linger=0.01, min_interval=0)
+    run(notifier, embeds(MAX_EMBEDS + 3))
+    assert [len(message) for message in channel.sent] == [MAX_EMBEDS, 3]
+    assert channel.sent[0][0] == 'order 0' and channel.sent[1][-1] == f'order {MAX_EMBEDS + 2}'
+    assert notifier.sent_messages == 2 and notifier.sent_embeds == MAX_EMBEDS + 3
+    assert notifier.pending() == 0
+
+
+def test_long_embeds_are_split_by_size():
+    channel = FakeChannel()
+    notifier = Notifier(FakeBot(channel), linger=0.01, min_interval=0)
+    big = [discord.Embed(title='big', description='x' * 2500) for _ in range(3)]
+    run(notifier, big)
+    assert [len(message) for message in channel.sent] == [2, 1]
+
+
+def test_failed_sends_back_off_and_retry(monkeypatch):
+    delays = []
+    sleep = asyncio.sleep
+
+    async def recorded_sleep(delay):
+        delays.append(delay)
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, 'sleep', recorded_sleep)
+    response = SimpleNamespace(status=503, reason='Service Unavailable')
+    channel = FakeChannel([aiohttp.ClientConnectionError(), discord.HTTPException(response, 'down'),
+                           discord.RateLimited(7.5)])
+    notifier = Notifier(FakeBot(channel), linger=0, min_interval=0, base_delay=1.0)
+    run(notifier, embeds(2))
+    assert delays == [1.0, 2.0, 7.5]
+    assert channel.sent == [['order 0', 'order 1']]
+    assert notifier.retries == 3 and notifier.failed == 0
+
+
+def test_sends_give_up_after_max_attempts_or_a_permanent_error(monkeypatch):
+    async def no_sleep(delay):
+        pass
+
+    monkeypatch.setattr(asyncio, 'sleep', no_sleep)
+    channel = FakeChannel([OSError()] * 3)
+    notifier = Notifier(FakeBot(channel), linger=0, min_interval=0, max_attempts=3)
+    run(notifier, embeds(2))
+    assert channel.sent == [] and notifier.retries == 2 and notifier.failed == 2
+
+    response = SimpleNamespace(status=403, reason='Forbidden')
+    channel = FakeChannel([discord.Forbidden(response, 'Missing Access')])
+    notifier = Notifier(FakeBot(channel), linger=0, min_interval=0)
+    run(notifier, embeds(1))
+    assert notifier.retries == 0 and notifier.failed == 1
+
+
+def test_nothing_is_queued_without_a_channel():
+    notifier = Notifier(FakeBot(FakeChannel()))
+    assert notifier.post(None, discord.Embed(title='order')) is False
+    assert notifier.pending() == 0
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.sent.append(kwargs.get('embed'))
+
+
+def test_channels_command_sets_and_clears_the_settings(tmp_path, monkeypatch):
+    store = JsonStore(str(tmp_path / 'bot_data.json'), default_data).open()
+    shops = ShopRegistry(lambda guild_id: Shop(guild_id, store, None))
+    monkeypatch.setattr(main, 'shops', shops)
+    interaction = SimpleNamespace(guild_id=1, response=FakeResponse())
+    try:
+        asyncio.run(main.set_channels.callback(interaction, order_channel=SimpleNamespace(id=111),
+                                               notification_channel=SimpleNamespace(id=222)))
+        assert store.get_setting('order_channel') == 111
+        assert store.get_setting('notification_channel') == 222
+        assert [field.value for field in interaction.response.sent[-1].fields] == ['<#111>', '<#222>']
+
+        asyncio.run(main.set_channels.callback(interaction, off='order_channel'))
+        assert store.get_setting('order_channel') is None
+        assert store.get_setting('notification_channel') == 222
+        assert [field.value for field in interaction.response.sent[-1].fields] == ['Off', '<#222>']
+    finally:
+        shops.close()
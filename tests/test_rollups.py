@@ -0,0 +1,75 @@
+from datetime import date
+
+from analytics import DailySeries, SalesRollups, SparseSeries
+
+
+def order(product_id, day, quantity=1, status='delivered', price=10.0):
+    return {
+        'product_id': product_id,
+        'status': status,
+        'quantity': quantity,
+        'total': price * quantity,
+        'profit': price / 2 * quantity,
+        'created_at': f'{day}T12:00:00'
+    }
+
+
+def ordinal(day):
+    return date.fromisoformat(day).toordinal()
+
+
+def test_products_keep_only_the_days_they_sold_on():
+    rollups = SalesRollups.from_orders([
+        order('1', '2026-01-01'),
+        order('1', '2026-03-01', quantity=2),
+        order('2', '2026-02-01'),
+        order('1', '2026-02-15', status='cancelled')
+    ])
+    assert list(rollups.by_product['1'].days) == [ordinal('2026-01-01'), ordinal('2026-03-01')]
+    assert list(rollups.by_product['2'].days) == [ordinal('2026-02-01')]
+    # The shop-wide totals stay one dense series
+    assert isinstance(rollups.totals, DailySeries)
+    assert rollups.product_total('1', ordinal('2026-01-01'), ordinal('2026-12-31')) == [30.0, 15.0, 3.0, 2.0]
+    assert rollups.product_total('1', ordinal('2026-01-02'), ordinal('2026-02-28')) == [0.0] * 4
+    assert rollups.total(ordinal('2026-01-01'), ordinal('2026-12-31')) == [40.0, 20.0, 4.0, 3.0]
+
+
+def test_days_are_dropped_when_their_last_order_goes():
+    first, second = order('1', '2026-01-05'), order('1', '2026-01-02', quantity=3)
+    rollups = SalesRollups.from_orders([first, second])
+    rollups.order_changed('ORD-1', first, {**first, 'status': 'cancelled'})
+    assert list(rollups.by_product['1'].days) == [ordinal('2026-01-02')]
+    rollups.order_changed('ORD-2', second, None)
+    assert len(rollups.by_product['1'].days) == 0
+    assert rollups.top_products(ordinal('2026-01-01'), ordinal('2026-01-31')) == []
+
+
+def test_rollup_periods():
+    rollups = SalesRollups.from_orders([
+        order('1', '2026-01-05'),  # a Monday
+        order('1', '2026-01-11'),  # the Sunday after
+        order('2', '2026-01-12'),
+        order('2', '2026-02-01')
+    ])
+    first, last = ordinal('2026-01-01'), ordinal('2026-02-28')
+    weeks = rollups.rollup(first, last, 'week')
+    assert [(day, values[3]) for day, values in weeks] == [
+        (ordinal('2026-01-05'), 2.0), (ordinal('2026-01-12'), 1.0),
+        (ordinal('2026-01-19'), 0.0), (ordinal('2026-01-26'), 1.0)
+    ]
+    months = rollups.rollup(first, last, 'month')
+    assert [(day, values[3]) for day, values in months] == [(ordinal('2026-01-01'), 3.0), (ordinal('2026-02-01'), 1.0)]
+    assert rollups.top_products(first, last, limit=1) == [('1', [20.0, 10.0, 2.0, 2.0])]
+
+
+def test_saved_rollups_round_trip_in_both_formats():
+    rollups = SalesRollups.from_orders([order('1', '2026-01-01'), order('1', '2026-01-04', quantity=2)])
+    restored = SalesRollups.from_dict(rollups.to_dict())
+    assert restored.to_dict() == rollups.to_dict()
+
+    # Products used to be saved as dense DailySeries, empty days and all
+    dense = DailySeries(ordinal('2026-01-01'))
+    dense.add(ordinal('2026-01-01'), (10.0, 5.0, 1, 1))
+    dense.add(ordinal('2026-01-04'), (20.0, 10.0, 2, 1))
+    series = SparseSeries.from_dict(dense.to_dict())
+    assert series.to_dict() == rollups.by_product['1'].to_dict()
@@ -0,0 +1,207 @@
+import os
+
+import pytest
+
+import storage
+from conftest import order, orders_of, product
+
+
+def test_round_trip_and_reopen(make_store, backend, assert_views_match):
+    store = make_store(backend)
+    products = {}
+    for n in range(1, 4):
+        product_id = str(store.next_id('products'))
+        products[product_id] = product(n)
+        store.put_product(product_id, product(n))
+    store.update_product('2', stock=7, supplier_id='SUP-1')
+    products['2'].update(stock=7, supplier_id='SUP-1')
+    store.delete_product('3')
+    del products['3']
+
+    orders = {}
+    for n in range(1, 6):
+        order_id = f"ORD-{store.next_id('orders'):04d}"
+        orders[order_id] = order(n, quantity=n)
+        store.put_order(order_id, order(n, quantity=n))
+    store.update_order('ORD-0002', status='shipped')
+    orders['ORD-0002']['status'] = 'shipped'
+
+    supplier = {'name': 'Acme', 'lead_time_days': 3}
+    store.put_supplier('SUP-1', supplier)
+    store.set_setting('currency', 'EUR')
+    store.close()
+
+    for _ in range(2):
+        # Once from the log alone, then from whatever that open left behind
+        store = make_store(backend)
+        assert dict(store.iter_products()) == products
+        assert orders_of(store) == orders
+        assert store.get_supplier('SUP-1') == supplier
+        assert store.get_setting('currency') == 'EUR'
+        assert_views_match(store, orders.values())
+        store.close()
+
+    store = make_store(backend)
+    assert store.next_id('products') == 4
+    assert store.next_id('orders') == 6
+
+
+def test_json_reopens_from_snapshot_and_log(make_store, assert_views_match):
+    store = make_store('json')
+    orders = {}
+    for n in range(1, 11):
+        orders[f'ORD-{n:04d}'] = order(n)
+        store.put_order(f'ORD-{n:04d}', order(n))
+    store.save()
+    for n in range(11, 16):
+        orders[f'ORD-{n:04d}'] = order(n, status='delivered')
+        store.put_order(f'ORD-{n:04d}', order(n, status='delivered'))
+    store.update_order('ORD-0001', status='cancelled')
+    orders['ORD-0001']['status'] = 'cancelled'
+    store.close()
+
+    store = make_store('json')
+    assert orders_of(store) == orders
+    assert_views_match(store, orders.values())
+
+
+class Crash(Exception):
+    pass
+
+
+class Stopped:
+    # A compaction thread the process died before starting
+    def __init__(self, target, daemon=False):
+        self.target = target
+
+    def start(self):
+        pass
+
+    def is_alive(self):
+        return False
+
+    def join(self):
+        pass
+
+
+class Inline(Stopped):
+    # Folds on the spot; a Crash stops it where the process would have died
+    def start(self):
+        try:
+            self.target()
+        except Crash:
+            pass
+
+
+def abandon(store):
+    # Leaves the files as a killed process would: nothing else is written,
+    # renamed or removed on the way out
+    writer = store._writer
+    with writer._cond:
+        writer._closed = True
+        writer._cond.notify()
+    writer._thread.join()
+    store._writer = None
+    store._log.close()
+
+
+def compact(store):
+    with store._writer.lock:
+        store.compact()
+    if store._compactor:
+        store._compactor.join()
+
+
+def crash_after_rotation(store, monkeypatch):
+    monkeypatch.setattr(storage, 'Thread', Stopped)
+    compact(store)
+
+
+def crash_writing_snapshot(store, monkeypatch):
+    replace = os.replace
+
+    def crashing_replace(src, dst):
+        if dst == store.path:
+            raise Crash
+        replace(src, dst)
+
+    monkeypatch.setattr(storage, 'Thread', Inline)
+    monkeypatch.setattr(os, 'replace', crashing_replace)
+    compact(store)
+
+
+def crash_before_removing_segment(store, monkeypatch):
+    remove = os.remove
+
+    def crashing_remove(path):
+        if path == store.compacting_path:
+            raise Crash
+        remove(path)
+
+    monkeypatch.setattr(storage, 'Thread', Inline)
+    monkeypatch.setattr(os, 'remove', crashing_remove)
+    compact(store)
+    assert os.path.exists(store.compacting_path)
+
+
+def crash_before_saved_log_restarts(store, monkeypatch):
+    def crashing_start_log(carried=''):
+        raise Crash
+
+    monkeypatch.setattr(store, '_start_log', crashing_start_log)
+    with pytest.raises(Crash):
+        store.save()
+
+
+@pytest.mark.parametrize('crash', [
+    crash_after_rotation,
+    crash_writing_snapshot,
+    crash_before_removing_segment,
+    crash_before_saved_log_restarts
+])
+def test_replay_after_crash_during_compaction(make_store, monkeypatch, assert_views_match, crash):
+    store = make_store('json', compact_after=10 ** 6)
+    store.put_product('1', product(1))
+    seen = {}
+    for n in range(1, 11):
+        seen[f'ORD-{n:04d}'] = order(n, status='delivered' if n % 3 == 0 else 'pending')
+        store.put_order(f'ORD-{n:04d}', seen[f'ORD-{n:04d}'])
+    store.flush()
+    compact(store)
+
+    # A second segment that updates and archives orders the snapshot holds
+    for n in range(11, 16):
+        seen[f'ORD-{n:04d}'] = order(n, quantity=2)
+        store.put_order(f'ORD-{n:04d}', seen[f'ORD-{n:04d}'])
+    store.update_order('ORD-0002', status='cancelled')
+    seen['ORD-0002']['status'] = 'cancelled'
+    store.update_order('ORD-0011', quantity=3, total=37.5, profit=24.75)
+    seen['ORD-0011'].update(quantity=3, total=37.5, profit=24.75)
+    archived = {'ORD-0002', 'ORD-0003'}
+    store.archive_orders(sorted(archived))
+    store.flush()
+
+    crash(store, monkeypatch)
+    abandon(store)
+    monkeypatch.undo()
+
+    store = make_store('json', compact_after=10 ** 6)
+    live = {order_id: fields for order_id, fields in seen.items() if order_id not in archived}
+    assert orders_of(store) == live
+    assert_views_match(store, seen.values())
+
+    # Writing and compacting from there mustn't fold anything in twice
+    seen['ORD-0016'] = order(16, status='shipped')
+    store.put_order('ORD-0016', seen['ORD-0016'])
+    store.update_order('ORD-0001', status='delivered')
+    seen['ORD-0001']['status'] = 'delivered'
+    store.flush()
+    compact(store)
+    assert not os.path.exists(store.compacting_path)
+    store.close()
+
+    store = make_store('json', compact_after=10 ** 6)
+    live = {order_id: fields for order_id, fields in seen.items() if order_id not in archived}
+    assert orders_of(store) == live
+    assert_views_match(store, seen.values())
+    assert store.next_id('orders') == 17
@@ -0,0 +1,116 @@
+import asyncio
+
+from aiohttp import web
+
+from conftest import product
+from suppliers import SupplierSync, parse_feed
+
+
+class FeedServer:
+    # A supplier's feed on 127.0.0.1, answering conditional requests the
+    # way a web server with ETags would
+    def __init__(self, body):
+        self.body = body
+        self.version = 1
+        self.status = 200
+        self.requests = []
+
+    async def feed(self, request):
+        self.requests.append(request.headers.get('If-None-Match'))
+        if self.status != 200:
+            return web.Response(status=self.status)
+        etag = f'"v{self.version}"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+        return web.Response(text=self.body, headers={'ETag': etag})
+
+    def publish(self, body):
+        self.body = body
+        self.version += 1
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/feed.csv', self.feed)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, '127.0.0.1', 0).start()
+        host, port = self.runner.addresses[0][:2]
+        return f'http://{host}:{port}/feed.csv'
+
+
+def supplied_store(make_store, feed_url):
+    store = make_store('json')
+    store.put_supplier('SUP-1', {'name': 'Acme', 'feed_url': feed_url})
+    store.put_product('1', {**product(1), 'price': 20.0, 'supplier_cost': 5.0, 'stock': 10, 'supplier_id': 'SUP-1'})
+    store.put_product('2', {**product(2), 'price': 10.0, 'supplier_cost': 2.0, 'stock': 10, 'supplier_id': 'SUP-1',
+                            'supplier_sku': 'ACME-2'})
+    # No supplier_id, so the feed's row for SKU 3 isn't this product's
+    store.put_product('3', {**product(3), 'stock': 10})
+    return store
+
+
+def test_http_feed_updates_only_what_the_supplier_changed(make_store, tmp_path):
+    server = FeedServer('sku,cost,stock\n1,8.00,40\nACME-2,2.00,7\n3,1.00,1\n')
+    sync = SupplierSync(str(tmp_path))
+
+    async def run():
+        url = await server.start()
+        store = supplied_store(make_store, url)
+        try:
+            assert sorted(await sync.sync(store, 1)) == ['1', '2']
+            assert store.get_product('1')['supplier_cost'] == 8.0
+            assert store.get_product('1')['profit_margin'] == 60.0
+            assert store.get_product('1')['stock'] == 40
+            assert store.get_product('2')['stock'] == 7 and store.get_product('2')['supplier_cost'] == 2.0
+            assert store.get_product('3')['stock'] == 10
+
+            # Unchanged: the server answers 304 and nothing is written
+            assert await sync.sync(store, 1) == []
+            assert server.requests == [None, '"v1"'] and sync.not_modified == 1
+
+            # Stock sold here since isn't put back by a row that still
+            # shows the old number; the cost that moved is applied
+            store.update_product('1', stock=35)
+            server.publish('sku,cost,stock\n1,9.00,40\nACME-2,2.00,7\n')
+            assert await sync.sync(store, 1) == ['1']
+            assert store.get_product('1')['stock'] == 35 and store.get_product('1')['supplier_cost'] == 9.0
+
+            server.status = 500
+            assert await sync.sync(store, 1) == []
+            assert sync.state(1, 'SUP-1').last_error == 'HTTP 500' and sync.failed == 1
+        finally:
+            await sync.close()
+            await server.runner.cleanup()
+
+    asyncio.run(run())
+    assert sync.products_updated == 3
+
+
+def test_file_feeds_are_reread_only_when_they_change(make_store, tmp_path):
+    feed = tmp_path / 'acme.jsonl'
+    feed.write_text('{"sku": "1", "stock": 3}\nnot json\n{"sku": "ACME-2", "cost": -1}\n')
+    store = supplied_store(make_store, 'acme.jsonl')
+    sync = SupplierSync(str(tmp_path))
+
+    async def run():
+        assert await sync.sync(store, 1) == ['1']
+        assert sync.state(1, 'SUP-1').skipped_rows == 2
+        assert await sync.sync(store, 1) == [] and sync.not_modified == 1
+        feed.write_text('{"sku": "1", "stock": 3}\n{"sku": "ACME-2", "stock": 0}\n')
+        assert await sync.sync(store, 1) == ['2']
+
+        store.put_supplier('SUP-1', {'name': 'Acme', 'feed_url': '../outside.csv'})
+        assert await sync.sync(store, 1) == []
+        assert "isn't in the feed directory" in sync.state(1, 'SUP-1').last_error
+
+    asyncio.run(run())
+    assert store.get_product('1')['stock'] == 3 and store.get_product('2')['stock'] == 0
+
+
+def test_feeds_parse_in_every_format():
+    expected = {'A': (1.5, 4), 'B': (None, 2)}
+    assert parse_feed('\ufeffsku,cost,stock\nA,1.5,4\nB,,2\nC,,\n,1,1\n') == (expected, 2)
+    assert parse_feed('[{"sku": "A", "supplier_cost": 1.499, "quantity": 4}, {"sku": "B", "stock": 2}, 7]') == \
+        (expected, 1)
+    assert parse_feed('{"sku": "A", "cost": 1.5, "stock": 4}\n\n{"sku": "B", "stock": 2}\n{"sku": "C", "stock": "x"}') \
+        == (expected, 1)
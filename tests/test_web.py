@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+from conftest import default_data
+from shops import Shop, ShopRegistry
+from storage import JsonStore
+from web import HealthServer
+
+
+class FakeBot:
+    latency = 0.05
+    guilds = ()
+
+    def add_listener(self, listener, name):
+        pass
+
+    def is_closed(self):
+        return False
+
+    def is_ready(self):
+        return True
+
+
+def health(server):
+    response = asyncio.run(server.healthz(None))
+    return response.status, json.loads(response.text)
+
+
+def test_healthz_reports_every_guilds_persistence(tmp_path):
+    def open_shop(guild_id):
+        path = str(tmp_path / f'{guild_id}.json')
+        return Shop(guild_id, JsonStore(path, default_data, flush_interval_ms=10 ** 6).open(), None)
+
+    shops = ShopRegistry(open_shop)
+    server = HealthServer(FakeBot(), shops)
+    server.connected = True
+    quiet, busy = shops.get(1).store, shops.get(2).store
+    try:
+        quiet.set_setting('currency', 'EUR')
+        quiet.flush()
+        busy.set_setting('currency', 'GBP')
+
+        status, body = health(server)
+        assert status == 200 and body['status'] == 'ok'
+        assert body['persistence_failing'] == []
+        assert body['persistence']['1']['pending'] == 0
+        assert body['persistence']['1']['last_success'] is not None
+        assert body['persistence']['2']['pending'] == 1
+        assert body['persistence']['2']['last_success'] is None
+
+        busy._writer.last_error = OSError('disk full')
+        status, body = health(server)
+        assert status == 503 and body['status'] == 'unhealthy'
+        assert body['persistence_failing'] == ['2']
+        assert body['persistence']['2']['last_error'] == 'disk full'
+        assert body['persistence']['1']['last_error'] is None
+    finally:
+        shops.close()
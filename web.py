@@ -0,0 +1,169 @@
+import json
+import math
+import time
+
+from aiohttp import web
+
+# Health and metrics endpoints, served by aiohttp on the bot's own event loop
+# so probes see the same state the command handlers do.
+#
+#   /healthz  gateway connected and no guild's persistence failing -> 200, else 503
+#   /readyz   bot has finished connecting and every open guild has loaded
+#   /metrics  Prometheus text format, from every registered collector
+#
+# A collector is a callable returning (name, type, help, samples) tuples,
+# where samples is a list of (labels dict, value), or (suffix, labels dict,
+# value) for the _bucket/_sum/_count series of a histogram.
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def format_metrics(families):
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for sample in samples:
+            suffix, labels, value = sample if len(sample) == 3 else ('',) + tuple(sample)
+            lines.append(f'{name}{suffix}{_format_labels(labels)} {float(value)!r}')
+    return '\n'.join(lines) + '\n'
+
+
+class HealthServer:
+    def __init__(self, bot, shops, host='0.0.0.0', port=8080):
+        self.bot = bot
+        self.shops = shops
+        self.host = host
+        self.port = port
+        self.started_at = time.time()
+        self.connected = False
+        self.collectors = [self._bot_metrics, self._store_metrics]
+        self._runner = None
+
+        # Follow the gateway connection as it drops and comes back
+        bot.add_listener(self._on_connect, 'on_connect')
+        bot.add_listener(self._on_connect, 'on_resumed')
+        bot.add_listener(self._on_disconnect, 'on_disconnect')
+
+    async def _on_connect(self):
+        self.connected = True
+
+    async def _on_disconnect(self):
+        self.connected = False
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/', self.home)
+        app.router.add_get('/healthz', self.healthz)
+        app.router.add_get('/readyz', self.readyz)
+        app.router.add_get('/metrics', self.metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def latency(self):
+        latency = self.bot.latency
+        return latency if math.isfinite(latency) else None
+
+    def gateway_up(self):
+        return self.connected and not self.bot.is_closed()
+
+    async def home(self, request):
+        return web.Response(text="✅ Dropshipping Bot is running!")
+
+    async def healthz(self, request):
+        # Every open guild's last persist and pending writes, so a probe can
+        # tell a store that's quietly falling behind from an idle one
+        persistence = {}
+        failing = []
+        for shop in self.shops.loaded():
+            persist = persistence[str(shop.guild_id)] = shop.store.persist_stats()
+            if persist['last_error'] is not None:
+                failing.append(str(shop.guild_id))
+        gateway_up = self.gateway_up()
+        healthy = gateway_up and not failing
+        body = {
+            'status': 'ok' if healthy else 'unhealthy',
+            'gateway': {'connected': gateway_up, 'latency_seconds': self.latency()},
+            'guilds_open': len(self.shops),
+            'persistence': persistence,
+            'persistence_failing': failing,
+            'uptime_seconds': time.time() - self.started_at
+        }
+        return web.Response(
+            text=json.dumps(body),
+            status=200 if healthy else 503,
+            content_type='application/json'
+        )
+
+    async def readyz(self, request):
+        loading = [str(shop.guild_id) for shop in self.shops.loaded() if not shop.store.is_ready()]
+        ready = self.bot.is_ready() and self.gateway_up() and not loading
+        return web.Response(
+            text=json.dumps({'ready': ready, 'loading': loading}),
+            status=200 if ready else 503,
+            content_type='application/json'
+        )
+
+    async def metrics(self, request):
+        families = []
+        for collector in self.collectors:
+            families.extend(collector())
+        return web.Response(text=format_metrics(families), content_type='text/plain', charset='utf-8')
+
+    def _bot_metrics(self):
+        latency = self.latency()
+        families = [
+            ('bot_gateway_connected', 'gauge', 'Whether the Discord gateway connection is up.',
+             [({}, self.gateway_up())]),
+            ('bot_guilds', 'gauge', 'Servers the bot is in.', [({}, len(self.bot.guilds))]),
+            ('bot_uptime_seconds', 'gauge', 'Seconds since the process started.',
+             [({}, time.time() - self.started_at)])
+        ]
+        if latency is not None:
+            families.append(('bot_gateway_latency_seconds', 'gauge', 'Last heartbeat round trip.',
+                             [({}, latency)]))
+        return families
+
+    def _store_metrics(self):
+        # One series per open guild
+        products, orders, batches, failures, pending, last_success = [], [], [], [], [], []
+        for shop in self.shops.loaded():
+            store = shop.store
+            guild = {'guild': shop.guild_id}
+            persist = store.persist_stats()
+            products.append((guild, store.count_products()))
+            for status, count in sorted(store.aggregates.by_status.items()):
+                orders.append(({**guild, 'status': status}, count))
+            batches.append((guild, persist['batches']))
+            failures.append((guild, persist['failures']))
+            pending.append((guild, persist['pending']))
+            if persist['last_success'] is not None:
+                last_success.append((guild, persist['last_success']))
+        return [
+            ('store_guilds_open', 'gauge', 'Guilds whose data is open in this process.',
+             [({}, len(self.shops))]),
+            ('store_products', 'gauge', 'Products in the catalog.', products),
+            ('store_orders', 'gauge', 'Orders by status.', orders),
+            ('store_persist_batches_total', 'counter', 'Write batches persisted.', batches),
+            ('store_persist_failures_total', 'counter', 'Write batches that failed and were retried.', failures),
+            ('store_pending_writes', 'gauge', 'Writes waiting for the next flush.', pending),
+            ('store_last_persist_timestamp_seconds', 'gauge', 'Unix time of the last successful persist.',
+             last_success)
+        ]